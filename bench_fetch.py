@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# bench_fetch.py — đo throughput của fetch_orders_by_created / run_orders_cli.py trên mock_tts_server.py
+# Mỗi cấu hình (page_size × concurrency) chạy trong 1 process con riêng để đo peak RSS chính xác.
+# Ví dụ:
+#   python bench_fetch.py --orders 20000 --page-sizes 20,50,100 --concurrency 1,4,8 --latency-ms 30 --cli
+import os, sys, json, time, socket, tempfile, argparse, subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_KEY, APP_SECRET = "bench_app", "bench_secret"
+
+try:
+    import resource  # không có trên Windows → bỏ qua peak RSS
+except ImportError:
+    resource = None
+
+def _percentile(values, p):
+    if not values:
+        return None
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+def _rss_mb(ru_maxrss):
+    # Linux: KB, macOS: byte
+    return round(ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _child_env(base: str, state_file: str):
+    env = dict(os.environ)
+    env.update({
+        "TTS_APP_KEY": APP_KEY, "TTS_APP_SECRET": APP_SECRET, "TTS_SHOP_CIPHER": "BENCH_SHOP", "TTS_SHOP_ID": "",
+        "TTS_BASE": base, "TTS_REFRESH_URL": f"{base}/api/v2/token/refresh", "TTS_TOKEN_STATE": state_file,
+        "TTS_ACCESS_TOKEN": "", "TTS_REFRESH_TOKEN": "bench",
+        # Không để limiter phía client che mất số đo (trừ khi người chạy tự đặt)
+        "TTS_APP_RATE": os.getenv("TTS_APP_RATE", "0"), "TTS_SHOP_RATE": os.getenv("TTS_SHOP_RATE", "0"),
+    })
+    return env
+
+# ---------- process con: chạy 1 cấu hình và in kết quả JSON ----------
+def run_child(args):
+    import tts_http
+    from orders_search import fetch_orders_by_created, fetch_orders_by_created_parallel, PATH
+
+    latencies = []
+    orig_request = tts_http.request
+
+    def timed_request(method, url, **kwargs):
+        t = time.perf_counter()
+        r = orig_request(method, url, **kwargs)
+        if PATH in url:
+            latencies.append(time.perf_counter() - t)
+        return r
+
+    tts_http.request = timed_request
+    t0 = time.perf_counter()
+    if args.workers > 1:
+        orders = fetch_orders_by_created_parallel(args.ge, args.lt, page_size=args.page_size, max_workers=args.workers)
+    else:
+        orders = fetch_orders_by_created(args.ge, args.lt, page_size=args.page_size)
+    wall = time.perf_counter() - t0
+    print(json.dumps({
+        "wall_s": wall, "pages": len(latencies), "orders": len(orders),
+        "p50_ms": (_percentile(latencies, 50) or 0) * 1000, "p99_ms": (_percentile(latencies, 99) or 0) * 1000,
+        "peak_rss_mb": _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) if resource else None,
+    }))
+
+# ---------- process cha ----------
+def _run_measured(cmd, env):
+    """Chạy cmd, trả về (stdout, wall giây, peak RSS MB của chính process con — None nếu không đo được)."""
+    rss = None
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as errf:
+        t0 = time.perf_counter()
+        p = subprocess.Popen(cmd, env=env, cwd=HERE, stdout=subprocess.PIPE, stderr=errf, text=True)
+        if hasattr(os, "wait4"):
+            # wait4 trả rusage của riêng process này (RUSAGE_CHILDREN thì gộp mọi con đã chạy)
+            out = p.stdout.read()
+            p.stdout.close()
+            _, status, ru = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+            rss = _rss_mb(ru.ru_maxrss)
+        else:
+            out, _ = p.communicate()
+        wall = time.perf_counter() - t0
+        if p.returncode != 0:
+            errf.seek(0)
+            raise RuntimeError(f"{' '.join(cmd[:3])}... lỗi (exit {p.returncode}): {errf.read().strip()[-500:]}")
+    return out, wall, rss
+
+def bench_fetch(base, ge, lt, page_size, workers, tmpdir):
+    env = _child_env(base, os.path.join(tmpdir, f"state_{page_size}_{workers}.json"))
+    cmd = [sys.executable, os.path.join(HERE, "bench_fetch.py"), "--child", "--ge", str(ge), "--lt", str(lt),
+           "--page-size", str(page_size), "--workers", str(workers)]
+    out, _, _ = _run_measured(cmd, env)
+    return json.loads(out.strip().splitlines()[-1])
+
+def bench_cli(base, ge, lt, page_size, workers, tmpdir):
+    state = os.path.join(tmpdir, f"cli_state_{page_size}_{workers}.json")
+    out_file = os.path.join(tmpdir, f"cli_out_{page_size}_{workers}.json")
+    cmd = [sys.executable, os.path.join(HERE, "run_orders_cli.py"), "--app-key", APP_KEY, "--app-secret", APP_SECRET,
+           "--shop-cipher", "BENCH_SHOP", "--refresh-token", "bench", "--base", base,
+           "--refresh-url", f"{base}/api/v2/token/refresh", "--token-state", state, "--mode", "range",
+           "--ge", str(ge), "--lt", str(lt), "--page-size", str(page_size), "--workers", str(workers),
+           "--out", out_file]
+    _, wall, rss = _run_measured(cmd, _child_env(base, state))
+    with open(out_file, "r", encoding="utf-8") as f:
+        n = len(json.load(f))
+    return {"wall_s": wall, "orders": n, "peak_rss_mb": rss}
+
+def start_mock(args, port):
+    cmd = [sys.executable, os.path.join(HERE, "mock_tts_server.py"), "--port", str(port), "--orders", str(args.orders),
+           "--start", str(args.start), "--days", str(args.days), "--latency-ms", str(args.latency_ms),
+           "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate),
+           "--rate-limit", str(args.rate_limit), "--app-secret", APP_SECRET]
+    p = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.PIPE, text=True)
+    p.stdout.readline()  # đợi dòng "Mock TikTok Shop API: ..." = server đã sẵn sàng
+    return p
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark client TikTok Shop trên mock server cục bộ.")
+    p.add_argument("--orders", type=int, default=10000, help="Số đơn giả trên mock server")
+    p.add_argument("--start", type=int, default=1756000000)
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--page-sizes", default="20,50,100")
+    p.add_argument("--concurrency", default="1,4,8", help="1 = tuần tự; >1 = fetch_orders_by_created_parallel")
+    p.add_argument("--latency-ms", type=float, default=20.0)
+    p.add_argument("--jitter-ms", type=float, default=5.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--rate-limit", type=float, default=0.0)
+    p.add_argument("--cli", action="store_true", help="Đo thêm run_orders_cli.py end-to-end (gồm khởi động + ghi file)")
+    p.add_argument("--json", help="Ghi kết quả ra file JSON")
+    # nội bộ: chạy 1 cấu hình trong process con
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--ge", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--lt", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--page-size", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--workers", type=int, default=1, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.child:
+        return run_child(args)
+
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    ge, lt = args.start, args.start + args.days * 86400
+    mock = start_mock(args, port)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for ps in [int(x) for x in args.page_sizes.split(",")]:
+                for c in [int(x) for x in args.concurrency.split(",")]:
+                    r = bench_fetch(base, ge, lt, ps, c, tmpdir)
+                    r.update(target="fetch", page_size=ps, concurrency=c)
+                    if args.cli:
+                        cli = bench_cli(base, ge, lt, ps, c, tmpdir)
+                        r["cli_wall_s"], r["cli_peak_rss_mb"] = cli["wall_s"], cli["peak_rss_mb"]
+                    results.append(r)
+                    print(f"page_size={ps:>3} conc={c:>2}  {r['pages']:>5} pages  {r['orders']:>6} orders  "
+                          f"{r['pages'] / r['wall_s']:>8.1f} pages/s  {r['orders'] / r['wall_s']:>9.1f} orders/s  "
+                          f"p50={r['p50_ms']:.1f}ms p99={r['p99_ms']:.1f}ms  rss={r['peak_rss_mb']}MB"
+                          + (f"  cli={r['cli_wall_s']:.2f}s/{r['cli_peak_rss_mb']}MB" if args.cli else ""),
+                          flush=True)
+    finally:
+        mock.terminate()
+        mock.wait()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# bench_startup.py — đo thời gian khởi động: import các module chính, `run_orders_cli.py --help`, và 1 lần kéo nhỏ
+# trên mock_tts_server.py (như 1 lần chạy cron). Mỗi lệnh chạy --repeat lần trong process con mới, in min / median.
+# --importtime MODULE: in các import tốn thời gian nhất của module đó (python -X importtime).
+# Ví dụ:
+#   python bench_startup.py --repeat 10
+#   python bench_startup.py --importtime orders_search --top 15
+import os, sys, json, time, argparse, tempfile, subprocess
+from statistics import median
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _time_cmd(cmd, env, repeat):
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        walls.append(time.perf_counter() - t0)
+    return {"min_ms": round(min(walls) * 1000, 1), "median_ms": round(median(walls) * 1000, 1)}
+
+def _import_cmd(module):
+    return [sys.executable, "-c", f"import {module}"]
+
+def importtime(module: str, top: int = 20):
+    """[(cumulative_us, self_us, tên)] của các import chậm nhất khi import module."""
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=HERE,
+                       capture_output=True, text=True, check=True)
+    rows = []
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cum_us, name = (x.strip() for x in line[len("import time:"):].split("|"))
+        rows.append((int(cum_us), int(self_us), name))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+def bench_small_run(env, repeat):
+    """run_orders_cli.py --mode range trên mock (50 đơn / 1 trang): khởi động + 1 request + ghi file."""
+    from bench_fetch import APP_KEY, APP_SECRET, _free_port, _child_env
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_tts_server.py"), "--port", str(port),
+                             "--orders", "50", "--days", "1", "--app-secret", APP_SECRET],
+                            cwd=HERE, stdout=subprocess.PIPE, text=True)
+    try:
+        mock.stdout.readline()  # server đã sẵn sàng
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state = os.path.join(tmpdir, "state.json")
+            cmd = [sys.executable, os.path.join(HERE, "run_orders_cli.py"), "--app-key", APP_KEY,
+                   "--app-secret", APP_SECRET, "--shop-cipher", "BENCH_SHOP", "--refresh-token", "bench",
+                   "--base", base, "--refresh-url", f"{base}/api/v2/token/refresh", "--token-state", state,
+                   "--mode", "range", "--ge", "1756000000", "--lt", "1756086400",
+                   "--out", os.path.join(tmpdir, "out.json")]
+            return _time_cmd(cmd, {**env, **_child_env(base, state)}, repeat)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Đo thời gian khởi động các lệnh / import chính.")
+    p.add_argument("--repeat", type=int, default=5, help="Số lần chạy mỗi lệnh")
+    p.add_argument("--modules", default="tts_client,orders_search,run_orders_cli",
+                   help="Các module đo thời gian import (phân tách bằng dấu phẩy)")
+    p.add_argument("--no-run", action="store_true", help="Bỏ qua lần kéo nhỏ trên mock server")
+    p.add_argument("--importtime", metavar="MODULE", help="Chỉ in các import chậm nhất của MODULE")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--json", help="Ghi kết quả ra file JSON")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.importtime:
+        print(f"{'cumul_ms':>9} {'self_ms':>8}  module")
+        for cum, self_, name in importtime(args.importtime, args.top):
+            print(f"{cum / 1000:>9.1f} {self_ / 1000:>8.1f}  {name}")
+        return
+
+    env = dict(os.environ)
+    targets = [("python -c pass", [sys.executable, "-c", "pass"])]
+    targets += [(f"import {m}", _import_cmd(m)) for m in args.modules.split(",") if m]
+    targets += [("run_orders_cli.py --help", [sys.executable, "run_orders_cli.py", "--help"]),
+                ("run_orders_cli.py report --help", [sys.executable, "run_orders_cli.py", "report", "--help"])]
+    results = []
+    for name, cmd in targets:
+        r = _time_cmd(cmd, env, args.repeat)
+        r["target"] = name
+        results.append(r)
+        print(f"{name:<36} min {r['min_ms']:>7.1f} ms   median {r['median_ms']:>7.1f} ms")
+    if not args.no_run:
+        r = bench_small_run(env, args.repeat)
+        r["target"] = "run_orders_cli.py (1 page, mock)"
+        results.append(r)
+        print(f"{r['target']:<36} min {r['min_ms']:>7.1f} ms   median {r['median_ms']:>7.1f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
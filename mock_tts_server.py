@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# mock_tts_server.py — server giả lập TikTok Shop API để đo hiệu năng client (không gọi API thật)
+#   POST /order/202309/orders/search  : page_token, page_size, sort_field/sort_order, time_filter
+#   GET  /order/202309/orders?ids=     : chi tiết tối đa 50 đơn / lần
+#   GET  /fulfillment/202309/packages/{id}, /fulfillment/202309/orders/{id}/tracking
+#   GET  /api/v2/token/refresh        : trả access_token mới
+# Có thể cấu hình độ trễ, tỉ lệ lỗi 5xx, giới hạn request/giây (trả 429 + Retry-After).
+import json, time, random, base64, hmac, hashlib, argparse, threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+SEARCH_PATH = "/order/202309/orders/search"
+DETAIL_PATH = "/order/202309/orders"
+PACKAGE_PREFIX = "/fulfillment/202309/packages/"
+TRACKING_PREFIX = "/fulfillment/202309/orders/"
+REFRESH_PATH = "/api/v2/token/refresh"
+
+_SKUS = [("AUT206-BLACK", "Đen", "219000", "399000"), ("AUT206-WHITE", "Trắng", "219000", "399000"),
+         ("CAB01-1M", "1m", "89000", "150000"), ("CAB01-2M", "2m", "99000", "180000"),
+         ("PWB10K", "10000mAh", "259000", "450000")]
+_STATUSES = ["UNPAID", "AWAITING_SHIPMENT", "AWAITING_COLLECTION", "IN_TRANSIT", "DELIVERED", "COMPLETED",
+             "CANCELLED"]
+
+def make_order(rng: random.Random, create_time: int):
+    """Đơn giả có cấu trúc giống orders_20250905_123608.json."""
+    oid = str(rng.randrange(10 ** 17, 10 ** 18))
+    status = rng.choice(_STATUSES)
+    n_items = rng.choice((1, 1, 1, 2, 3))
+    pkg_id = str(rng.randrange(10 ** 18, 2 * 10 ** 18))
+    shipped = status in ("AWAITING_COLLECTION", "IN_TRANSIT", "DELIVERED", "COMPLETED")
+    tracking = f"8{rng.randrange(10 ** 10, 10 ** 11)}" if shipped else ""
+    items, sub_total, original_total, seller_discount = [], 0, 0, 0
+    for _ in range(n_items):
+        sku, sku_name, sale, original = rng.choice(_SKUS)
+        sub_total += int(sale); original_total += int(original); seller_discount += int(original) - int(sale)
+        items.append({
+            "cancel_reason": "Không còn nhu cầu" if status == "CANCELLED" else "",
+            "cancel_user": "BUYER" if status == "CANCELLED" else "",
+            "currency": "VND", "display_status": status,
+            "id": str(rng.randrange(10 ** 17, 10 ** 18)), "is_gift": False,
+            "original_price": original, "package_id": pkg_id, "package_status": status,
+            "platform_discount": "0", "product_id": "1730659867941177786",
+            "product_name": "Tai nghe Bluetooth Nhét Tai nghe nhạc 1HORA - Pin trâu sử dụng đến 19 tiếng - AUT206",
+            "sale_price": sale, "seller_discount": str(int(original) - int(sale)), "seller_sku": sku,
+            "shipping_provider_id": "6841743441349706241", "shipping_provider_name": "J&T Express",
+            "sku_id": "1730659868119108026",
+            "sku_image": "https://p16-oec-va.ibyteimg.com/tos-maliva-i-o3syd03w52-us/"
+                         "377588d0e6a64e628d30e9412fd3534d~tplv-o3syd03w52-origin-jpeg.jpeg",
+            "sku_name": sku_name, "sku_type": "NORMAL", "tracking_number": tracking,
+        })
+    update_time = create_time + rng.randrange(0, 3 * 86400)
+    order = {
+        "buyer_email": f"{oid[:10]}@scs2.tiktok.com", "buyer_message": "",
+        "cancel_order_sla_time": create_time + 2 * 86400,
+        "collection_due_time": create_time + 4 * 86400, "commerce_platform": "TIKTOK_SHOP",
+        "create_time": create_time, "delivery_option_id": "7057025213938009858",
+        "delivery_option_name": "Standard shipping", "delivery_type": "HOME_DELIVERY",
+        "fulfillment_priority_level": 600, "fulfillment_type": "FULFILLMENT_BY_SELLER",
+        "has_updated_recipient_address": False, "id": oid, "is_cod": rng.random() < 0.6,
+        "is_on_hold_order": False, "is_replacement_order": False, "is_sample_order": False,
+        "line_items": items, "order_type": "NORMAL", "packages": [{"id": pkg_id}],
+        "payment": {
+            "currency": "VND", "original_shipping_fee": "19700",
+            "original_total_product_price": str(original_total), "platform_discount": "0",
+            "seller_discount": str(seller_discount), "shipping_fee": "0",
+            "shipping_fee_cofunded_discount": "0", "shipping_fee_platform_discount": "19700",
+            "shipping_fee_seller_discount": "0", "sub_total": str(sub_total), "tax": "0",
+            "total_amount": str(sub_total),
+        },
+        "payment_method_name": "Cash on delivery",
+        "recipient_address": {
+            "address_detail": "Đư*****************", "address_line1": "Đư*****************",
+            "address_line2": "", "address_line3": "", "address_line4": "",
+            "district_info": [
+                {"address_level": "L0", "address_level_name": "Country", "address_name": "Việt Nam"},
+                {"address_level": "L1", "address_level_name": "city", "address_name": "Hồ Chí Minh"},
+                {"address_level": "L2", "address_level_name": "district", "address_name": "Hóc Môn"},
+            ],
+            "full_address": "Việt Nam, Hồ Chí Minh, Hóc Môn, Đư*****************",
+            "name": "n***ễn t** p***ng g***g", "phone_number": "(+84)089*****02", "postal_code": "",
+            "region_code": "VN",
+        },
+        "rts_sla_time": create_time + 86400, "shipping_due_time": create_time + 2 * 86400,
+        "shipping_provider": "J&T Express", "shipping_provider_id": "6841743441349706241",
+        "shipping_type": "TIKTOK", "status": status, "tracking_number": tracking,
+        "tts_sla_time": create_time + 86400, "update_time": update_time,
+        "user_id": str(rng.randrange(7 * 10 ** 18, 8 * 10 ** 18)), "warehouse_id": "7365514467294365445",
+    }
+    if status == "CANCELLED":
+        order.update(cancel_reason="Không còn nhu cầu", cancel_time=update_time, cancellation_initiator="BUYER")
+    return order
+
+def generate_orders(count: int, start: int, end: int, seed: int = 1):
+    """count đơn có create_time rải ngẫu nhiên trong [start, end), sắp xếp create_time tăng dần."""
+    rng = random.Random(seed)
+    times = sorted(rng.randrange(start, end) for _ in range(count))
+    return [make_order(rng, t) for t in times]
+
+
+class MockState:
+    def __init__(self, orders, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0.0,
+                 app_secret=None, token_ttl=3600, seed=1):
+        self.orders = orders
+        self.create_times = [o["create_time"] for o in orders]
+        self.by_id = {o["id"]: o for o in orders}
+        self.by_package = {p["id"]: o for o in orders for p in o.get("packages") or []}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.app_secret = app_secret
+        self.token_ttl = token_ttl
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {"search": 0, "detail": 0, "package": 0, "tracking": 0, "refresh": 0, "429": 0, "5xx": 0,
+                      "bad_sign": 0}
+        self.token_seq = 0
+
+    def sleep(self):
+        d = self.latency_ms + (self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        if d > 0:
+            time.sleep(d / 1000.0)
+
+    def over_rate(self):
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            self.window_count += 1
+            return self.window_count > self.rate_limit
+
+    def search(self, q: dict, body: dict):
+        field = q.get("sort_field") or "create_time"
+        tf = body.get("time_filter") or {}
+        ct_ge, ct_lt = tf.get("create_time_ge"), tf.get("create_time_lt")
+        lo = bisect_left(self.create_times, ct_ge) if ct_ge is not None else 0
+        hi = bisect_left(self.create_times, ct_lt) if ct_lt is not None else len(self.orders)
+        matched = self.orders[lo:hi]
+        ut_ge, ut_lt = tf.get("update_time_ge"), tf.get("update_time_lt")
+        if ut_ge is not None or ut_lt is not None:
+            matched = [o for o in matched if (ut_ge is None or o["update_time"] >= ut_ge)
+                       and (ut_lt is None or o["update_time"] < ut_lt)]
+        if body.get("order_status"):
+            matched = [o for o in matched if o["status"] == body["order_status"]]
+        desc = (q.get("sort_order") or "DESC").upper() == "DESC"
+        if field != "create_time":
+            matched = sorted(matched, key=lambda o: o[field])
+        if desc:
+            matched = matched[::-1]
+        size = max(1, min(100, int(q.get("page_size") or 20)))
+        offset = int(base64.urlsafe_b64decode(q["page_token"]).decode()) if q.get("page_token") else 0
+        page = matched[offset:offset + size]
+        nxt = offset + size
+        token = base64.urlsafe_b64encode(str(nxt).encode()).decode() if nxt < len(matched) else ""
+        return {"orders": page, "next_page_token": token, "total_count": len(matched)}
+
+    def package(self, package_id: str):
+        o = self.by_package.get(package_id)
+        if o is None:
+            return None
+        items = [li for li in o["line_items"] if li.get("package_id") == package_id]
+        return {"package_id": package_id, "package_status": items[0]["package_status"] if items else o["status"],
+                "shipping_provider_name": "J&T Express", "tracking_number": o.get("tracking_number", ""),
+                "create_time": o["create_time"], "update_time": o["update_time"],
+                "orders": [{"id": o["id"], "skus": [{"id": li["sku_id"], "quantity": 1} for li in items]}]}
+
+    def tracking(self, order_id: str):
+        o = self.by_id.get(order_id)
+        if o is None:
+            return None
+        return {"tracking": [
+            {"description": "Đơn hàng đã được tạo", "update_time_millis": o["create_time"] * 1000},
+            {"description": f"Trạng thái: {o['status']}", "update_time_millis": o["update_time"] * 1000}]}
+
+    def check_sign(self, path: str, q: dict, body_text: str):
+        if not self.app_secret:
+            return True
+        params = "".join(f"{k}{q[k]}" for k in sorted(q) if k not in ("sign", "access_token"))
+        text = f"{self.app_secret}{path}{params}{body_text}{self.app_secret}"
+        expect = hmac.new(self.app_secret.encode(), text.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expect, q.get("sign", ""))
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive như API thật
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, obj: dict, headers: dict | None = None):
+            data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _faults(self):
+            if state.over_rate():
+                state.stats["429"] += 1
+                self._reply(429, {"code": 429, "message": "Too many requests"}, {"Retry-After": "1"})
+                return True
+            if state.error_rate and state.rng.random() < state.error_rate:
+                state.stats["5xx"] += 1
+                self._reply(503, {"code": 503, "message": "Service unavailable (injected)"})
+                return True
+            return False
+
+        def _check_request(self, u, q: dict, body_text: str = ""):
+            """401 nếu thiếu token / sai chữ ký; trả True nếu đã trả lời lỗi."""
+            if not self.headers.get("x-tts-access-token"):
+                self._reply(401, {"code": 105002, "message": "access token is expired"})
+                return True
+            if not state.check_sign(u.path, q, body_text):
+                state.stats["bad_sign"] += 1
+                self._reply(401, {"code": 106001, "message": "invalid sign"})
+                return True
+            return False
+
+        def _ok(self, data: dict):
+            self._reply(200, {"code": 0, "message": "Success", "request_id": "mock", "data": data})
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            if u.path == REFRESH_PATH:
+                return self._refresh()
+            if u.path == DETAIL_PATH:
+                kind = "detail"
+            elif u.path.startswith(PACKAGE_PREFIX):
+                kind = "package"
+            elif u.path.startswith(TRACKING_PREFIX) and u.path.endswith("/tracking"):
+                kind = "tracking"
+            else:
+                return self._reply(404, {"code": 404, "message": "not found"})
+            state.sleep()
+            if self._faults():
+                return
+            q = dict(parse_qsl(u.query))
+            if self._check_request(u, q):
+                return
+            with state.lock:
+                state.stats[kind] += 1
+            if kind == "detail":
+                ids = [i for i in (q.get("ids") or "").split(",") if i]
+                if not ids or len(ids) > 50:
+                    return self._reply(400, {"code": 36009004, "message": "ids phải có 1..50 phần tử"})
+                return self._ok({"orders": [state.by_id[i] for i in ids if i in state.by_id]})
+            if kind == "package":
+                data = state.package(u.path[len(PACKAGE_PREFIX):])
+            else:
+                data = state.tracking(u.path[len(TRACKING_PREFIX):-len("/tracking")])
+            if data is None:
+                return self._reply(404, {"code": 21011001, "message": "not found"})
+            self._ok(data)
+
+        def _refresh(self):
+            state.sleep()
+            with state.lock:
+                state.stats["refresh"] += 1
+                state.token_seq += 1
+                seq = state.token_seq
+            self._reply(200, {"code": 0, "message": "success", "data": {
+                "access_token": f"MOCK_AT_{seq}", "access_token_expire_in": state.token_ttl,
+                "refresh_token": "MOCK_RT", "refresh_token_expire_in": 30 * 86400}})
+
+        def do_POST(self):
+            u = urlparse(self.path)
+            body_text = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+            if u.path != SEARCH_PATH:
+                return self._reply(404, {"code": 404, "message": "not found"})
+            state.sleep()
+            if self._faults():
+                return
+            q = dict(parse_qsl(u.query))
+            if self._check_request(u, q, body_text):
+                return
+            with state.lock:
+                state.stats["search"] += 1
+            self._ok(state.search(q, json.loads(body_text or "{}")))
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8900, **kwargs):
+    """Tạo server (chưa chạy). Gọi .serve_forever() hoặc chạy trong thread."""
+    srv = ThreadingHTTPServer((host, port), make_handler(MockState(**kwargs)))
+    srv.daemon_threads = True
+    return srv
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Mock TikTok Shop API (orders search/detail, package, tracking, token/refresh) để benchmark.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--orders", type=int, default=5000, help="Số đơn giả sinh ra")
+    p.add_argument("--start", type=int, default=1756000000, help="create_time nhỏ nhất (epoch giây)")
+    p.add_argument("--days", type=int, default=7, help="Số ngày rải đơn tính từ --start")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Độ trễ mỗi request")
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ trả 503 (0..1)")
+    p.add_argument("--rate-limit", type=float, default=0.0, help="Số request/giây trước khi trả 429 (0 = tắt)")
+    p.add_argument("--app-secret", help="Nếu có: kiểm tra chữ ký của request")
+    return p.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    orders = generate_orders(args.orders, args.start, args.start + args.days * 86400, args.seed)
+    srv = serve(args.host, args.port, orders=orders, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                error_rate=args.error_rate, rate_limit=args.rate_limit, app_secret=args.app_secret,
+                seed=args.seed)
+    print(f"Mock TikTok Shop API: http://{args.host}:{args.port} ({len(orders)} đơn)", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
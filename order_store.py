@@ -0,0 +1,349 @@
+# order_store.py — kho đơn cục bộ (SQLite + WAL): upsert theo id, truy vấn có index, không cần quét file dump
+import json, sqlite3, threading, argparse
+from datetime import datetime, timedelta, timezone
+import tts_json
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+DEFAULT_DB = "orders.db"
+
+# Tiền (sale_price, total_amount, ...) API trả dạng chuỗi; cột NUMERIC để SQLite tự đổi sang số khi so sánh/cộng
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id                     TEXT PRIMARY KEY,
+    shop                   TEXT,
+    status                 TEXT,
+    create_time            INTEGER,
+    update_time            INTEGER,
+    user_id                TEXT,
+    is_cod                 INTEGER,
+    delivery_option_name   TEXT,
+    cancellation_initiator TEXT,
+    raw                    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_create_time ON orders(create_time);
+CREATE INDEX IF NOT EXISTS idx_orders_update_time ON orders(update_time);
+CREATE INDEX IF NOT EXISTS idx_orders_status      ON orders(status, create_time);
+
+CREATE TABLE IF NOT EXISTS line_items (
+    id                TEXT NOT NULL,
+    order_id          TEXT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    seller_sku        TEXT,
+    sku_id            TEXT,
+    product_id        TEXT,
+    product_name      TEXT,
+    sku_name          TEXT,
+    display_status    TEXT,
+    package_id        TEXT,
+    currency          TEXT,
+    sale_price        NUMERIC,
+    original_price    NUMERIC,
+    seller_discount   NUMERIC,
+    platform_discount NUMERIC,
+    is_gift           INTEGER,
+    PRIMARY KEY (order_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_line_items_order_id   ON line_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_line_items_seller_sku ON line_items(seller_sku);
+
+CREATE TABLE IF NOT EXISTS packages (
+    id       TEXT NOT NULL,
+    order_id TEXT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    PRIMARY KEY (order_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_packages_id ON packages(id);
+
+CREATE TABLE IF NOT EXISTS payment (
+    order_id                     TEXT PRIMARY KEY REFERENCES orders(id) ON DELETE CASCADE,
+    currency                     TEXT,
+    total_amount                 NUMERIC,
+    sub_total                    NUMERIC,
+    original_total_product_price NUMERIC,
+    shipping_fee                 NUMERIC,
+    original_shipping_fee        NUMERIC,
+    seller_discount              NUMERIC,
+    platform_discount            NUMERIC,
+    tax                          NUMERIC
+);
+"""
+
+_LINE_ITEM_COLS = ("seller_sku", "sku_id", "product_id", "product_name", "sku_name", "display_status",
+                   "package_id", "currency", "sale_price", "original_price", "seller_discount",
+                   "platform_discount", "is_gift")
+_PAYMENT_COLS = ("currency", "total_amount", "sub_total", "original_total_product_price", "shipping_fee",
+                 "original_shipping_fee", "seller_discount", "platform_discount", "tax")
+
+
+class OrderStore:
+    """
+    Kho SQLite (WAL) chứa đơn đã chuẩn hoá: orders / line_items / packages / payment.
+    Bản gốc từ API giữ nguyên trong orders.raw nên đọc ra vẫn đúng JSON của API.
+    Dùng được từ nhiều luồng (1 connection + lock).
+    """
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self.generation = 0  # tăng mỗi lần upsert_orders ghi thay đổi (xem version())
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate_line_items()
+        self.conn.executescript(_SCHEMA)
+
+    def _migrate_line_items(self):
+        """
+        Kho cũ: line_items khoá chính chỉ theo id → 1 id dòng hàng xuất hiện ở 2 đơn thì đơn sau đè mất dòng của
+        đơn trước. Đổi sang khoá (order_id, id) như packages, giữ nguyên dữ liệu.
+        Cả lượt đổi chạy trong 1 transaction tường minh (không dùng executescript vì nó tự COMMIT giữa chừng):
+        crash giữa chừng thì kho còn nguyên bảng cũ. Kho dở dang từ bản đổi cũ (còn line_items_old) thì chép nốt.
+        """
+        tables = {r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        pk = [r[1] for r in sorted((r for r in self.conn.execute("PRAGMA table_info(line_items)") if r[5]),
+                                   key=lambda r: r[5])]
+        if pk != ["id"] and "line_items_old" not in tables:
+            return
+        cols = ", ".join(("id", "order_id") + _LINE_ITEM_COLS)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if pk == ["id"]:
+                self.conn.execute("DROP INDEX IF EXISTS idx_line_items_order_id")
+                self.conn.execute("DROP INDEX IF EXISTS idx_line_items_seller_sku")
+                self.conn.execute("ALTER TABLE line_items RENAME TO line_items_old")
+            for stmt in _SCHEMA.split(";"):
+                if stmt.strip():
+                    self.conn.execute(stmt)
+            self.conn.execute(f"INSERT OR IGNORE INTO line_items ({cols}) SELECT {cols} FROM line_items_old")
+            self.conn.execute("DROP TABLE line_items_old")
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- ghi ----------
+    def upsert_orders(self, orders: list, shop: str | None = None):
+        """
+        Upsert theo id; bỏ qua đơn không mới hơn bản đang có (update_time không lớn hơn).
+        Trả về (số đơn mới, số đơn cập nhật).
+        """
+        if not orders:
+            return 0, 0
+        with self._lock, self.conn:
+            existing = {}
+            ids = [o["id"] for o in orders]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT id, update_time FROM orders WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                existing.update(rows)
+
+            latest = {}
+            for o in orders:
+                prev = latest.get(o["id"])
+                if prev is None or int(o.get("update_time", 0)) >= int(prev.get("update_time", 0)):
+                    latest[o["id"]] = o
+            todo = [o for oid, o in latest.items()
+                    if oid not in existing or int(o.get("update_time", 0)) > int(existing[oid] or 0)]
+            if not todo:
+                return 0, 0
+
+            todo_ids = [(o["id"],) for o in todo]
+            self.conn.executemany("DELETE FROM line_items WHERE order_id = ?", todo_ids)
+            self.conn.executemany("DELETE FROM packages WHERE order_id = ?", todo_ids)
+            self.conn.executemany("DELETE FROM payment WHERE order_id = ?", todo_ids)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO orders (id, shop, status, create_time, update_time, user_id, is_cod,"
+                " delivery_option_name, cancellation_initiator, raw) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                [(o["id"], shop, o.get("status"), int(o.get("create_time", 0)), int(o.get("update_time", 0)),
+                  o.get("user_id"), _bool(o.get("is_cod")), o.get("delivery_option_name"),
+                  o.get("cancellation_initiator"), tts_json.dumps_text(o))
+                 for o in todo])
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO line_items (id, order_id, {', '.join(_LINE_ITEM_COLS)})"
+                f" VALUES (?, ?{', ?' * len(_LINE_ITEM_COLS)})",
+                [(li["id"], o["id"], *(_bool(li.get(c)) if c == "is_gift" else li.get(c) for c in _LINE_ITEM_COLS))
+                 for o in todo for li in (o.get("line_items") or [])])
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO packages (id, order_id) VALUES (?, ?)",
+                [(p["id"], o["id"]) for o in todo for p in (o.get("packages") or []) if p.get("id")])
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO payment (order_id, {', '.join(_PAYMENT_COLS)})"
+                f" VALUES (?{', ?' * len(_PAYMENT_COLS)})",
+                [(o["id"], *(o["payment"].get(c) for c in _PAYMENT_COLS)) for o in todo if o.get("payment")])
+            self.generation += 1
+
+        created = sum(1 for o in todo if o["id"] not in existing)
+        return created, len(todo) - created
+
+    def import_json_files(self, paths: list, shop: str | None = None):
+        """Nạp các file dump orders_*.json cũ vào kho (trùng id thì giữ bản mới nhất)."""
+        created = updated = 0
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                c, u = self.upsert_orders(json.load(f), shop=shop)
+            created += c; updated += u
+        return created, updated
+
+    # ---------- đọc ----------
+    @staticmethod
+    def _where(create_time_ge=None, create_time_lt=None, update_time_ge=None, update_time_lt=None,
+               status=None, seller_sku=None, shop=None):
+        """(mệnh đề WHERE, params) trên bảng orders o; status: 1 trạng thái hoặc list."""
+        where, params = [], []
+        for col, op, val in (("create_time", ">=", create_time_ge), ("create_time", "<", create_time_lt),
+                             ("update_time", ">=", update_time_ge), ("update_time", "<", update_time_lt),
+                             ("shop", "=", shop)):
+            if val is not None:
+                where.append(f"o.{col} {op} ?"); params.append(val)
+        if status is not None:
+            statuses = [status] if isinstance(status, str) else list(status)
+            where.append(f"o.status IN ({','.join('?' * len(statuses))})"); params.extend(statuses)
+        if seller_sku is not None:
+            where.append("EXISTS (SELECT 1 FROM line_items li WHERE li.order_id = o.id AND li.seller_sku = ?)")
+            params.append(seller_sku)
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def query(self, create_time_ge: int | None = None, create_time_lt: int | None = None,
+              update_time_ge: int | None = None, update_time_lt: int | None = None,
+              status: str | None = None, seller_sku: str | None = None,
+              shop: str | None = None, limit: int | None = None):
+        """Trả về list đơn (JSON gốc của API), mới -> cũ theo create_time."""
+        where, params = self._where(create_time_ge, create_time_lt, update_time_ge, update_time_lt,
+                                    status, seller_sku, shop)
+        sql = "SELECT o.raw FROM orders o" + where + " ORDER BY o.create_time DESC, o.id DESC"
+        if limit:
+            sql += " LIMIT ?"; params.append(int(limit))
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def query_page(self, limit: int, after: tuple | None = None, **filters):
+        """
+        1 trang cho phân trang kiểu cursor (keyset, không OFFSET): [(create_time, id, raw JSON text)],
+        mới -> cũ; after = (create_time, id) của dòng cuối trang trước. filters: như query.
+        """
+        where, params = self._where(**filters)
+        if after is not None:
+            where += (" AND " if where else " WHERE ") + "(o.create_time < ? OR (o.create_time = ? AND o.id < ?))"
+            params += [int(after[0]), int(after[0]), str(after[1])]
+        sql = ("SELECT o.create_time, o.id, o.raw FROM orders o" + where +
+               " ORDER BY o.create_time DESC, o.id DESC LIMIT ?")
+        with self._lock:
+            return self.conn.execute(sql, params + [int(limit)]).fetchall()
+
+    def get(self, order_id: str):
+        raw = self.get_raw(order_id)
+        return json.loads(raw) if raw is not None else None
+
+    def get_raw(self, order_id: str):
+        """JSON gốc (chuỗi) của 1 đơn, không parse; None nếu không có."""
+        with self._lock:
+            row = self.conn.execute("SELECT raw FROM orders WHERE id = ?", (order_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, order_ids: list):
+        """dict id -> đơn cho các id có trong kho (đọc theo lô 500 id)."""
+        out = {}
+        ids = list(order_ids)
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT id, raw FROM orders WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                out.update((oid, json.loads(raw)) for oid, raw in rows)
+        return out
+
+    def update_times(self, order_ids: list):
+        """dict id -> update_time cho các id có trong kho (không đọc JSON gốc)."""
+        out = {}
+        ids = list(order_ids)
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                out.update(self.conn.execute(
+                    f"SELECT id, update_time FROM orders WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return out
+
+    def versions(self, create_time_ge: int | None = None, create_time_lt: int | None = None,
+                 shop: str | None = None):
+        """dict id -> (update_time, create_time), không đọc JSON gốc — dùng làm index cho orders_diff."""
+        where, params = [], []
+        for col, op, val in (("create_time", ">=", create_time_ge), ("create_time", "<", create_time_lt),
+                             ("shop", "=", shop)):
+            if val is not None:
+                where.append(f"{col} {op} ?"); params.append(val)
+        sql = "SELECT id, update_time, create_time FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            return {oid: (ut, ct) for oid, ut, ct in self.conn.execute(sql, params)}
+
+    def orders_created_today(self, **filters):
+        """Đơn tạo hôm nay (giờ VN)."""
+        now_vn = datetime.now(VN_TZ)
+        start = datetime(now_vn.year, now_vn.month, now_vn.day, tzinfo=VN_TZ)
+        return self.query(create_time_ge=int(start.timestamp()),
+                          create_time_lt=int((start + timedelta(days=1)).timestamp()), **filters)
+
+    def count(self, **filters):
+        """Số đơn (theo filters như query nếu có)."""
+        where, params = self._where(**filters)
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM orders o" + where, params).fetchone()[0]
+
+    def version(self):
+        """
+        Đổi mỗi khi dữ liệu đổi: generation (ghi qua object này) + PRAGMA data_version (process / connection
+        khác ghi vào cùng file, ví dụ orders_daemon.py). Dùng làm khoá cache cho orders_api.py.
+        """
+        with self._lock:
+            return self.generation, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _bool(v):
+    return None if v is None else int(bool(v))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Kho đơn cục bộ (SQLite): nạp file dump và truy vấn.")
+    p.add_argument("--db", default=DEFAULT_DB, help="Đường dẫn file SQLite")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="Nạp các file orders_*.json vào kho")
+    imp.add_argument("files", nargs="+")
+    imp.add_argument("--shop", help="Gắn nhãn shop cho các đơn nạp vào")
+    q = sub.add_parser("query", help="Truy vấn đơn (in JSON)")
+    q.add_argument("--today", action="store_true", help="Chỉ đơn tạo hôm nay (giờ VN)")
+    q.add_argument("--ge", type=int, help="create_time_ge (epoch giây)")
+    q.add_argument("--lt", type=int, help="create_time_lt (epoch giây)")
+    q.add_argument("--status", help="Ví dụ: CANCELLED")
+    q.add_argument("--sku", help="seller_sku")
+    q.add_argument("--shop")
+    q.add_argument("--limit", type=int)
+    return p.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    with OrderStore(args.db) as store:
+        if args.cmd == "import":
+            created, updated = store.import_json_files(args.files, shop=args.shop)
+            print(f"✅ Nạp {len(args.files)} file: {created} đơn mới, {updated} cập nhật; kho có {store.count()} đơn.")
+        else:
+            filters = {"status": args.status, "seller_sku": args.sku, "shop": args.shop, "limit": args.limit}
+            if args.today:
+                orders = store.orders_created_today(**filters)
+            else:
+                orders = store.query(create_time_ge=args.ge, create_time_lt=args.lt, **filters)
+            print(tts_json.dumps_pretty(orders))
+            print(f"\n✅ {len(orders)} đơn.")
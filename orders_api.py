@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# orders_api.py — API đọc nội bộ: phục vụ đơn từ kho SQLite (order_store.py) cho các hệ thống khác trong công ty,
+# thay vì mỗi hệ thống tự gọi orders/search (N hệ thống → N lần kéo, tốn quota rate limit của shop).
+#   GET /orders       : lọc theo thời gian / trạng thái / SKU, phân trang bằng page_token (giống API TikTok)
+#   GET /orders/{id}  : 1 đơn
+#   GET /healthz      : thống kê dạng JSON
+# 1 luồng nền gọi orders_sync.sync_incremental mỗi --refresh giây → N hệ thống đọc chỉ tốn 1 lần kéo upstream.
+# Response có ETag (If-None-Match → 304) và nén gzip khi client gửi Accept-Encoding: gzip.
+# Ví dụ:
+#   python orders_api.py --port 9200 --store orders.db --refresh 60
+#   curl -s --compressed 'http://127.0.0.1:9200/orders?date=today&status=AWAITING_SHIPMENT&page_size=100'
+#   curl -s --compressed 'http://127.0.0.1:9200/orders?seller_sku=SKU-1&page_token=...'
+import json, gzip, time, base64, signal, hashlib, argparse, threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from datetime import datetime, timedelta, timezone
+import tts_json
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+MAX_PAGE_SIZE = 100  # như orders/search
+GZIP_MIN = 1024      # body nhỏ hơn thì nén không đáng
+
+_INT_PARAMS = ("create_time_ge", "create_time_lt", "update_time_ge", "update_time_lt")
+
+def log(msg: str):
+    print(f"[{datetime.now(VN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+def encode_page_token(create_time: int, order_id: str) -> str:
+    """page_token = vị trí dòng cuối trang trước (create_time, id), base64 url-safe."""
+    raw = json.dumps([int(create_time), str(order_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_page_token(token: str):
+    try:
+        ct, oid = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return int(ct), str(oid)
+    except (ValueError, TypeError):
+        raise ValueError("page_token không hợp lệ")
+
+def _day_range(day: str):
+    """[ge, lt) epoch của 1 ngày theo giờ VN; day: YYYY-MM-DD hoặc today."""
+    if day == "today":
+        start = datetime.now(VN_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        try:
+            start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=VN_TZ)
+        except ValueError:
+            raise ValueError(f"date không hợp lệ: {day} (YYYY-MM-DD hoặc today)")
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(start.timestamp()), int((start + timedelta(days=1)).timestamp())
+
+def parse_query(qs: str, default_page_size: int = 50):
+    """
+    Query string → (filters cho OrderStore.query_page, page_size, after).
+    Tham số: create_time_ge/lt, update_time_ge/lt (epoch), date (YYYY-MM-DD|today, theo create_time),
+    status (1 hoặc nhiều, phân tách bằng dấu phẩy), seller_sku, shop, page_size, page_token.
+    Sai tham số → ValueError (handler trả 400).
+    """
+    q = {k: v[-1] for k, v in parse_qs(qs, keep_blank_values=False).items()}
+    unknown = set(q) - {*_INT_PARAMS, "date", "status", "seller_sku", "shop", "page_size", "page_token"}
+    if unknown:
+        raise ValueError(f"tham số không hỗ trợ: {', '.join(sorted(unknown))}")
+    filters = {}
+    for k in _INT_PARAMS:
+        if k in q:
+            try:
+                filters[k] = int(q[k])
+            except ValueError:
+                raise ValueError(f"{k} phải là epoch (số nguyên)")
+    if "date" in q:
+        ge, lt = _day_range(q["date"])
+        filters["create_time_ge"] = max(ge, filters.get("create_time_ge", ge))
+        filters["create_time_lt"] = min(lt, filters.get("create_time_lt", lt))
+    if "status" in q:
+        statuses = sorted({s.strip().upper() for s in q["status"].split(",") if s.strip()})
+        if statuses:
+            filters["status"] = statuses
+    for k in ("seller_sku", "shop"):
+        if k in q:
+            filters[k] = q[k]
+    try:
+        page_size = int(q.get("page_size", default_page_size))
+    except ValueError:
+        raise ValueError("page_size phải là số nguyên")
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size phải trong khoảng 1..{MAX_PAGE_SIZE}")
+    after = decode_page_token(q["page_token"]) if q.get("page_token") else None
+    return filters, page_size, after
+
+
+class Response:
+    """Body JSON đã dựng sẵn + ETag (yếu, dùng chung cho bản thường và bản gzip) + bản gzip tạo khi cần."""
+    __slots__ = ("status", "body", "etag", "_gz")
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+        self.etag = 'W/"' + hashlib.sha1(body).hexdigest()[:32] + '"'
+        self._gz = None
+
+    def gzipped(self):
+        if self._gz is None:
+            self._gz = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gz
+
+
+class ResponseCache:
+    """
+    LRU các response đã dựng, khoá (phiên bản kho, path, tham số đã chuẩn hoá).
+    Kho đổi (refresher / process khác ghi) → phiên bản đổi → khoá cũ không còn được hỏi tới và bị đẩy ra dần.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(0, int(max_entries))
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            resp = self._items.get(key)
+            if resp is not None:
+                self._items.move_to_end(key)
+            return resp
+
+    def put(self, key, resp: Response):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._items[key] = resp
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _envelope(data: bytes) -> bytes:
+    return b'{"code":0,"data":' + data + b',"message":"Success"}'
+
+def build_orders_page(store, filters: dict, page_size: int, after=None) -> bytes:
+    """
+    Body giống orders/search: {"code":0,"data":{"next_page_token","orders","total_count"},"message"}.
+    Ghép thẳng JSON gốc trong orders.raw, không json.loads/dumps từng đơn.
+    """
+    rows = store.query_page(page_size + 1, after=after, **filters)
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    token = encode_page_token(rows[-1][0], rows[-1][1]) if more else ""
+    total = store.count(**filters)
+    data = (b'{"next_page_token":' + json.dumps(token).encode("ascii") +
+            b',"orders":[' + b",".join(r[2].encode("utf-8") for r in rows) +
+            b'],"total_count":' + str(total).encode("ascii") + b"}")
+    return _envelope(data)
+
+
+def build_order(store, order_id: str):
+    """Body giống Get Order Detail ({"orders":[đơn]}); None nếu kho không có đơn."""
+    raw = store.get_raw(order_id)
+    return None if raw is None else _envelope(b'{"orders":[' + raw.encode("utf-8") + b"]}")
+
+
+class Refresher:
+    """
+    Luồng nền: sync_incremental(store=...) mỗi `interval` giây để kho luôn ấm.
+    Lỗi: ghi log, thử lại với backoff luỹ thừa (tối đa max_backoff giây), API đọc vẫn phục vụ dữ liệu đang có.
+    """
+
+    def __init__(self, client, store, interval: float, cursor_file: str, overlap: int = 600,
+                 window_days: int = 7, page_size: int = 50, max_backoff: float = 900.0):
+        self.client = client
+        self.store = store
+        self.interval = float(interval)
+        self.cursor_file = cursor_file
+        self.overlap = overlap
+        self.window_days = window_days
+        self.page_size = page_size
+        self.max_backoff = max_backoff
+        self.stats = {"runs": 0, "errors": 0, "fetched": 0, "last_ok": None, "last_error": None}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="refresher", daemon=True)
+
+    def refresh_once(self):
+        from orders_sync import sync_incremental
+        t0 = time.monotonic()
+        res = sync_incremental(None, cursor_file=self.cursor_file, overlap=self.overlap,
+                               window_days=self.window_days, page_size=self.page_size,
+                               client=self.client, store=self.store)
+        self.stats["runs"] += 1
+        self.stats["fetched"] += res["fetched"]
+        self.stats["last_ok"] = int(time.time())
+        if res["created"] or res["updated"]:
+            log(f"✔ Làm mới: {res['fetched']} đơn thay đổi ({res['created']} mới, {res['updated']} cập nhật), "
+                f"cursor={res['cursor']} ({time.monotonic() - t0:.1f}s)")
+        return res
+
+    def _loop(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.refresh_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.stats["errors"] += 1
+                self.stats["last_error"] = str(e)
+                log(f"✖ Làm mới lỗi (lần {failures}): {e}")
+            delay = min(self.max_backoff, self.interval * (2 ** (failures - 1))) if failures else self.interval
+            self._stop.wait(delay)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class OrdersAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "tts-orders-api"
+
+    def _send(self, resp: Response, head_only: bool = False):
+        srv = self.server
+        inm = self.headers.get("If-None-Match")
+        if resp.status == 200 and inm and _etag_matches(inm, resp.etag):
+            srv.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", resp.etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = resp.body
+        gz = len(body) >= GZIP_MIN and _accepts_gzip(self.headers.get("Accept-Encoding"))
+        if gz:
+            body = resp.gzipped()
+            srv.count("gzip")
+        self.send_response(resp.status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if resp.status == 200:
+            self.send_header("ETag", resp.etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def _error(self, status: int, message: str, head_only: bool = False):
+        self.server.count("errors")
+        body = tts_json.dumps({"code": status, "message": message})
+        self._send(Response(status, body), head_only)
+
+    def do_GET(self, head_only: bool = False):
+        srv = self.server
+        srv.count("requests")
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        if path == "/healthz":
+            return self._send(Response(200, tts_json.dumps(srv.snapshot())),
+                              head_only)
+        if path == "/orders":
+            try:
+                filters, page_size, after = parse_query(url.query, srv.page_size)
+            except ValueError as e:
+                return self._error(400, str(e), head_only)
+            key = ("orders", tuple(sorted((k, tuple(v) if isinstance(v, list) else v)
+                                          for k, v in filters.items())), page_size, after)
+            build = lambda: build_orders_page(srv.store, filters, page_size, after)
+        elif path.startswith("/orders/"):
+            oid = unquote(path[len("/orders/"):])
+            key = ("order", oid)
+            build = lambda: build_order(srv.store, oid)
+        else:
+            return self._error(404, "not found", head_only)
+
+        version = srv.store.version()
+        resp = srv.cache.get((version, key))
+        if resp is None:
+            body = build()
+            if body is None:
+                return self._error(404, f"không có đơn {key[1]}", head_only)
+            resp = Response(200, body)
+            srv.cache.put((version, key), resp)
+        else:
+            srv.count("cache_hits")
+        self._send(resp, head_only)
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def log_message(self, fmt, *args):
+        pass  # không log từng request; xem /healthz
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """So sánh yếu (RFC 9110): bỏ tiền tố W/ ở cả 2 phía."""
+    want = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == want:
+            return True
+    return False
+
+def _accepts_gzip(header: str | None) -> bool:
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class OrdersAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, store, refresher: Refresher | None = None, page_size: int = 50,
+                 cache_entries: int = 256):
+        super().__init__(addr, OrdersAPIHandler)
+        self.store = store
+        self.refresher = refresher
+        self.page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        self.cache = ResponseCache(cache_entries)
+        self.stats = {"requests": 0, "cache_hits": 0, "not_modified": 0, "gzip": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def snapshot(self):
+        with self._stats_lock:
+            s = dict(self.stats)
+        s["orders"] = self.store.count()
+        s["cached_responses"] = len(self.cache)
+        if self.refresher is not None:
+            s["refresher"] = dict(self.refresher.stats, interval=self.refresher.interval)
+        return s
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="API đọc nội bộ: phục vụ đơn từ kho SQLite, làm mới kho ở luồng nền.")
+    p.add_argument("--app-key"); p.add_argument("--app-secret")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--shop-id"); g.add_argument("--shop-cipher")
+    p.add_argument("--refresh-token")
+    p.add_argument("--base", help="TTS_BASE")
+    p.add_argument("--refresh-url", help="TTS_REFRESH_URL")
+    p.add_argument("--token-state", help="File token state (mặc định TTS_TOKEN_STATE hoặc token_state.json)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9200)
+    p.add_argument("--store", default="orders.db", help="Kho SQLite (order_store.py)")
+    p.add_argument("--refresh", type=float, default=60.0,
+                   help="Chu kỳ làm mới kho từ API (giây); 0 = chỉ phục vụ (kho do orders_daemon.py / "
+                        "webhook_server.py ghi)")
+    p.add_argument("--cursor", default="sync_cursor.json")
+    p.add_argument("--overlap", type=int, default=600)
+    p.add_argument("--window-days", type=int, default=7, help="Lần đầu (chưa có cursor) lấy bao nhiêu ngày")
+    p.add_argument("--page-size", type=int, default=50, help="page_size mặc định của GET /orders")
+    p.add_argument("--cache-entries", type=int, default=256, help="Số response giữ trong cache (0 = tắt)")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    from order_store import OrderStore
+
+    args = parse_args(argv)
+    store = OrderStore(args.store)
+    client = refresher = None
+    if args.refresh > 0:
+        from orders_daemon import client_from_args
+        client = client_from_args(args)
+        refresher = Refresher(client, store, args.refresh, args.cursor, overlap=args.overlap,
+                              window_days=args.window_days)
+    srv = OrdersAPIServer((args.host, args.port), store, refresher, page_size=args.page_size,
+                          cache_entries=args.cache_entries)
+
+    def stop(*_):
+        log("⏹ Đang dừng...")
+        threading.Thread(target=srv.shutdown, daemon=True).start()
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, stop)
+
+    if refresher is not None:
+        client.tokens.start()
+        refresher.start()
+    log(f"▶ API đọc: http://{args.host}:{args.port}/orders ← {args.store}"
+        f"{f' (làm mới mỗi {args.refresh:g}s)' if refresher else ''} (Ctrl+C để dừng)")
+    try:
+        srv.serve_forever()
+    finally:
+        srv.server_close()
+        if refresher is not None:
+            refresher.stop()
+            client.tokens.stop()
+            import tts_http
+            tts_http.close()
+        s = srv.snapshot()
+        store.close()
+        log(f"✅ Đã dừng: {s['requests']} request, cache hit {s['cache_hits']}, 304 {s['not_modified']}, "
+            f"lỗi {s['errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# orders_backfill.py — lấy lại đơn lịch sử cho khoảng dài (nhiều tháng), chạy lại được sau khi bị dừng / crash
+#   - chia [--from, --to] thành từng ngày giờ VN, chạy song song tối đa --workers ngày
+#   - mỗi ngày ghi ra out_dir/create_date=YYYY-MM-DD/orders.jsonl.gz (1 đơn / dòng), chỉ giữ 1 trang trong bộ nhớ
+#   - checkpoint (JSON, ghi atomic sau MỖI trang): ngày đã xong + page_token / vị trí file của ngày đang dở
+#   - chạy lại cùng lệnh: bỏ qua ngày đã xong, ngày đang dở cắt file về vị trí đã checkpoint rồi lấy tiếp từ page_token
+# Ví dụ:
+#   python orders_backfill.py --from 2025-01-01 --to 2025-06-30 --out-dir backfill --workers 4
+#   python run_orders_cli.py backfill --app-key AK --app-secret SECRET --shop-cipher ROW_xxx --refresh-token ROW_... \
+#     --from 2025-01-01 --to 2025-06-30 --out-dir backfill --store orders.db
+import os, json, gzip, time, shutil, signal, argparse, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import tts_json, tts_metrics
+from tts_token import file_lock
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+def log(msg: str):
+    print(f"[{datetime.now(VN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+def day_chunks(date_from: str, date_to: str) -> list:
+    """[(YYYY-MM-DD, ge, lt)] cho từng ngày giờ VN từ date_from đến date_to (gồm cả 2 đầu)."""
+    day = datetime.strptime(date_from, "%Y-%m-%d").replace(tzinfo=VN_TZ)
+    last = datetime.strptime(date_to, "%Y-%m-%d").replace(tzinfo=VN_TZ)
+    if last < day:
+        raise RuntimeError(f"--to ({date_to}) trước --from ({date_from})")
+    out = []
+    while day <= last:
+        nxt = day + timedelta(days=1)
+        out.append((day.strftime("%Y-%m-%d"), int(day.timestamp()), int(nxt.timestamp())))
+        day = nxt
+    return out
+
+
+@contextmanager
+def _replace_atomic(path: str):
+    """
+    File tạm (binary) tên riêng cùng thư mục với path; khối with xong thì os.replace sang path, lỗi thì xoá.
+    2 lượt chạy cùng ghi 1 file (2 backfill chung checkpoint, daemon + chạy tay) không đè file tạm của nhau.
+    """
+    d = os.path.dirname(os.path.abspath(path))
+    f = tempfile.NamedTemporaryFile("wb", dir=d, prefix=f".{os.path.basename(path)}.", suffix=".tmp", delete=False)
+    try:
+        with f:
+            yield f
+    except BaseException:
+        os.remove(f.name)
+        raise
+    os.replace(f.name, path)
+
+
+class Checkpoint:
+    """
+    File JSON {"shop": ..., "days": {ngày: trạng thái}}, ghi lại (tmp + os.replace) sau mỗi thay đổi.
+    Trạng thái 1 ngày:
+      {"done": true, "orders": n, "file": path}                                        — đã xong
+      {"page_token": tok, "offset": byte, "orders": n, "complete": bool}               — đang dở
+    offset là kích thước file .partial tương ứng với page_token (phần ghi sau đó bị cắt bỏ khi chạy lại).
+    set() giữ lock liên process (<checkpoint>.lock), đọc lại file rồi chỉ sửa đúng ngày đó: nhiều process
+    dùng chung 1 checkpoint không ghi đè tiến độ của nhau.
+    """
+
+    def __init__(self, path: str, shop: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = self._read() or {"shop": shop, "days": {}}
+        if self.data.get("shop") != shop:
+            raise RuntimeError(f"Checkpoint {path} thuộc shop {self.data.get('shop')!r}, không phải {shop!r}")
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get(self, day: str) -> dict:
+        with self._lock:
+            return dict(self.data["days"].get(day) or {})
+
+    def set(self, day: str, state: dict):
+        with self._lock, file_lock(self.path + ".lock"):
+            self.data = self._read() or self.data
+            self.data["days"][day] = state
+            with _replace_atomic(self.path) as f:
+                f.write(tts_json.dumps(self.data))
+
+
+class Stopped(Exception):
+    """Nhận Ctrl+C / SIGTERM: ngày đang chạy dừng sau trang hiện tại (đã checkpoint)."""
+
+
+class Backfill:
+    def __init__(self, client, out_dir: str, checkpoint: Checkpoint, page_size: int = 50, gz: bool = True,
+                 store=None, retries: int = 3):
+        self.client = client
+        self.out_dir = out_dir
+        self.ckpt = checkpoint
+        self.page_size = page_size
+        self.gz = gz
+        self.store = store
+        self.retries = max(0, retries)
+        self.shop = checkpoint.data["shop"]
+        self.stopping = threading.Event()
+
+    def _dir(self, day: str) -> str:
+        return os.path.join(self.out_dir, f"create_date={day}")
+
+    def final_path(self, day: str) -> str:
+        return os.path.join(self._dir(day), "orders.jsonl" + (".gz" if self.gz else ""))
+
+    def _finish(self, day: str, n: int) -> int:
+        """.partial → file kết quả (nén nếu gz), rồi mới đánh dấu done. Làm lại được nếu crash giữa chừng."""
+        part, final = os.path.join(self._dir(day), "orders.jsonl.partial"), self.final_path(day)
+        if os.path.exists(part):
+            if self.gz:
+                with open(part, "rb") as src, _replace_atomic(final) as raw, \
+                        gzip.GzipFile("orders.jsonl", "wb", 6, raw) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                os.remove(part)
+            else:
+                os.replace(part, final)
+        elif not os.path.exists(final):
+            raise RuntimeError(f"Mất file dữ liệu ngày {day} ({part})")
+        self.ckpt.set(day, {"done": True, "orders": n, "file": final})
+        return n
+
+    def _fetch_day(self, day: str, ge: int, lt: int, fresh: bool = False) -> int:
+        from orders_search import iter_search_pages
+        st = {} if fresh else self.ckpt.get(day)
+        if st.get("done"):
+            return st["orders"]
+        if st.get("complete"):
+            return self._finish(day, st["orders"])
+        os.makedirs(self._dir(day), exist_ok=True)
+        part = os.path.join(self._dir(day), "orders.jsonl.partial")
+        token, offset, n = st.get("page_token"), int(st.get("offset") or 0), int(st.get("orders") or 0)
+        if not token or not os.path.exists(part):
+            token, offset, n = None, 0, 0
+        else:
+            log(f"↻ {day}: tiếp tục từ trang đã lưu ({n} đơn)")
+        with open(part, "r+b" if offset else "wb") as f:
+            f.truncate(offset)  # bỏ phần ghi sau checkpoint cuối (trang ghi dở lúc crash)
+            f.seek(offset)
+            for page, next_token in iter_search_pages(ge, lt, self.page_size, self.client, page_token=token):
+                with tts_metrics.span("write_output"):
+                    f.write(b"".join(tts_json.dumps(o) + b"\n" for o in page))
+                    f.flush()
+                    os.fsync(f.fileno())
+                if self.store is not None and page:
+                    self.store.upsert_orders(page, shop=self.shop)
+                n += len(page)
+                self.ckpt.set(day, {"page_token": next_token, "offset": f.tell(), "orders": n,
+                                    "complete": not next_token})
+                if next_token and self.stopping.is_set():
+                    raise Stopped()
+        return self._finish(day, n)
+
+    def run_day(self, day: str, ge: int, lt: int) -> int:
+        """1 ngày, thử lại tối đa retries lần (lần cuối lấy lại cả ngày phòng page_token đã hết hạn)."""
+        from orders_search import PaginationInterrupted
+        for attempt in range(self.retries + 1):
+            if self.stopping.is_set():
+                raise Stopped()
+            fresh = attempt == self.retries and attempt > 0 and self.ckpt.get(day).get("page_token")
+            try:
+                return self._fetch_day(day, ge, lt, fresh=bool(fresh))
+            except PaginationInterrupted as e:
+                if attempt == self.retries:
+                    raise e.cause
+                wait = min(60, 2 ** attempt)
+                log(f"⚠️ {day}: {e.cause} — thử lại sau {wait}s")
+                self.stopping.wait(wait)
+
+    def run(self, chunks: list, workers: int = 4) -> dict:
+        """Chạy các ngày chưa xong, tối đa workers ngày cùng lúc. Trả về {"done", "orders", "failed", "stopped"}."""
+        res = {"done": 0, "orders": 0, "failed": [], "stopped": 0}
+        pending = []
+        for day, ge, lt in chunks:
+            st = self.ckpt.get(day)
+            if st.get("done"):
+                res["done"] += 1
+                res["orders"] += st["orders"]
+            else:
+                pending.append((day, ge, lt))
+        log(f"▶ Backfill {len(chunks)} ngày: {res['done']} đã xong, còn {len(pending)} (workers={workers})")
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="backfill") as ex:
+            futs = {ex.submit(self.run_day, *c): c[0] for c in pending}
+            for fut in as_completed(futs):
+                day = futs[fut]
+                try:
+                    n = fut.result()
+                except Stopped:
+                    res["stopped"] += 1
+                    continue
+                except Exception as e:
+                    res["failed"].append(day)
+                    tts_metrics.inc("backfill_days_total", result="error")
+                    log(f"✖ {day}: {e}")
+                    continue
+                res["done"] += 1
+                res["orders"] += n
+                tts_metrics.inc("backfill_days_total", result="ok")
+                log(f"✔ {day}: {n} đơn ({res['done']}/{len(chunks)})")
+        return res
+
+    def stop(self, *_):
+        if not self.stopping.is_set():
+            log("⏹ Đang dừng: các ngày đang chạy dừng sau trang hiện tại (đã lưu checkpoint)...")
+        self.stopping.set()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Backfill đơn lịch sử theo từng ngày (giờ VN), có checkpoint để chạy tiếp.")
+    p.add_argument("--app-key"); p.add_argument("--app-secret")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--shop-id"); g.add_argument("--shop-cipher")
+    p.add_argument("--refresh-token")
+    p.add_argument("--base", help="TTS_BASE")
+    p.add_argument("--refresh-url", help="TTS_REFRESH_URL")
+    p.add_argument("--token-state", help="File token state (mặc định TTS_TOKEN_STATE hoặc token_state.json)")
+    p.add_argument("--from", dest="date_from", required=True, help="Ngày đầu (YYYY-MM-DD, giờ VN)")
+    p.add_argument("--to", dest="date_to", required=True, help="Ngày cuối, gồm cả ngày này (YYYY-MM-DD)")
+    p.add_argument("--out-dir", default="backfill", help="Thư mục kết quả: <out-dir>/create_date=YYYY-MM-DD/")
+    p.add_argument("--checkpoint", help="File checkpoint (mặc định <out-dir>/_checkpoint.json)")
+    p.add_argument("--workers", type=int, default=4, help="Số ngày lấy cùng lúc")
+    p.add_argument("--page-size", type=int, default=50)
+    p.add_argument("--retries", type=int, default=3, help="Số lần thử lại 1 ngày khi lỗi")
+    p.add_argument("--no-gzip", action="store_true", help="Ghi orders.jsonl không nén")
+    p.add_argument("--store", help="Upsert thêm vào kho SQLite (order_store.py), ví dụ orders.db")
+    p.add_argument("--metrics", help="Xuất metrics (tts_metrics.py): json:PATH|-, prom:PATH, http:PORT "
+                                     "(mặc định: TTS_METRICS)")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    import tts_http
+    from orders_daemon import client_from_args
+    from orders_sync import shop_key
+
+    args = parse_args(argv)
+    tts_metrics.configure(args.metrics)
+    chunks = day_chunks(args.date_from, args.date_to)
+    client = client_from_args(args)
+    os.makedirs(args.out_dir, exist_ok=True)
+    ckpt = Checkpoint(args.checkpoint or os.path.join(args.out_dir, "_checkpoint.json"), shop_key(client))
+    store = None
+    if args.store:
+        from order_store import OrderStore
+        store = OrderStore(args.store)
+    bf = Backfill(client, args.out_dir, ckpt, page_size=args.page_size, gz=not args.no_gzip, store=store,
+                  retries=args.retries)
+    signal.signal(signal.SIGINT, bf.stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, bf.stop)
+
+    t0 = time.monotonic()
+    client.tokens.start()
+    try:
+        res = bf.run(chunks, workers=args.workers)
+    finally:
+        client.tokens.stop()
+        if store is not None:
+            store.close()
+        tts_http.close()
+        tts_metrics.flush()
+    log(f"✅ {res['done']}/{len(chunks)} ngày, {res['orders']} đơn → {args.out_dir} ({time.monotonic() - t0:.1f}s)")
+    if res["failed"] or res["stopped"]:
+        log(f"Chưa xong {len(res['failed']) + res['stopped']} ngày — chạy lại cùng lệnh để tiếp tục"
+            + (f" (lỗi: {', '.join(sorted(res['failed']))})" if res["failed"] else ""))
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# orders_daemon.py — chạy thường trú thay cho vòng lặp run_orders_today.ps1 (mỗi lần chạy lại khởi động Python 2 lần)
+#   - mỗi shop đồng bộ tăng dần (orders_sync.sync_incremental) theo chu kỳ riêng, có jitter để các shop không dồn cùng lúc
+#   - giữ TTSClient + pool kết nối keep-alive + token trong bộ nhớ suốt vòng đời process (token refresh nền)
+#   - SIGINT/SIGTERM: không nhận lượt mới, chờ các lượt đang chạy ghi xong dataset/cursor rồi mới thoát
+# Ví dụ:
+#   python orders_daemon.py --interval 60 --store orders.db
+#   python run_orders_cli.py serve --app-key AK --app-secret SECRET --manifest shops.json --interval 120 --store orders.db
+import os, time, heapq, random, signal, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+def log(msg: str):
+    print(f"[{datetime.now(VN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+class ShopJob:
+    """1 shop trong daemon: client riêng (token riêng), chu kỳ và file dataset/cursor riêng."""
+
+    def __init__(self, name: str, client, interval: float, dataset: str | None, cursor: str):
+        self.name = name
+        self.client = client
+        self.interval = float(interval)
+        self.dataset = dataset
+        self.cursor = cursor
+        self.failures = 0
+        self.runs = 0
+
+
+class Daemon:
+    """
+    Lập lịch theo heap (thời điểm chạy kế tiếp, shop); mỗi lượt chạy trên pool `max_shops` luồng.
+    Lượt sau của 1 shop chỉ được xếp lịch khi lượt trước đã xong → 1 shop không bao giờ chạy chồng.
+    Lỗi: thử lại với backoff luỹ thừa (tối đa max_backoff giây), không ảnh hưởng shop khác.
+    """
+
+    def __init__(self, jobs: list, jitter: float = 0.1, max_shops: int = 4, store=None, overlap: int = 600,
+                 window_days: int = 7, page_size: int = 50, max_backoff: float = 900.0):
+        self.jobs = jobs
+        self.jitter = max(0.0, float(jitter))
+        self.store = store
+        self.overlap = overlap
+        self.window_days = window_days
+        self.page_size = page_size
+        self.max_backoff = max_backoff
+        self.stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_shops), thread_name_prefix="shop")
+        self._heap = []
+        self._cond = threading.Condition()
+        self._running = 0
+
+    def _schedule(self, job: ShopJob, delay: float):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + max(0.0, delay), id(job), job))
+            self._cond.notify()
+
+    def _next_delay(self, job: ShopJob):
+        if job.failures:
+            return min(self.max_backoff, job.interval * (2 ** (job.failures - 1)))
+        return job.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _run_job(self, job: ShopJob):
+        import tts_metrics
+        from orders_sync import sync_incremental
+        t0 = time.monotonic()
+        result = "ok"
+        try:
+            res = sync_incremental(job.dataset, cursor_file=job.cursor, overlap=self.overlap,
+                                   window_days=self.window_days, page_size=self.page_size,
+                                   client=job.client, store=self.store)
+            job.failures = 0
+            job.runs += 1
+            if res["created"] or res["updated"]:
+                log(f"✔ [{job.name}] {res['fetched']} đơn thay đổi ({res['created']} mới, {res['updated']} cập nhật), "
+                    f"cursor={res['cursor']} ({time.monotonic() - t0:.1f}s)")
+        except Exception as e:
+            result = "error"
+            job.failures += 1
+            log(f"✖ [{job.name}] lỗi lần {job.failures}: {e}")
+        finally:
+            tts_metrics.inc("sync_runs_total", shop=job.name, result=result)
+            tts_metrics.observe("sync_seconds", time.monotonic() - t0, shop=job.name)
+            tts_metrics.flush()
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+            if not self.stop_event.is_set():
+                self._schedule(job, self._next_delay(job))
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            log("⏹ Đang dừng: chờ các lượt đồng bộ đang chạy ghi xong...")
+        self.stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def run(self):
+        for job in self.jobs:
+            job.client.tokens.start()  # refresh token nền trước hạn, lượt đồng bộ không phải chờ refresh
+            # rải đều lượt đầu trong khoảng jitter để các shop không gọi API cùng lúc
+            self._schedule(job, random.uniform(0, job.interval * self.jitter))
+        log(f"▶ Daemon chạy {len(self.jobs)} shop (Ctrl+C để dừng)")
+        try:
+            while not self.stop_event.is_set():
+                with self._cond:
+                    if not self._heap:
+                        self._cond.wait(1.0)
+                        continue
+                    due, _, job = self._heap[0]
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        self._cond.wait(min(wait, 1.0))
+                        continue
+                    heapq.heappop(self._heap)
+                    self._running += 1
+                self._pool.submit(self._run_job, job)
+        finally:
+            with self._cond:
+                while self._running:
+                    self._cond.wait()
+            self._pool.shutdown(wait=True)
+            for job in self.jobs:
+                job.client.tokens.stop()
+            if self.store is not None:
+                self.store.close()
+            import tts_http
+            tts_http.close()
+            log("✅ Đã dừng.")
+
+
+def build_jobs(args):
+    """Danh sách ShopJob từ --manifest (như run_orders_cli.py) hoặc 1 shop từ tham số / .env."""
+    from tts_client import TTSClient, load_env
+    load_env()
+    limiter = threading.BoundedSemaphore(args.max_inflight) if args.max_inflight > 0 else None
+    if args.manifest:
+        from run_orders_cli import load_manifest
+        jobs = []
+        for shop in load_manifest(args.manifest):
+            name = shop["name"]
+            client = TTSClient(
+                app_key=shop.get("app_key") or args.app_key or os.getenv("TTS_APP_KEY"),
+                app_secret=shop.get("app_secret") or args.app_secret or os.getenv("TTS_APP_SECRET"),
+                shop_cipher=shop.get("shop_cipher"),
+                shop_id=None if shop.get("shop_cipher") else shop.get("shop_id"),
+                base=shop.get("base") or args.base,
+                state_file=shop.get("token_state") or f"token_state_{name}.json",
+                access_token=shop.get("access_token"),
+                refresh_token=shop.get("refresh_token"),
+                refresh_url=shop.get("refresh_url") or args.refresh_url,
+                limiter=limiter,
+            )
+            dataset = None if args.no_dataset else shop.get("dataset") or f"orders_7days_{name}.json"
+            jobs.append(ShopJob(name, client, shop.get("interval") or args.interval, dataset, args.cursor))
+        return jobs
+    client = client_from_args(args, limiter)
+    name = client.shop_cipher or client.shop_id or "default"
+    return [ShopJob(name, client, args.interval, None if args.no_dataset else args.dataset, args.cursor)]
+
+def client_from_args(args, limiter=None):
+    """TTSClient 1 shop: tham số dòng lệnh, thiếu thì lấy từ .env."""
+    from tts_client import TTSClient, load_env
+    load_env()
+    return TTSClient(
+        app_key=args.app_key or os.getenv("TTS_APP_KEY"),
+        app_secret=args.app_secret or os.getenv("TTS_APP_SECRET"),
+        shop_cipher=args.shop_cipher or (None if args.shop_id else os.getenv("TTS_SHOP_CIPHER")),
+        shop_id=args.shop_id or (None if args.shop_cipher else os.getenv("TTS_SHOP_ID")),
+        base=args.base or os.getenv("TTS_BASE"),
+        state_file=args.token_state or os.getenv("TTS_TOKEN_STATE", "token_state.json"),
+        access_token=os.getenv("TTS_ACCESS_TOKEN"),
+        refresh_token=args.refresh_token or os.getenv("TTS_REFRESH_TOKEN"),
+        refresh_url=args.refresh_url or os.getenv("TTS_REFRESH_URL"),
+        limiter=limiter,
+    )
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Daemon đồng bộ đơn tăng dần theo chu kỳ cho 1 hoặc nhiều shop.")
+    p.add_argument("--app-key"); p.add_argument("--app-secret")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--shop-id"); g.add_argument("--shop-cipher")
+    p.add_argument("--refresh-token")
+    p.add_argument("--base", help="TTS_BASE")
+    p.add_argument("--refresh-url", help="TTS_REFRESH_URL")
+    p.add_argument("--token-state", help="File token state (mặc định TTS_TOKEN_STATE hoặc token_state.json)")
+    p.add_argument("--manifest", help="File JSON danh sách shop (như run_orders_cli.py; thêm được interval, dataset)")
+    p.add_argument("--interval", type=float, default=60.0, help="Chu kỳ đồng bộ mỗi shop (giây)")
+    p.add_argument("--jitter", type=float, default=0.1, help="Lệch ngẫu nhiên ±tỉ lệ của chu kỳ (0.1 = ±10%%)")
+    p.add_argument("--max-shops", type=int, default=4, help="Số shop đồng bộ cùng lúc")
+    p.add_argument("--max-inflight", type=int, default=16, help="Tổng số request HTTP đang bay tối đa")
+    p.add_argument("--dataset", default="orders_7days.json", help="File dataset (1 shop)")
+    p.add_argument("--no-dataset", action="store_true", help="Không ghi file JSON, chỉ upsert vào --store")
+    p.add_argument("--cursor", default="sync_cursor.json")
+    p.add_argument("--store", help="Kho SQLite (order_store.py), ví dụ orders.db")
+    p.add_argument("--overlap", type=int, default=600)
+    p.add_argument("--page-size", type=int, default=50)
+    p.add_argument("--metrics", help="Xuất metrics (tts_metrics.py): json:PATH|-, prom:PATH, http:PORT "
+                                     "(mặc định: TTS_METRICS)")
+    args = p.parse_args(argv)
+    if args.no_dataset and not args.store:
+        p.error("--no-dataset cần --store")
+    return args
+
+def main(argv=None):
+    import tts_metrics
+    args = parse_args(argv)
+    tts_metrics.configure(args.metrics)
+    store = None
+    if args.store:
+        from order_store import OrderStore
+        store = OrderStore(args.store)
+    daemon = Daemon(build_jobs(args), jitter=args.jitter, max_shops=args.max_shops, store=store,
+                    overlap=args.overlap, page_size=args.page_size)
+    signal.signal(signal.SIGINT, daemon.stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
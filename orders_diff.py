@@ -0,0 +1,178 @@
+# orders_diff.py — so lần kéo đơn mới với snapshot trước (file) hoặc kho SQLite, chỉ phát sự kiện thay đổi:
+#   created     : đơn mới (kèm toàn bộ đơn)
+#   updated     : nội dung đổi (kèm delta theo field, ví dụ {"status": ["AWAITING_SHIPMENT", "CANCELLED"]})
+#   disappeared : có trong snapshot trước (trong cùng khoảng create_time) nhưng không còn trong lần kéo mới
+# Index theo id -> (update_time, create_time, hash nội dung) nên đơn không đổi bị bỏ qua mà không cần so từng field.
+import sys, json, hashlib, argparse
+
+_MISSING = object()
+
+def order_hash(order: dict) -> str:
+    """Hash nội dung đơn trên JSON chuẩn hoá (sort_keys, gọn) — không phụ thuộc thứ tự key."""
+    text = json.dumps(order, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def field_delta(old, new) -> dict:
+    """
+    Delta theo đường dẫn field: {"status": [cũ, mới], "payment.total_amount": [...],
+    "line_items[<id>].display_status": [...]}. Field không có ở một bên → None.
+    List các object có "id" được ghép theo id, list khác ghép theo vị trí (khác độ dài → cả list).
+    """
+    out = {}
+    _delta(old, new, "", out)
+    return out
+
+def _delta(old, new, path, out):
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in sorted(old.keys() | new.keys()):
+            _delta(old.get(k, _MISSING), new.get(k, _MISSING), f"{path}.{k}" if path else k, out)
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        if _keyed(old) and _keyed(new):
+            a, b = {x["id"]: x for x in old}, {x["id"]: x for x in new}
+            for k in list(a) + [k for k in b if k not in a]:
+                _delta(a.get(k, _MISSING), b.get(k, _MISSING), f"{path}[{k}]", out)
+            return
+        if len(old) == len(new):
+            for i, (x, y) in enumerate(zip(old, new)):
+                _delta(x, y, f"{path}[{i}]", out)
+            return
+    out[path] = [None if old is _MISSING else old, None if new is _MISSING else new]
+
+def _keyed(items):
+    return bool(items) and all(isinstance(x, dict) and "id" in x for x in items)
+
+def _in_scope(create_time, scope):
+    return scope is None or scope[0] <= int(create_time or 0) < scope[1]
+
+
+class Differ:
+    """
+    index: id -> (update_time, create_time, hash | None); hash None (kho SQLite): cùng update_time = không đổi.
+    load_old(ids) -> dict id -> đơn cũ, chỉ gọi cho các đơn có thể đã đổi.
+    scope=(ge, lt): khoảng create_time của lần kéo mới — chỉ đơn cũ trong khoảng này mới có thể "disappeared".
+    Dùng được theo từng trang: feed(page) nhiều lần rồi finish().
+    """
+
+    def __init__(self, index: dict, load_old, scope: tuple | None = None):
+        self.index = index
+        self.load_old = load_old
+        self.scope = scope
+        self.seen = set()
+        self.stats = {"created": 0, "updated": 0, "unchanged": 0, "disappeared": 0}
+
+    @classmethod
+    def from_orders(cls, prev_orders, scope: tuple | None = None):
+        """So với snapshot trước (list đơn, ví dụ đọc từ orders_*.json)."""
+        prev = {o["id"]: o for o in prev_orders}
+        index = {oid: (int(o.get("update_time") or 0), int(o.get("create_time") or 0), order_hash(o))
+                 for oid, o in prev.items()}
+        return cls(index, lambda ids: {i: prev[i] for i in ids if i in prev}, scope)
+
+    @classmethod
+    def from_store(cls, store, scope: tuple | None = None, shop: str | None = None):
+        """So với kho order_store.OrderStore (gọi TRƯỚC khi upsert lần kéo mới vào kho)."""
+        ge, lt = scope if scope is not None else (None, None)
+        index = {oid: (int(ut or 0), int(ct or 0), None) for oid, (ut, ct) in store.versions(ge, lt, shop).items()}
+        return cls(index, store.get_many, scope)
+
+    def feed(self, orders: list) -> list:
+        """Trả về sự kiện created/updated của các đơn này (theo thứ tự đầu vào)."""
+        events, maybe = [], []
+        for o in orders:
+            oid = o["id"]
+            if oid in self.seen:
+                continue
+            self.seen.add(oid)
+            prev = self.index.get(oid)
+            if prev is None:
+                self.stats["created"] += 1
+                events.append(("created", o))
+            elif int(o.get("update_time") or 0) < prev[0]:
+                self.stats["unchanged"] += 1  # bản kéo về cũ hơn bản đã có
+            elif prev[2] is None and int(o.get("update_time") or 0) == prev[0]:
+                self.stats["unchanged"] += 1  # kho: cùng update_time = cùng phiên bản, không cần đọc JSON cũ
+            elif prev[2] is not None and order_hash(o) == prev[2]:
+                self.stats["unchanged"] += 1
+            else:
+                maybe.append(o)
+                events.append(("maybe", o))
+        olds = self.load_old([o["id"] for o in maybe]) if maybe else {}
+
+        out = []
+        for kind, o in events:
+            if kind == "created":
+                out.append(self._event("created", o, order=o))
+                continue
+            old = olds.get(o["id"])
+            if old is None:  # index có nhưng không đọc được bản cũ → coi như mới
+                self.stats["created"] += 1
+                out.append(self._event("created", o, order=o))
+                continue
+            delta = field_delta(old, o)
+            if not delta:
+                self.stats["unchanged"] += 1
+                continue
+            self.stats["updated"] += 1
+            out.append(self._event("updated", o, prev_update_time=int(old.get("update_time") or 0), delta=delta))
+        return out
+
+    def finish(self) -> list:
+        """Sự kiện disappeared (gọi sau khi đã feed hết lần kéo mới)."""
+        out = []
+        for oid, (ut, ct, _) in self.index.items():
+            if oid not in self.seen and _in_scope(ct, self.scope):
+                self.stats["disappeared"] += 1
+                out.append({"event": "disappeared", "id": oid, "create_time": ct, "update_time": ut})
+        return out
+
+    @staticmethod
+    def _event(kind, o, **extra):
+        return {"event": kind, "id": o["id"], "create_time": int(o.get("create_time") or 0),
+                "update_time": int(o.get("update_time") or 0), "status": o.get("status"), **extra}
+
+def diff(prev_orders, new_orders, scope: tuple | None = None) -> list:
+    """Sự kiện thay đổi giữa 2 snapshot (list đơn)."""
+    d = Differ.from_orders(prev_orders, scope)
+    return d.feed(new_orders) + d.finish()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="So đơn mới với snapshot trước / kho SQLite, xuất sự kiện thay đổi (JSONL).")
+    p.add_argument("files", nargs="+", help="Lần kéo mới: orders_*.json hoặc *.jsonl(.gz)")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--prev", nargs="+", help="Snapshot trước (orders_*.json / .jsonl)")
+    src.add_argument("--db", help="So với kho SQLite (order_store.py)")
+    p.add_argument("--ge", type=int, help="create_time_ge của lần kéo mới (mặc định: nhỏ nhất trong file mới nếu dùng --db)")
+    p.add_argument("--lt", type=int, help="create_time_lt của lần kéo mới")
+    p.add_argument("--out", default="-", help="File JSONL sự kiện ('-' = stdout)")
+    p.add_argument("--gzip", action="store_true")
+    return p.parse_args()
+
+if __name__ == "__main__":
+    from orders_export import load_orders
+    from orders_output import open_text, write_jsonl
+
+    args = parse_args()
+    new = load_orders(args.files)
+    scope = (args.ge, args.lt) if args.ge is not None and args.lt is not None else None
+    if args.db:
+        from order_store import OrderStore
+        if scope is None and new:
+            cts = [int(o.get("create_time") or 0) for o in new]
+            scope = (min(cts), max(cts) + 1)
+        store = OrderStore(args.db)
+        differ = Differ.from_store(store, scope)
+    else:
+        store = None
+        differ = Differ.from_orders(load_orders(args.prev), scope)
+    with open_text(args.out, args.gzip and args.out != "-") as f:
+        write_jsonl(differ.feed(new), f)
+        write_jsonl(differ.finish(), f)
+    if store is not None:
+        store.close()
+    s = differ.stats
+    print(f"✅ {s['created']} mới, {s['updated']} cập nhật, {s['disappeared']} biến mất, "
+          f"{s['unchanged']} không đổi", file=sys.stderr)
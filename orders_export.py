@@ -0,0 +1,182 @@
+# orders_export.py — xuất đơn sang bảng cột có kiểu (Parquet / Arrow IPC), chia partition theo ngày tạo (giờ VN)
+#   orders      : 1 dòng / đơn, gộp luôn payment
+#   line_items  : 1 dòng / line item
+# Tiền → int64 đơn vị nhỏ nhất (VND: đồng), thời gian → int64 epoch giây, status/SKU... → dictionary-encoded.
+import os, json, argparse
+from datetime import datetime, timedelta, timezone
+from tts_money import money_to_minor
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+ORDER_TIME_COLS = ("create_time", "update_time", "paid_time", "cancel_time", "rts_time", "delivery_time",
+                   "collection_time", "shipping_due_time", "rts_sla_time", "tts_sla_time")
+ORDER_DICT_COLS = ("status", "cancellation_initiator", "cancel_reason", "delivery_option_name", "delivery_type",
+                   "fulfillment_type", "shipping_type", "shipping_provider", "payment_method_name", "order_type",
+                   "commerce_platform", "warehouse_id")
+ORDER_BOOL_COLS = ("is_cod", "is_on_hold_order", "is_replacement_order", "is_sample_order")
+PAYMENT_MONEY_COLS = ("total_amount", "sub_total", "original_total_product_price", "shipping_fee",
+                      "original_shipping_fee", "seller_discount", "platform_discount",
+                      "shipping_fee_platform_discount", "shipping_fee_seller_discount",
+                      "shipping_fee_cofunded_discount", "tax")
+ITEM_DICT_COLS = ("seller_sku", "sku_name", "product_name", "display_status", "package_status", "sku_type",
+                  "cancel_reason", "cancel_user", "shipping_provider_name")
+ITEM_STR_COLS = ("id", "order_id", "sku_id", "product_id", "package_id", "tracking_number")
+ITEM_MONEY_COLS = ("sale_price", "original_price", "seller_discount", "platform_discount")
+
+def _pa():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise RuntimeError("Cần cài pyarrow để xuất Parquet/Arrow: pip install pyarrow")
+
+def create_date_vn(ts) -> str:
+    return datetime.fromtimestamp(int(ts), VN_TZ).strftime("%Y-%m-%d")
+
+def _int_or_none(v):
+    return None if v is None or v == "" else int(v)
+
+def flatten(orders):
+    """Trải phẳng orders → (cột bảng orders, cột bảng line_items) dạng dict tên cột -> list."""
+    oc = {k: [] for k in ("id", "user_id", "create_date", "currency", *ORDER_TIME_COLS, *ORDER_DICT_COLS,
+                          *ORDER_BOOL_COLS, *PAYMENT_MONEY_COLS, "line_item_count")}
+    ic = {k: [] for k in (*ITEM_STR_COLS, "create_time", "create_date", "currency", *ITEM_DICT_COLS,
+                          "is_gift", *ITEM_MONEY_COLS)}
+    for o in orders:
+        pay = o.get("payment") or {}
+        cur = pay.get("currency")
+        day = create_date_vn(o.get("create_time", 0))
+        items = o.get("line_items") or []
+        oc["id"].append(o["id"]); oc["user_id"].append(o.get("user_id"))
+        oc["create_date"].append(day); oc["currency"].append(cur)
+        for k in ORDER_TIME_COLS:
+            oc[k].append(_int_or_none(o.get(k)))
+        for k in ORDER_DICT_COLS:
+            oc[k].append(o.get(k))
+        for k in ORDER_BOOL_COLS:
+            oc[k].append(o.get(k))
+        for k in PAYMENT_MONEY_COLS:
+            oc[k].append(money_to_minor(pay.get(k), cur))
+        oc["line_item_count"].append(len(items))
+        for li in items:
+            li_cur = li.get("currency") or cur
+            ic["id"].append(li.get("id")); ic["order_id"].append(o["id"])
+            for k in ITEM_STR_COLS[2:]:
+                ic[k].append(li.get(k))
+            ic["create_time"].append(_int_or_none(o.get("create_time")))
+            ic["create_date"].append(day); ic["currency"].append(li_cur)
+            for k in ITEM_DICT_COLS:
+                ic[k].append(li.get(k))
+            ic["is_gift"].append(li.get("is_gift"))
+            for k in ITEM_MONEY_COLS:
+                ic[k].append(money_to_minor(li.get(k), li_cur))
+    return oc, ic
+
+def _table(cols: dict, dict_cols, int_cols, bool_cols):
+    pa = _pa()
+    dict_type = pa.dictionary(pa.int32(), pa.string())
+    arrays, names = [], []
+    for name, values in cols.items():
+        if name in dict_cols:
+            arr = pa.array(values, type=pa.string()).dictionary_encode()
+            arr = arr.cast(dict_type)
+        elif name in int_cols:
+            arr = pa.array(values, type=pa.int64())
+        elif name in bool_cols:
+            arr = pa.array(values, type=pa.bool_())
+        else:
+            arr = pa.array(values, type=pa.string())
+        arrays.append(arr); names.append(name)
+    return pa.Table.from_arrays(arrays, names=names)
+
+def build_tables(orders):
+    """Trả về (orders_table, line_items_table) dạng pyarrow.Table."""
+    oc, ic = flatten(orders)
+    orders_t = _table(oc, {*ORDER_DICT_COLS, "currency", "create_date"},
+                      {*ORDER_TIME_COLS, *PAYMENT_MONEY_COLS, "line_item_count"}, set(ORDER_BOOL_COLS))
+    items_t = _table(ic, {*ITEM_DICT_COLS, "currency", "create_date"},
+                     {"create_time", *ITEM_MONEY_COLS}, {"is_gift"})
+    return orders_t, items_t
+
+def _write(table, path: str, fmt: str):
+    pa = _pa()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, path, compression="zstd")
+    else:
+        # Arrow IPC (file format): đọc lại bằng pyarrow.memory_map + ipc.open_file, không cần parse
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as w:
+            w.write_table(table)
+
+def export(orders, out_dir: str, fmt: str = "parquet"):
+    """
+    Ghi orders/line_items vào out_dir/<bảng>/create_date=YYYY-MM-DD/part-0.<parquet|arrow>
+    (ghi đè partition đã có). Trả về list file đã ghi.
+    """
+    pa = _pa()
+    import pyarrow.compute as pc
+    if fmt not in ("parquet", "arrow"):
+        raise ValueError("fmt phải là 'parquet' hoặc 'arrow'")
+    orders_t, items_t = build_tables(orders)
+    written = []
+    for name, table in (("orders", orders_t), ("line_items", items_t)):
+        days = pc.unique(table.column("create_date").combine_chunks().dictionary_decode()).to_pylist() \
+            if table.num_rows else []
+        for day in sorted(days):
+            part = table.filter(pc.equal(table.column("create_date").cast(pa.string()), day))
+            d = os.path.join(out_dir, name, f"create_date={day}")
+            os.makedirs(d, exist_ok=True)
+            path = os.path.join(d, f"part-0.{fmt}")
+            _write(part.drop_columns(["create_date"]), path, fmt)
+            written.append(path)
+    return written
+
+def load_orders(paths: list, db: str | None = None):
+    """
+    Đọc đơn từ file .json / .jsonl(.gz) và/hoặc kho SQLite (order_store.py).
+    Trùng id: giữ bản có update_time lớn hơn (như OrderStore.upsert_orders); bằng nhau thì giữ bản file.
+    """
+    from orders_output import read_jsonl
+    orders = {}
+
+    def keep(o, replace_on_tie: bool):
+        prev = orders.get(o["id"])
+        if prev is None:
+            orders[o["id"]] = o
+            return
+        new, old = int(o.get("update_time", 0)), int(prev.get("update_time", 0))
+        if new > old or (replace_on_tie and new == old):
+            orders[o["id"]] = o
+
+    for path in paths:
+        if ".jsonl" in path:
+            it = read_jsonl(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                it = json.load(f)
+        for o in it:
+            keep(o, True)
+    if db:
+        from order_store import OrderStore
+        with OrderStore(db) as store:
+            for o in store.query():
+                keep(o, False)
+    return list(orders.values())
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Xuất đơn sang Parquet/Arrow theo partition ngày tạo (giờ VN).")
+    p.add_argument("files", nargs="*", help="File orders_*.json hoặc *.jsonl(.gz)")
+    p.add_argument("--db", help="Đọc thêm từ kho SQLite (order_store.py)")
+    p.add_argument("--out-dir", default="export", help="Thư mục đích")
+    p.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    args = p.parse_args()
+    if not args.files and not args.db:
+        p.error("cần ít nhất một file hoặc --db")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    orders = load_orders(args.files, db=args.db)
+    files = export(orders, args.out_dir, fmt=args.format)
+    print(f"✅ Xuất {len(orders)} đơn ra {len(files)} file trong {args.out_dir}/")
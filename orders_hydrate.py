@@ -0,0 +1,217 @@
+# orders_hydrate.py — bổ sung chi tiết đơn + package + tracking cho kết quả search (phục vụ đối soát)
+#   GET /order/202309/orders?ids=a,b,...              : tối đa 50 đơn / lần
+#   GET /fulfillment/202309/packages/{package_id}     : 1 package / lần
+#   GET /fulfillment/202309/orders/{order_id}/tracking: 1 đơn / lần (chỉ gọi khi đã có tracking_number)
+# Các lời gọi chạy song song; cache LRU + SQLite theo (id, update_time) nên đơn không đổi sẽ không bị gọi lại.
+import json, sqlite3, argparse, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import tts_json
+
+DETAIL_PATH = "/order/202309/orders"
+PACKAGE_PATH = "/fulfillment/202309/packages/{}"
+TRACKING_PATH = "/fulfillment/202309/orders/{}/tracking"
+MAX_IDS = 50  # giới hạn ids mỗi lần gọi Get Order Detail
+
+
+class DetailCache:
+    """
+    Cache (kind, id) -> (update_time, data). Chỉ hit khi update_time khớp: đơn đổi trạng thái thì tự miss.
+    LRU trong bộ nhớ (max_items) + bảng SQLite tuỳ chọn (path=None: chỉ dùng bộ nhớ).
+    put() chỉ ghi bộ nhớ; flush() ghi các bản mới xuống đĩa trong 1 transaction.
+    """
+
+    def __init__(self, path: str | None = "hydrate_cache.db", max_items: int = 20000):
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cache (kind TEXT NOT NULL, id TEXT NOT NULL, "
+                              "update_time INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (kind, id))")
+            self.conn.commit()
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get(self, kind: str, id_: str, update_time: int):
+        key = (kind, id_)
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is None and self.conn is not None:
+                row = self.conn.execute("SELECT update_time, data FROM cache WHERE kind = ? AND id = ?",
+                                        key).fetchone()
+                if row is not None:
+                    hit = (row[0], json.loads(row[1]))
+                    self._remember(key, hit)
+            if hit is not None and hit[0] == update_time:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+            return None
+
+    def put(self, kind: str, id_: str, update_time: int, data):
+        with self._lock:
+            self._remember((kind, id_), (update_time, data))
+            if self.conn is not None:
+                self._pending.append((kind, id_, update_time, tts_json.dumps_text(data)))
+
+    def flush(self):
+        with self._lock:
+            if self.conn is None or not self._pending:
+                return
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO cache (kind, id, update_time, data) "
+                                      "VALUES (?, ?, ?, ?)", self._pending)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _package_ids(order: dict):
+    ids = [p["id"] for p in order.get("packages") or [] if p.get("id")]
+    if not ids:
+        ids = sorted({li["package_id"] for li in order.get("line_items") or [] if li.get("package_id")})
+    return ids
+
+def _has_tracking(order: dict):
+    return bool(order.get("tracking_number")) or any(li.get("tracking_number") for li in order.get("line_items") or [])
+
+
+class Hydrator:
+    """
+    Giai đoạn sau fetch_orders_by_created: đơn (từ search) → bản ghi
+      {"id", "update_time", "detail", "packages": [...], "tracking": {...} | None}
+    theo đúng thứ tự đầu vào. Lỗi của từng package/tracking được ghi vào {"error": ...} (không cache)
+    thay vì làm hỏng cả lô; lỗi gọi Get Order Detail thì raise.
+    """
+
+    def __init__(self, client=None, cache: DetailCache | None = None, max_workers: int = 8,
+                 packages: bool = True, tracking: bool = True):
+        if client is None:
+            import tts_client
+            client = tts_client.default_client()
+        self.client = client
+        self.cache = cache if cache is not None else DetailCache(None)
+        self.max_workers = max(1, int(max_workers))
+        self.packages = packages
+        self.tracking = tracking
+
+    @staticmethod
+    def _details(send):
+        return (send().get("data") or {}).get("orders") or []
+
+    def _get(self, path: str):
+        try:
+            return self.client.get_signed_with_shop(path).get("data") or {}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def hydrate(self, orders: list):
+        versions = {}
+        for o in orders:
+            versions[o["id"]] = int(o.get("update_time") or 0)
+        details, missing = {}, []
+        for oid, ut in versions.items():
+            d = self.cache.get("order", oid, ut)
+            if d is None:
+                missing.append(oid)
+            else:
+                details[oid] = d
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as ex:
+            # 1) chi tiết đơn: mỗi lời gọi tối đa 50 id, các lô ký 1 lượt rồi chạy song song
+            batches = [{"ids": ",".join(missing[i:i + MAX_IDS])} for i in range(0, len(missing), MAX_IDS)]
+            sends = self.client.signed_batch("GET", DETAIL_PATH, batches) if batches else []
+            futs = [ex.submit(self._details, send) for send in sends]
+            for f in as_completed(futs):
+                for d in f.result():
+                    if d.get("id") in versions:
+                        details[d["id"]] = d
+                        self.cache.put("order", d["id"], versions[d["id"]], d)
+
+            # 2) package + tracking: cache theo update_time của đơn chứa nó
+            extra, futs = {}, {}
+            for oid, ut in versions.items():
+                o = details.get(oid) or {}
+                jobs = [("package", pid, PACKAGE_PATH.format(pid)) for pid in _package_ids(o)] if self.packages else []
+                if self.tracking and _has_tracking(o):
+                    jobs.append(("tracking", oid, TRACKING_PATH.format(oid)))
+                for kind, id_, path in jobs:
+                    hit = self.cache.get(kind, id_, ut)
+                    if hit is not None:
+                        extra[(kind, id_)] = hit
+                    else:
+                        futs[ex.submit(self._get, path)] = (kind, id_, ut)
+            for f in as_completed(futs):
+                kind, id_, ut = futs[f]
+                data = f.result()
+                extra[(kind, id_)] = data
+                if "error" not in data:
+                    self.cache.put(kind, id_, ut, data)
+        self.cache.flush()
+
+        out = []
+        for oid, ut in versions.items():
+            d = details.get(oid)
+            out.append({
+                "id": oid, "update_time": ut, "detail": d,
+                "packages": [extra[("package", pid)] for pid in _package_ids(d or {})
+                             if ("package", pid) in extra],
+                "tracking": extra.get(("tracking", oid)),
+            })
+        return out
+
+def hydrate(orders: list, client=None, cache: DetailCache | None = None, max_workers: int = 8,
+            packages: bool = True, tracking: bool = True):
+    """Hàm tiện dụng: Hydrator(...).hydrate(orders)."""
+    return Hydrator(client, cache, max_workers, packages, tracking).hydrate(orders)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Lấy chi tiết đơn + package + tracking cho các đơn đã search (có cache).")
+    p.add_argument("files", nargs="*", help="File orders_*.json hoặc *.jsonl(.gz)")
+    p.add_argument("--db", help="Đọc đơn từ kho SQLite (order_store.py)")
+    p.add_argument("--out", default="orders_hydrated.jsonl", help="File JSONL đích ('-' = stdout)")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("--cache", default="hydrate_cache.db", help="File cache SQLite ('' = chỉ cache trong bộ nhớ)")
+    p.add_argument("--workers", type=int, default=8, help="Số lời gọi API chạy song song")
+    p.add_argument("--no-packages", action="store_true")
+    p.add_argument("--no-tracking", action="store_true")
+    args = p.parse_args()
+    if not args.files and not args.db:
+        p.error("cần ít nhất một file hoặc --db")
+    return args
+
+if __name__ == "__main__":
+    import sys
+    from orders_export import load_orders
+    from orders_output import open_text, write_jsonl
+
+    args = parse_args()
+    orders = load_orders(args.files, db=args.db)
+    with DetailCache(args.cache or None) as cache:
+        rows = hydrate(orders, cache=cache, max_workers=args.workers,
+                       packages=not args.no_packages, tracking=not args.no_tracking)
+        with open_text(args.out, args.gzip and args.out != "-") as f:
+            write_jsonl(rows, f)
+        print(f"✅ {len(rows)} đơn → {args.out} (cache hit {cache.hits}, miss {cache.misses})", file=sys.stderr)
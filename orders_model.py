@@ -0,0 +1,251 @@
+# orders_model.py — biểu diễn đơn gọn trong bộ nhớ (tuỳ chọn) cho khoảng thời gian lớn
+#   Order / LineItem / Payment / Package: dataclass __slots__ (không có __dict__ mỗi object)
+#   - chuỗi lặp lại (status, currency, display_status, SKU, tên sản phẩm, sku_image, lý do huỷ...) được intern
+#   - tiền → int đơn vị nhỏ nhất (giữ chuỗi gốc nếu không ở dạng chuẩn, để đổi ngược không sai lệch)
+#   - field ít dùng (buyer_email, recipient_address, field lạ...) gói thành 1 blob JSON bytes, chỉ giải mã khi truy cập
+# to_json() trả lại đúng JSON của API (cùng key, cùng thứ tự, cùng kiểu giá trị).
+# Ví dụ:
+#   orders = fetch_orders_by_created(ge, lt, as_model=True)
+#   orders[0].payment.total_amount   # 219000 (int)
+#   orders[0].recipient_address      # giải mã blob khi cần
+#   json.dump([o.to_json() for o in orders], f)
+import sys
+import tts_json
+from dataclasses import dataclass
+from tts_money import money_to_minor, money_text
+
+_KEY_LAYOUTS = {}  # thứ tự key của bản gốc: các đơn cùng cấu trúc dùng chung 1 tuple
+
+def _layout(d: dict) -> tuple:
+    keys = tuple(d)
+    shared = _KEY_LAYOUTS.get(keys)
+    if shared is None:
+        if len(_KEY_LAYOUTS) >= 4096:
+            return keys
+        shared = _KEY_LAYOUTS[keys] = keys
+    return shared
+
+def _intern(v):
+    return sys.intern(v) if type(v) is str else v
+
+def _money(v, currency):
+    """Chuỗi tiền → int nếu đổi ngược ra đúng chuỗi đó; ngược lại giữ nguyên giá trị gốc."""
+    if type(v) is not str:
+        return v
+    try:
+        minor = money_to_minor(v, currency)
+    except (ValueError, ArithmeticError):
+        return v
+    return minor if minor is not None and money_text(minor, currency) == v else v
+
+
+class _Model:
+    """
+    Phần chung: _HOT là các field giữ trong slot, _INTERN các field chuỗi được intern, _MONEY các field tiền.
+    Field còn lại nằm trong _blob (JSON bytes); _keys giữ thứ tự key gốc (key không có trong bản gốc thì
+    to_json cũng không sinh ra).
+    """
+    __slots__ = ()
+    _HOT = ()
+    _INTERN = frozenset()
+    _MONEY = frozenset()
+    _NESTED = {}
+
+    @classmethod
+    def from_json(cls, d: dict):
+        obj = cls()
+        cur = d.get("currency")
+        rest = {}
+        for k, v in d.items():
+            if k in cls._NESTED:
+                sub = cls._NESTED[k]
+                setattr(obj, k, [sub.from_json(x) for x in v] if type(v) is list
+                        else sub.from_json(v) if type(v) is dict else v)
+            elif k in cls._HOT:
+                if k in cls._MONEY:
+                    v = _money(v, cur)
+                elif k in cls._INTERN:
+                    v = _intern(v)
+                setattr(obj, k, v)
+            else:
+                rest[k] = v
+        obj._keys = _layout(d)
+        obj._blob = tts_json.dumps(rest) if rest else None
+        return obj
+
+    def extra(self) -> dict:
+        """Các field ít dùng (giải mã blob mỗi lần gọi, không giữ lại trong bộ nhớ)."""
+        return tts_json.loads(self._blob) if self._blob else {}
+
+    def __getattr__(self, name):
+        # chỉ chạy khi không có slot tên này → tìm trong blob
+        if name.startswith("_"):
+            raise AttributeError(name)
+        extra = self.extra()
+        if name in extra:
+            return extra[name]
+        raise AttributeError(f"{type(self).__name__} không có field {name!r}")
+
+    def get(self, key: str, default=None):
+        """Như dict.get trên bản gốc nhưng trả về giá trị của model (tiền là int)."""
+        if key not in self._keys:
+            return default
+        if key in self._HOT or key in self._NESTED:
+            return getattr(self, key)
+        return self.extra().get(key, default)
+
+    def _currency(self):
+        return self.currency if "currency" in self._HOT else None
+
+    def to_json(self) -> dict:
+        """Đúng dict JSON ban đầu của API."""
+        extra = None
+        out = {}
+        cur = self._currency()
+        for k in self._keys:
+            if k in self._NESTED:
+                v = getattr(self, k)
+                out[k] = [x.to_json() for x in v] if type(v) is list else v.to_json() if isinstance(v, _Model) else v
+            elif k in self._HOT:
+                v = getattr(self, k)
+                out[k] = money_text(v, cur) if k in self._MONEY and type(v) is int else v
+            else:
+                if extra is None:
+                    extra = self.extra()
+                out[k] = extra[k]
+        return out
+
+
+@dataclass(slots=True, eq=False, repr=False)
+class Package(_Model):
+    id: str | None = None
+    _keys: tuple = ()
+    _blob: bytes | None = None
+
+    _HOT = ("id",)
+
+    def __repr__(self):
+        return f"Package(id={self.id!r})"
+
+
+@dataclass(slots=True, eq=False, repr=False)
+class Payment(_Model):
+    currency: str | None = None
+    total_amount: int | None = None
+    sub_total: int | None = None
+    original_total_product_price: int | None = None
+    shipping_fee: int | None = None
+    original_shipping_fee: int | None = None
+    seller_discount: int | None = None
+    platform_discount: int | None = None
+    shipping_fee_platform_discount: int | None = None
+    shipping_fee_seller_discount: int | None = None
+    shipping_fee_cofunded_discount: int | None = None
+    tax: int | None = None
+    _keys: tuple = ()
+    _blob: bytes | None = None
+
+    _HOT = ("currency", "total_amount", "sub_total", "original_total_product_price", "shipping_fee",
+            "original_shipping_fee", "seller_discount", "platform_discount", "shipping_fee_platform_discount",
+            "shipping_fee_seller_discount", "shipping_fee_cofunded_discount", "tax")
+    _INTERN = frozenset({"currency"})
+    _MONEY = frozenset(_HOT[1:])
+
+    def __repr__(self):
+        return f"Payment(total_amount={self.total_amount!r}, currency={self.currency!r})"
+
+
+@dataclass(slots=True, eq=False, repr=False)
+class LineItem(_Model):
+    id: str | None = None
+    sku_id: str | None = None
+    product_id: str | None = None
+    seller_sku: str | None = None
+    sku_name: str | None = None
+    product_name: str | None = None
+    sku_image: str | None = None
+    sku_type: str | None = None
+    display_status: str | None = None
+    package_id: str | None = None
+    package_status: str | None = None
+    currency: str | None = None
+    sale_price: int | None = None
+    original_price: int | None = None
+    seller_discount: int | None = None
+    platform_discount: int | None = None
+    is_gift: bool | None = None
+    cancel_reason: str | None = None
+    cancel_user: str | None = None
+    shipping_provider_id: str | None = None
+    shipping_provider_name: str | None = None
+    tracking_number: str | None = None
+    _keys: tuple = ()
+    _blob: bytes | None = None
+
+    _HOT = ("id", "sku_id", "product_id", "seller_sku", "sku_name", "product_name", "sku_image", "sku_type",
+            "display_status", "package_id", "package_status", "currency", "sale_price", "original_price",
+            "seller_discount", "platform_discount", "is_gift", "cancel_reason", "cancel_user",
+            "shipping_provider_id", "shipping_provider_name", "tracking_number")
+    _INTERN = frozenset({"sku_id", "product_id", "seller_sku", "sku_name", "product_name", "sku_image", "sku_type",
+                         "display_status", "package_status", "currency", "cancel_reason", "cancel_user",
+                         "shipping_provider_id", "shipping_provider_name"})
+    _MONEY = frozenset({"sale_price", "original_price", "seller_discount", "platform_discount"})
+
+    def __repr__(self):
+        return f"LineItem(id={self.id!r}, seller_sku={self.seller_sku!r}, display_status={self.display_status!r})"
+
+
+@dataclass(slots=True, eq=False, repr=False)
+class Order(_Model):
+    id: str | None = None
+    status: str | None = None
+    create_time: int | None = None
+    update_time: int | None = None
+    paid_time: int | None = None
+    cancel_time: int | None = None
+    rts_time: int | None = None
+    delivery_time: int | None = None
+    user_id: str | None = None
+    is_cod: bool | None = None
+    delivery_option_name: str | None = None
+    delivery_type: str | None = None
+    fulfillment_type: str | None = None
+    shipping_type: str | None = None
+    shipping_provider: str | None = None
+    payment_method_name: str | None = None
+    order_type: str | None = None
+    cancellation_initiator: str | None = None
+    cancel_reason: str | None = None
+    warehouse_id: str | None = None
+    tracking_number: str | None = None
+    payment: Payment | None = None
+    line_items: list | None = None
+    packages: list | None = None
+    _keys: tuple = ()
+    _blob: bytes | None = None
+
+    _HOT = ("id", "status", "create_time", "update_time", "paid_time", "cancel_time", "rts_time", "delivery_time",
+            "user_id", "is_cod", "delivery_option_name", "delivery_type", "fulfillment_type", "shipping_type",
+            "shipping_provider", "payment_method_name", "order_type", "cancellation_initiator", "cancel_reason",
+            "warehouse_id", "tracking_number")
+    _INTERN = frozenset({"status", "delivery_option_name", "delivery_type", "fulfillment_type", "shipping_type",
+                         "shipping_provider", "payment_method_name", "order_type", "cancellation_initiator",
+                         "cancel_reason", "warehouse_id"})
+    _NESTED = {"payment": Payment, "line_items": LineItem, "packages": Package}
+
+    @property
+    def currency(self):
+        return self.payment.currency if isinstance(self.payment, Payment) else None
+
+    def __repr__(self):
+        return (f"Order(id={self.id!r}, status={self.status!r}, create_time={self.create_time!r}, "
+                f"line_items={len(self.line_items or ())})")
+
+
+def to_models(orders) -> list:
+    """list đơn JSON (API) → list Order."""
+    return [Order.from_json(o) for o in orders]
+
+def to_json(orders) -> list:
+    """list Order (hoặc đơn JSON, giữ nguyên) → list dict JSON của API."""
+    return [o.to_json() if isinstance(o, Order) else o for o in orders]
@@ -0,0 +1,65 @@
+# orders_output.py — ghi kết quả: JSON (indent=2 như cũ) hoặc JSONL/NDJSON ghi dần theo trang, nén gzip tuỳ chọn
+import sys, gzip
+import tts_json, tts_metrics
+
+def open_text(path: str, gz: bool = False, mode: str = "w"):
+    """Mở file text UTF-8 để ghi; path "-" là stdout; gz=True ghi qua gzip."""
+    if path == "-":
+        return _NoClose(sys.stdout)
+    if gz:
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+def write_jsonl(orders, f):
+    """Ghi mỗi đơn một dòng JSON gọn (không indent). Trả về số đơn đã ghi."""
+    n = 0
+    with tts_metrics.span("write_output"):
+        for o in orders:
+            f.write(tts_json.dumps_text(o))
+            f.write("\n")
+            n += 1
+    return n
+
+def write_pages_jsonl(pages, path: str, gz: bool = False, on_page=None):
+    """
+    Ghi từng trang ngay khi nhận được (pages là iterable các list đơn, ví dụ
+    orders_search.iter_order_pages) → bộ nhớ chỉ giữ 1 trang. on_page(page) gọi sau mỗi trang.
+    """
+    n = 0
+    with open_text(path, gz) as f:
+        for page in pages:
+            n += write_jsonl(page, f)
+            f.flush()
+            if on_page is not None:
+                on_page(page)
+    return n
+
+def write_json(orders: list, path: str, gz: bool = False):
+    with tts_metrics.span("write_output"), open_text(path, gz) as f:
+        f.write(tts_json.dumps_pretty(orders))
+        if path == "-":
+            f.write("\n")
+
+def read_jsonl(path: str):
+    """Đọc lại file .jsonl / .jsonl.gz, yield từng đơn."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield tts_json.loads(line)
+
+
+class _NoClose:
+    """Bọc stdout để dùng được trong `with` mà không đóng nó."""
+
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.flush()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# orders_report.py — tổng hợp KPI bán hàng (doanh thu, giảm giá, tỉ lệ huỷ, số lượng theo SKU) trên tập đơn
+# Đơn được trải thành mảng NumPy 1 lần: tiền → int64 đơn vị nhỏ nhất, thời gian → int64 epoch giây,
+# chuỗi (status, SKU...) → mã int32 + bảng tra. Mọi phép group by sau đó chạy vector hoá (lexsort + reduceat),
+# nên tổng hợp nhiều tháng đơn không còn là vòng lặp Python trên dict lồng nhau.
+# Ví dụ:
+#   python orders_report.py orders_*.json --by day
+#   python run_orders_cli.py report --db orders.db --by sku --from 2025-09-01 --to 2025-09-30 --sort revenue --top 20
+import sys, csv, argparse
+from datetime import datetime, timedelta, timezone
+from tts_money import money_to_minor
+import tts_json
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+VN_OFFSET = 7 * 3600
+
+ORDER_MONEY = ("total_amount", "sub_total", "shipping_fee", "seller_discount", "platform_discount")
+ITEM_MONEY = ("sale_price", "original_price", "seller_discount", "platform_discount")
+CAT_KEYS = ("status", "cancellation_initiator", "delivery_option_name", "currency")
+GROUP_KEYS = ("day", "hour", "sku", *CAT_KEYS, "is_cod")
+CANCELLED = "CANCELLED"
+
+def _np():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        raise RuntimeError("Cần cài numpy để tổng hợp báo cáo: pip install numpy")
+
+
+class _Codes:
+    """Chuỗi → mã int32 theo thứ tự gặp đầu tiên (None / "" → -1)."""
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def code(self, v):
+        if v is None or v == "":
+            return -1
+        c = self.index.get(v)
+        if c is None:
+            c = self.index[v] = len(self.values)
+            self.values.append(v)
+        return c
+
+
+class OrderFrame:
+    """
+    Tập đơn dạng cột NumPy.
+      orders: create_time, status, cancellation_initiator, delivery_option_name, currency (mã), is_cod (1/0/-1),
+              cancelled (bool), units (line item không huỷ), tiền payment (int64)
+      items : order (chỉ số đơn), sku (mã seller_sku), cancelled (bool), tiền line item (int64)
+    1 line item = 1 đơn vị hàng (API trả mỗi đơn vị thành 1 line item). Tiền thiếu tính là 0.
+    labels: tên cột → list giá trị chuỗi theo mã.
+    """
+
+    def __init__(self, orders: dict, items: dict, labels: dict):
+        self.orders = orders
+        self.items = items
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.orders["create_time"])
+
+    @classmethod
+    def from_orders(cls, orders):
+        np = _np()
+        codes = {k: _Codes() for k in (*CAT_KEYS, "sku")}
+        oc = {k: [] for k in ("create_time", "is_cod", *CAT_KEYS, *ORDER_MONEY)}
+        ic = {k: [] for k in ("order", "sku", "cancelled", *ITEM_MONEY)}
+        n = 0
+        for o in orders:
+            pay = o.get("payment") or {}
+            cur = pay.get("currency")
+            oc["create_time"].append(int(o.get("create_time") or 0))
+            cod = o.get("is_cod")
+            oc["is_cod"].append(-1 if cod is None else int(bool(cod)))
+            for k in CAT_KEYS:
+                oc[k].append(codes[k].code(cur if k == "currency" else o.get(k)))
+            for k in ORDER_MONEY:
+                oc[k].append(money_to_minor(pay.get(k), cur) or 0)
+            for li in o.get("line_items") or []:
+                li_cur = li.get("currency") or cur
+                ic["order"].append(n)
+                ic["sku"].append(codes["sku"].code(li.get("seller_sku")))
+                ic["cancelled"].append(li.get("display_status") == CANCELLED)
+                for k in ITEM_MONEY:
+                    ic[k].append(money_to_minor(li.get(k), li_cur) or 0)
+            n += 1
+
+        oa = {k: np.asarray(v, dtype=np.int64) for k, v in oc.items()}
+        for k in CAT_KEYS:
+            oa[k] = oa[k].astype(np.int32)
+        oa["is_cod"] = oa["is_cod"].astype(np.int8)
+        ia = {k: np.asarray(v, dtype=np.int64) for k, v in ic.items() if k != "cancelled"}
+        ia["order"] = ia["order"].astype(np.int32)
+        ia["sku"] = ia["sku"].astype(np.int32)
+        status_cancelled = codes["status"].index.get(CANCELLED, -2)
+        oa["cancelled"] = oa["status"] == status_cancelled
+        # line item huỷ khi chính nó CANCELLED hoặc cả đơn bị huỷ
+        ia["cancelled"] = np.asarray(ic["cancelled"], dtype=bool) | oa["cancelled"][ia["order"]]
+        oa["units"] = np.bincount(ia["order"], weights=~ia["cancelled"], minlength=n).astype(np.int64)
+        return cls(oa, ia, {k: c.values for k, c in codes.items()})
+
+    def select(self, ge: int | None = None, lt: int | None = None):
+        """Lọc theo create_time trong [ge, lt) (vector hoá), trả về OrderFrame mới."""
+        np = _np()
+        ct = self.orders["create_time"]
+        mask = np.ones(len(ct), dtype=bool)
+        if ge is not None:
+            mask &= ct >= ge
+        if lt is not None:
+            mask &= ct < lt
+        if mask.all():
+            return self
+        new_index = np.cumsum(mask, dtype=np.int64) - 1
+        keep_items = mask[self.items["order"]]
+        items = {k: v[keep_items] for k, v in self.items.items()}
+        items["order"] = new_index[items["order"]].astype(np.int32)
+        return OrderFrame({k: v[mask] for k, v in self.orders.items()}, items, self.labels)
+
+
+def _key_column(frame: OrderFrame, key: str, item_level: bool):
+    np = _np()
+    if key == "sku":
+        return frame.items["sku"].astype(np.int64)
+    if key in ("day", "hour"):
+        local = frame.orders["create_time"] + VN_OFFSET
+        col = local // 86400 if key == "day" else (local % 86400) // 3600
+    else:
+        col = frame.orders[key].astype(np.int64)
+    return col[frame.items["order"]] if item_level else col
+
+def _label(frame: OrderFrame, key: str, code: int):
+    if key == "day":
+        return (datetime(1970, 1, 1) + timedelta(days=code)).strftime("%Y-%m-%d")
+    if key == "hour":
+        return code
+    if key == "is_cod":
+        return None if code < 0 else bool(code)
+    return None if code < 0 else frame.labels[key][code]
+
+def _groups(np, cols: list, n: int):
+    """cols: các mảng khoá cùng độ dài n → (thứ tự sắp xếp, vị trí đầu mỗi nhóm, khoá của mỗi nhóm)."""
+    order = np.lexsort(cols[::-1]) if cols else np.arange(n)
+    sorted_cols = [c[order] for c in cols]
+    change = np.zeros(n, dtype=bool)
+    if n:
+        change[0] = True
+    for c in sorted_cols:
+        change[1:] |= c[1:] != c[:-1]
+    starts = np.flatnonzero(change)
+    return order, starts, [c[starts] for c in sorted_cols]
+
+def aggregate(frame: OrderFrame, by=("day",)) -> list:
+    """
+    Group by các khoá trong GROUP_KEYS (day/hour theo giờ VN). Trả về list dict: khoá + chỉ số.
+    Không có "sku": theo đơn — orders, cancelled, cancel_rate, units, gmv (mọi đơn),
+      revenue / seller_discount / platform_discount / shipping_fee (đơn không huỷ).
+    Có "sku": theo line item — units, cancelled_units, cancel_rate, orders (số đơn khác nhau), gmv,
+      revenue (sale_price) / seller_discount / platform_discount (line item không huỷ).
+    Tiền là int đơn vị nhỏ nhất; có nhiều loại tiền thì tự thêm khoá "currency".
+    """
+    np = _np()
+    by = [k.strip() for k in ([by] if isinstance(by, str) else by) if k.strip()]
+    bad = [k for k in by if k not in GROUP_KEYS]
+    if bad:
+        raise ValueError(f"Khoá group không hỗ trợ: {', '.join(bad)} (chọn trong {', '.join(GROUP_KEYS)})")
+    if len(frame.labels["currency"]) > 1 and "currency" not in by:
+        by.append("currency")
+    item_level = "sku" in by
+    src = frame.items if item_level else frame.orders
+    n = len(src["cancelled"])
+    if not n:
+        return []
+    order, starts, keys = _groups(np, [_key_column(frame, k, item_level) for k in by], n)
+    count = np.diff(np.append(starts, n))
+    cancelled = src["cancelled"][order]
+    live = (~cancelled).astype(np.int64)
+
+    def total(col, only_live=True):
+        v = src[col][order]
+        return np.add.reduceat(v * live if only_live else v, starts)
+
+    n_cancelled = np.add.reduceat(cancelled.astype(np.int64), starts)
+    if item_level:
+        # số đơn khác nhau trong mỗi nhóm: sắp lại theo (nhóm, đơn), đếm chỗ đơn đổi
+        group_id = np.repeat(np.arange(len(starts)), count)
+        orders_sorted = frame.items["order"][order]
+        o2 = np.lexsort((orders_sorted, group_id))
+        g, oi = group_id[o2], orders_sorted[o2]
+        first = np.ones(n, dtype=bool)
+        first[1:] = (g[1:] != g[:-1]) | (oi[1:] != oi[:-1])
+        metrics = {
+            "units": count - n_cancelled, "cancelled_units": n_cancelled,
+            "orders": np.bincount(g[first], minlength=len(starts)),
+            "gmv": total("sale_price", False), "revenue": total("sale_price"),
+            "seller_discount": total("seller_discount"), "platform_discount": total("platform_discount"),
+        }
+    else:
+        metrics = {
+            "orders": count, "cancelled": n_cancelled, "units": total("units"),
+            "gmv": total("total_amount", False), "revenue": total("total_amount"),
+            "seller_discount": total("seller_discount"), "platform_discount": total("platform_discount"),
+            "shipping_fee": total("shipping_fee"),
+        }
+    rate = n_cancelled / count
+
+    rows = []
+    key_lists = [k.tolist() for k in keys]
+    metric_lists = {m: v.tolist() for m, v in metrics.items()}
+    rate_list = rate.tolist()
+    for i in range(len(starts)):
+        row = {k: _label(frame, k, key_lists[j][i]) for j, k in enumerate(by)}
+        for m, v in metric_lists.items():
+            row[m] = v[i]
+        row["cancel_rate"] = round(rate_list[i], 4)
+        rows.append(row)
+    rows.sort(key=lambda r: tuple((r[k] is None, r[k] if r[k] is not None else "") for k in by))
+    return rows
+
+def report(orders, by=("day",), ge: int | None = None, lt: int | None = None) -> list:
+    """Hàm tiện dụng: orders là list đơn (JSON API) hoặc OrderFrame; ge/lt lọc theo create_time."""
+    frame = orders if isinstance(orders, OrderFrame) else OrderFrame.from_orders(orders)
+    return aggregate(frame.select(ge, lt), by)
+
+
+def _vn_day(s: str) -> int:
+    return int(datetime.strptime(s, "%Y-%m-%d").replace(tzinfo=VN_TZ).timestamp())
+
+def _print_table(rows, out):
+    if not rows:
+        print("(không có đơn)", file=out)
+        return
+    cols = list(rows[0])
+    cells = [[f"{v:,}" if isinstance(v, int) and not isinstance(v, bool) and c != "hour" else str(v)
+              for c, v in r.items()] for r in rows]
+    width = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, width)), file=out)
+    for row in cells:
+        print("  ".join(v.rjust(w) if v[:1].isdigit() or v[:1] == "-" else v.ljust(w)
+                        for v, w in zip(row, width)), file=out)
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Báo cáo KPI bán hàng (NumPy) theo ngày/giờ VN, SKU, trạng thái...")
+    p.add_argument("files", nargs="*", help="File orders_*.json hoặc *.jsonl(.gz)")
+    p.add_argument("--db", help="Đọc từ kho SQLite (order_store.py)")
+    p.add_argument("--by", default="day", help=f"Khoá group, cách nhau dấu phẩy: {', '.join(GROUP_KEYS)}")
+    p.add_argument("--from", dest="date_from", help="Từ ngày tạo (YYYY-MM-DD, giờ VN)")
+    p.add_argument("--to", dest="date_to", help="Đến hết ngày tạo (YYYY-MM-DD, giờ VN)")
+    p.add_argument("--sort", help="Sắp xếp giảm dần theo chỉ số (ví dụ revenue, units, cancel_rate)")
+    p.add_argument("--top", type=int, help="Chỉ in N dòng đầu")
+    p.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    p.add_argument("--out", default="-", help="File đích ('-' = stdout)")
+    args = p.parse_args(argv)
+    if not args.files and not args.db:
+        p.error("cần ít nhất một file hoặc --db")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    ge = _vn_day(args.date_from) if args.date_from else None
+    lt = _vn_day(args.date_to) + 86400 if args.date_to else None
+    if args.db and not args.files:
+        from order_store import OrderStore
+        with OrderStore(args.db) as store:
+            orders = store.query(create_time_ge=ge, create_time_lt=lt)  # lọc bằng index create_time
+    else:
+        from orders_export import load_orders
+        orders = load_orders(args.files, db=args.db)
+    try:
+        rows = report(orders, args.by.split(","), ge, lt)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.sort:
+        if rows and args.sort not in rows[0]:
+            raise SystemExit(f"Không có chỉ số {args.sort!r}")
+        rows.sort(key=lambda r: r[args.sort], reverse=True)
+    if args.top:
+        rows = rows[:args.top]
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+    try:
+        if args.format == "json":
+            out.write(tts_json.dumps_pretty(rows))
+            out.write("\n")
+        elif args.format == "csv":
+            if rows:
+                w = csv.DictWriter(out, fieldnames=list(rows[0]))
+                w.writeheader()
+                w.writerows(rows)
+        else:
+            _print_table(rows, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ {len(orders)} đơn → {len(rows)} dòng", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 # orders_search.py
-import json
+import os, math, queue, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta, timezone
 from tts_client import post_signed_with_shop
+import tts_metrics
 
 
 
@@ -10,47 +12,361 @@ PATH = "/order/202309/orders/search"
 # Giờ Việt Nam (UTC+7)
 VN_TZ = timezone(timedelta(hours=7))
 
-def fetch_orders_by_created(create_time_ge: int, create_time_lt: int, page_size: int = 50):
+# Số trang gọi trước trong khi trang hiện tại đang được lọc / ghi (None = đọc TTS_PREFETCH, mặc định 0 = tuần tự)
+PREFETCH = None
+
+class PaginationInterrupted(RuntimeError):
+    """
+    Phân trang dừng giữa chừng (client đã hết lượt retry). page_token: trang cần lấy tiếp
+    (None = trang đầu); orders: các đơn đã lấy được. Truyền lại qua `resume=` để chạy tiếp
+    từ trang đó thay vì làm lại từ đầu.
+    """
+
+    def __init__(self, cause: Exception, page_token: str | None, orders: list | None = None):
+        super().__init__(f"Dừng phân trang tại page_token={page_token!r}: {cause}")
+        self.cause = cause
+        self.page_token = page_token
+        self.orders = orders or []
+
+# Bộ lọc server-side của orders/search (filters=...): khoảng thời gian đi vào time_filter, còn lại ở gốc body
+TIME_FILTERS = ("create_time_ge", "create_time_lt", "update_time_ge", "update_time_lt")
+BODY_FILTERS = ("order_status", "shipping_type", "buyer_user_id", "is_buyer_request_cancel", "warehouse_ids")
+
+def search_body(time_field: str, ge: int, lt: int, filters: dict | None = None) -> dict:
+    """
+    Body của orders/search: khoảng [ge, lt) theo time_field + filters (TIME_FILTERS / BODY_FILTERS).
+    order_status là list nhiều trạng thái thì không đẩy lên server (API chỉ nhận 1), chỉ lọc ở client.
+    """
+    # Lọc thời gian: để trong BODY (giữ int64)
+    time_filter = {f"{time_field}_ge": int(ge), f"{time_field}_lt": int(lt)}
+    body = {"time_filter": time_filter}
+    for k, v in (filters or {}).items():
+        if v is None:
+            continue
+        if k in TIME_FILTERS:
+            if k not in time_filter:  # khoảng chính (time_field) đã có
+                time_filter[k] = int(v)
+        elif k == "order_status":
+            statuses = [v] if isinstance(v, str) else list(v)
+            if len(statuses) == 1:
+                body[k] = statuses[0]
+        elif k in BODY_FILTERS:
+            body[k] = v
+        else:
+            raise RuntimeError(f"Bộ lọc không hỗ trợ: {k!r} (chọn trong {', '.join(TIME_FILTERS + BODY_FILTERS)})")
+    return body
+
+def _filter_check(filters: dict | None):
+    """Hàm kiểm 1 đơn theo order_status / TIME_FILTERS (lọc lại client-side cho chắc); None nếu không cần."""
+    checks = []
+    for k, v in (filters or {}).items():
+        if v is None:
+            continue
+        if k == "order_status":
+            statuses = frozenset([v] if isinstance(v, str) else v)
+            checks.append(lambda o, s=statuses: o.get("status") in s)
+        elif k in TIME_FILTERS:
+            field, t = k[:-3], int(v)
+            if k.endswith("_ge"):
+                checks.append(lambda o, f=field, t=t: int(o.get(f, 0)) >= t)
+            else:
+                checks.append(lambda o, f=field, t=t: int(o.get(f, 0)) < t)
+    if not checks:
+        return None
+    return lambda o: all(c(o) for c in checks)
+
+def project(order: dict, fields=None, drop=None) -> dict:
+    """
+    Chỉ giữ các field trong fields (cấp đơn) và bỏ các field trong drop — ở cấp đơn lẫn trong từng
+    line_items / packages (ví dụ drop=("sku_image", "recipient_address", "packages")).
+    """
+    if fields:
+        order = {k: v for k, v in order.items() if k in fields}
+    if drop:
+        order = {k: v for k, v in order.items() if k not in drop}
+        for k in ("line_items", "packages"):
+            v = order.get(k)
+            if type(v) is list:
+                order[k] = [{ik: iv for ik, iv in x.items() if ik not in drop} if type(x) is dict else x for x in v]
+    return order
+
+def _search_page(create_time_ge: int, create_time_lt: int, page_size: int, page_token: str | None = None,
+                 client=None, time_field: str = "create_time", filters: dict | None = None):
+    """
+    Gọi 1 trang search. Trả về (orders, next_page_token, total_count).
+    time_field: "create_time" hoặc "update_time" — trường dùng để lọc khoảng và sắp xếp.
+    filters: bộ lọc server-side thêm vào body (xem search_body).
+    """
+    # Tham số phân trang/sắp xếp: đặt trên URL
+    query_params = {
+        "page_size": int(page_size),
+        "sort_order": "DESC",
+        "sort_field": time_field,
+    }
+    if page_token:
+        query_params["page_token"] = page_token
+
+    body = search_body(time_field, create_time_ge, create_time_lt, filters)
+
+    post = client.post_signed_with_shop if client is not None else post_signed_with_shop
+    data = post(PATH, body=body, query_extra=query_params)
+    d = data.get("data") or {}
+    tts_metrics.inc("pages_total")
+    return d.get("orders") or [], d.get("next_page_token"), d.get("total_count")
+
+def _filter_and_sort(all_orders: list, create_time_ge: int, create_time_lt: int, time_field: str = "create_time",
+                     filters: dict | None = None, fields=None, drop=None):
+    # --- LỌC LẠI Ở CLIENT: chỉ giữ đơn có create_time (hoặc time_field) trong khoảng yêu cầu ---
+    ge, lt = int(create_time_ge), int(create_time_lt)
+    check = _filter_check(filters)
+    with tts_metrics.span("filter_sort"):
+        filtered = [o for o in all_orders if ge <= int(o.get(time_field, 0)) < lt and (check is None or check(o))]
+
+        # Sắp xếp lại cho chắc (mới -> cũ)
+        filtered.sort(key=lambda o: int(o.get(time_field, 0)), reverse=True)
+        if fields or drop:
+            filtered = [project(o, fields, drop) for o in filtered]
+    tts_metrics.inc("orders_total", len(filtered))
+    return filtered
+
+def _prefetch_pages(fetch, page_token, depth: int):
+    """
+    Luồng nền gọi trang kế tiếp (fetch(token) → (batch, next_token, total)) ngay khi có next_page_token,
+    đẩy (batch, next_token, token) vào hàng đợi tối đa depth trang; luồng gọi lấy ra theo đúng thứ tự.
+    Lỗi được chuyển qua hàng đợi (sau các trang đã về).
+    Dừng đọc giữa chừng (break / close) → luồng nền dừng sau request đang bay.
+    """
+    q = queue.Queue(maxsize=max(1, depth))
+    closed = threading.Event()
+
+    def put(item):
+        while not closed.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(token):
+        while not closed.is_set():
+            try:
+                batch, next_token, _ = fetch(token)
+            except Exception as e:
+                put((None, e, token))
+                return
+            if not put((batch, next_token, token)) or not next_token:
+                return
+            token = next_token
+
+    threading.Thread(target=produce, args=(page_token,), name="page-prefetch", daemon=True).start()
+    try:
+        while True:
+            with tts_metrics.span("page_wait"):
+                item = q.get()
+            yield item
+            if item[0] is None or not item[1]:
+                return
+    finally:
+        closed.set()
+
+def _raw_pages(fetch, page_token, prefetch: int):
+    """(batch, next_token, token) hoặc (None, lỗi, token) — tuần tự hoặc qua _prefetch_pages."""
+    if prefetch > 0:
+        yield from _prefetch_pages(fetch, page_token, prefetch)
+        return
+    while True:
+        try:
+            batch, next_token, _ = fetch(page_token)
+        except Exception as e:
+            yield None, e, page_token
+            return
+        yield batch, next_token, page_token
+        if not next_token:
+            return
+        page_token = next_token
+
+def iter_search_pages(create_time_ge: int, create_time_lt: int, page_size: int = 50, client=None,
+                      time_field: str = "create_time", page_token: str | None = None, prefetch: int | None = None,
+                      filters: dict | None = None, fields=None, drop=None):
+    """
+    Như iter_order_pages nhưng yield (trang, next_page_token) — next_page_token None ở trang cuối.
+    Dùng khi cần lưu checkpoint sau mỗi trang (orders_backfill.py).
+    """
+    ge, lt = int(create_time_ge), int(create_time_lt)
+    depth = int(prefetch if prefetch is not None else PREFETCH if PREFETCH is not None
+                else os.getenv("TTS_PREFETCH", "0"))
+    check = _filter_check(filters)
+    fetch = lambda token: _search_page(ge, lt, page_size, token, client, time_field, filters)
+    for batch, next_token, token in _raw_pages(fetch, page_token, depth):
+        if batch is None:  # next_token là lỗi của trang token
+            raise PaginationInterrupted(next_token, token) from next_token
+        with tts_metrics.span("filter_sort"):
+            page = [o for o in batch if ge <= int(o.get(time_field, 0)) < lt and (check is None or check(o))]
+            if fields or drop:
+                page = [project(o, fields, drop) for o in page]
+        tts_metrics.inc("orders_total", len(page))
+        yield page, next_token
+
+def iter_order_pages(create_time_ge: int, create_time_lt: int, page_size: int = 50, client=None,
+                     time_field: str = "create_time", page_token: str | None = None, prefetch: int | None = None,
+                     filters: dict | None = None, fields=None, drop=None):
+    """
+    Generator: yield từng trang đơn ngay khi trang về (đã lọc client-side theo khoảng,
+    giữ thứ tự API trả về: mới -> cũ). Không giữ lại các trang trước (chỉ giữ set id để bỏ đơn
+    trùng như fetch_orders_by_created) nên bộ nhớ gần như không tăng theo độ dài khoảng thời gian.
+    page_token: bắt đầu từ trang này (tiếp tục một lần chạy bị dừng). Lỗi → PaginationInterrupted.
+    prefetch: số trang gọi trước trên luồng nền trong lúc trang hiện tại được xử lý
+    (mặc định PREFETCH / TTS_PREFETCH, không đặt = 0 = tuần tự).
+    filters: bộ lọc đẩy lên server, ví dụ {"order_status": "CANCELLED", "update_time_ge": ts} (xem search_body).
+    fields / drop: chỉ giữ / bỏ các field ngay khi trang về, trước khi đơn được giữ lại (xem project).
+    """
+    seen = set()
+    for page, _ in iter_search_pages(create_time_ge, create_time_lt, page_size, client, time_field, page_token,
+                                     prefetch, filters, fields, drop):
+        yield _dedup(page, seen)
+
+def iter_orders_by_created(create_time_ge: int, create_time_lt: int, page_size: int = 50, client=None):
+    """Generator: yield từng đơn tạo trong [create_time_ge, create_time_lt) ngay khi trang chứa nó về."""
+    for page in iter_order_pages(create_time_ge, create_time_lt, page_size, client):
+        yield from page
+
+def _dedup(page: list, seen: set):
+    """Bỏ đơn có `id` đã gặp (API có thể trả lặp 1 đơn ở 2 trang khi đơn đổi trong lúc phân trang)."""
+    out = []
+    for o in page:
+        oid = o.get("id")
+        if oid is not None:
+            if oid in seen:
+                continue
+            seen.add(oid)
+        out.append(o)
+    return out
+
+def _collect_pages(pages, resume: PaginationInterrupted | None, as_model: bool = False):
+    orders = list(resume.orders) if resume else []
+    seen = {o.get("id") for o in orders}
+    if as_model:
+        from orders_model import to_models
+    try:
+        for page in pages:
+            page = _dedup(page, seen)
+            # đổi từng trang ngay khi về → dict thô của trang được giải phóng sớm
+            orders.extend(to_models(page) if as_model else page)
+    except PaginationInterrupted as e:
+        e.orders = orders
+        raise
+    return orders
+
+def fetch_orders_by_created(create_time_ge: int, create_time_lt: int, page_size: int = 50, client=None,
+                            resume: PaginationInterrupted | None = None, as_model: bool = False,
+                            filters: dict | None = None, fields=None, drop=None):
     """
     Lấy toàn bộ đơn trong [create_time_ge, create_time_lt) (server-side),
     sau đó lọc lại client-side để đảm bảo đúng tuyệt đối.
+    client: tts_client.TTSClient của shop cần lấy (mặc định: client đọc từ .env).
+    resume: PaginationInterrupted của lần gọi trước (cùng tham số) để lấy tiếp từ page_token đã dừng.
+    as_model: trả về list orders_model.Order (gọn bộ nhớ, to_json() ra lại đúng JSON API) thay vì dict.
+    filters / fields / drop: như iter_order_pages, ví dụ chỉ lấy đơn huỷ, bỏ ảnh SKU và địa chỉ:
+        fetch_orders_by_created(ge, lt, filters={"order_status": "CANCELLED"},
+                                drop=("sku_image", "recipient_address", "packages"))
     """
-    page_token = None
-    all_orders = []
+    orders = _collect_pages(iter_order_pages(create_time_ge, create_time_lt, page_size, client,
+                                             page_token=resume.page_token if resume else None,
+                                             filters=filters, fields=fields, drop=drop), resume, as_model)
 
+    # Sắp xếp lại cho chắc (mới -> cũ)
+    with tts_metrics.span("filter_sort"):
+        orders.sort(key=lambda o: int(o.get("create_time", 0)), reverse=True)
+    return orders
+
+def fetch_orders_by_updated(update_time_ge: int, update_time_lt: int, page_size: int = 50, client=None,
+                            resume: PaginationInterrupted | None = None, as_model: bool = False,
+                            filters: dict | None = None, fields=None, drop=None):
+    """
+    Lấy toàn bộ đơn có update_time trong [update_time_ge, update_time_lt), mới cập nhật -> cũ.
+    Dùng cho đồng bộ tăng dần (orders_sync.py). as_model / filters / fields / drop: như fetch_orders_by_created.
+    """
+    orders = _collect_pages(iter_order_pages(update_time_ge, update_time_lt, page_size, client, "update_time",
+                                             page_token=resume.page_token if resume else None,
+                                             filters=filters, fields=fields, drop=drop), resume, as_model)
+    with tts_metrics.span("filter_sort"):
+        orders.sort(key=lambda o: int(o.get("update_time", 0)), reverse=True)
+    return orders
+
+def _split_window(ge: int, lt: int, parts: int):
+    step = (lt - ge) / parts
+    edges = [ge + int(round(step * i)) for i in range(parts)] + [lt]
+    return [(a, b) for a, b in zip(edges, edges[1:]) if b > a]
+
+def _fetch_window(ge: int, lt: int, page_size: int, dense_pages: int, min_window: int, client=None,
+                  filters: dict | None = None, drop=None):
+    """
+    Lấy 1 cửa sổ con. Trả về (head, [cửa sổ con]):
+      - cửa sổ thưa: (mọi đơn của cửa sổ, []);
+      - cửa sổ dày (total_count > dense_pages trang, hoặc không có total_count mà đã lấy dense_pages trang
+        vẫn còn trang sau) và còn chia được: các trang ĐÃ lấy được giữ lại làm head = đơn có
+        create_time > c_min (c_min: create_time nhỏ nhất đã thấy; API trả mới -> cũ), chỉ phần chưa lấy
+        [ge, c_min + 1) được chia cho scheduler → không trang nào bị gọi 2 lần (trừ các đơn trùng đúng c_min).
+    drop: bỏ field ngay từng trang (fields thì áp dụng sau khi gộp vì còn cần id / thời gian).
+    """
+    shape = (lambda b: [project(o, None, drop) for o in b]) if drop else list
+    orders, pages, page_token, c_min = [], 0, None, lt
     while True:
-        # Tham số phân trang/sắp xếp: đặt trên URL
-        query_params = {
-            "page_size": int(page_size),
-            "sort_order": "DESC",
-            "sort_field": "create_time",
-        }
-        if page_token:
-            query_params["page_token"] = page_token
-
-        # Lọc thời gian: để trong BODY (giữ int64)
-        body = {
-            "time_filter": {
-                "create_time_ge": int(create_time_ge),
-                "create_time_lt": int(create_time_lt),
-            }
-        }
-
-        data = post_signed_with_shop(PATH, body=body, query_extra=query_params)
-        batch = (data.get("data") or {}).get("orders") or []
-        all_orders.extend(batch)
-
-        page_token = (data.get("data") or {}).get("next_page_token")
+        batch, page_token, total = _search_page(ge, lt, page_size, page_token, client, filters=filters)
+        pages += 1
+        times = [int(o.get("create_time", 0)) for o in batch]
+        c_min = min([c_min] + [t for t in times if ge <= t < lt])
+        orders.extend(shape(batch))
         if not page_token:
-            break
+            return orders, []
+        # Có total_count thì quyết định ngay sau trang đầu, chia 1 lần cho đủ; không có thì chia đôi dần
+        if total:
+            parts = math.ceil(int(total) / (page_size * dense_pages)) if pages == 1 else 1
+        else:
+            parts = 2 if pages >= dense_pages else 1
+        hi = min(c_min + 1, lt)
+        parts = min(parts, (hi - ge) // min_window)
+        if parts >= 2:
+            head = [o for o in orders if int(o.get("create_time", 0)) >= hi]
+            return head, _split_window(ge, hi, parts)
 
-    # --- LỌC LẠI Ở CLIENT: chỉ giữ đơn có create_time trong khoảng yêu cầu ---
+def fetch_orders_by_created_parallel(create_time_ge: int, create_time_lt: int, page_size: int = 50,
+                                     max_workers: int = 4, slices: int | None = None,
+                                     dense_pages: int = 4, min_window: int = 300, client=None,
+                                     filters: dict | None = None, fields=None, drop=None):
+    """
+    Giống fetch_orders_by_created nhưng chia [create_time_ge, create_time_lt) thành các cửa sổ con
+    và lấy song song bằng pool max_workers luồng. Cửa sổ nào dày thì phần chưa lấy được chia nhỏ tiếp
+    (không nhỏ hơn min_window giây). Kết quả gộp, bỏ trùng theo `id` (như bản tuần tự), sắp xếp mới -> cũ
+    giống hệt bản tuần tự. filters / fields / drop: như fetch_orders_by_created.
+    """
     ge, lt = int(create_time_ge), int(create_time_lt)
-    filtered = [o for o in all_orders if ge <= int(o.get("create_time", 0)) < lt]
+    if lt <= ge:
+        return []
 
-    # Sắp xếp lại cho chắc (mới -> cũ)
-    filtered.sort(key=lambda o: int(o.get("create_time", 0)), reverse=True)
-    return filtered
+    results = {}  # (win_ge, win_lt) -> orders theo đúng thứ tự API trả về
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        pending = {}
+        for win in _split_window(ge, lt, max(1, int(slices or max_workers))):
+            pending[pool.submit(_fetch_window, *win, page_size, dense_pages, min_window, client, filters, drop)] = win
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                win = pending.pop(fut)
+                head, subwindows = fut.result()
+                for sub in subwindows:
+                    pending[pool.submit(_fetch_window, *sub, page_size, dense_pages, min_window, client,
+                                        filters, drop)] = sub
+                # head phủ [lt của cửa sổ con cuối, win_lt) — không chồng lên các cửa sổ con
+                results[(subwindows[-1][1] if subwindows else win[0], win[1])] = head
+
+    # Ghép theo cửa sổ mới -> cũ để thứ tự các đơn trùng create_time giữ như bản tuần tự
+    merged, seen = [], set()
+    for win in sorted(results, reverse=True):
+        merged.extend(_dedup(results[win], seen))
+
+    return _filter_and_sort(merged, ge, lt, filters=filters, fields=fields)
 
 if __name__ == "__main__":
     # “Hôm nay” theo giờ VN: 00:00:00 -> 24:00:00
@@ -68,7 +384,7 @@ if __name__ == "__main__":
     stamp = now_vn.strftime("%Y%m%d_%H%M%S")
     filename = f"orders_{stamp}.json"
 
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=2)
+    from orders_output import write_json
+    write_json(orders, filename)
 
     print(f"✅ Đã ghi {len(orders)} đơn **tạo trong hôm nay** (giờ VN) vào file {filename}")
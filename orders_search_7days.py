@@ -1,7 +1,8 @@
 # orders_search.py
-import json
+import argparse
 from datetime import datetime, timedelta, timezone
 from tts_client import post_signed_with_shop
+import tts_json
 
 
 
@@ -52,7 +53,31 @@ def fetch_orders_by_created(create_time_ge: int, create_time_lt: int, page_size:
     filtered.sort(key=lambda o: int(o.get("create_time", 0)), reverse=True)
     return filtered
 
+def parse_args():
+    p = argparse.ArgumentParser(description="Lấy đơn tạo trong 7 ngày gần nhất (giờ VN).")
+    p.add_argument("--incremental", action="store_true",
+                   help="Chỉ lấy đơn có update_time mới từ lần chạy trước rồi upsert vào --dataset")
+    p.add_argument("--dataset", default="orders_7days.json", help="File dữ liệu dùng cho --incremental")
+    p.add_argument("--cursor", default="sync_cursor.json", help="File lưu cursor update_time theo shop")
+    p.add_argument("--store", help="Upsert thêm vào kho SQLite (order_store.py), ví dụ orders.db")
+    p.add_argument("--overlap", type=int, default=600, help="Số giây lùi lại so với cursor (tránh sót đơn)")
+    return p.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.incremental:
+        from orders_sync import sync_incremental
+        store = None
+        if args.store:
+            from order_store import OrderStore
+            store = OrderStore(args.store)
+        res = sync_incremental(args.dataset, cursor_file=args.cursor, overlap=args.overlap, window_days=7,
+                               store=store)
+        print(f"✅ Đồng bộ tăng dần: lấy {res['fetched']} đơn thay đổi "
+              f"({res['created']} mới, {res['updated']} cập nhật, {res['expired']} quá hạn bỏ ra); "
+              f"{args.dataset} có {res['total']} đơn, cursor update_time={res['cursor']}")
+        raise SystemExit(0)
+
     # Giờ Việt Nam (UTC+7)
     now_vn = datetime.now(VN_TZ)
 
@@ -75,6 +100,6 @@ if __name__ == "__main__":
     filename = f"orders_{stamp}.json"
 
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=2)
+        f.write(tts_json.dumps_pretty(orders))
 
     print(f"✅ Đã ghi {len(orders)} đơn tạo trong 7 ngày gần nhất vào file {filename}")
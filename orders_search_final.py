@@ -1,18 +1,20 @@
 # orders_search_final.py
-import json
 from datetime import datetime, timedelta, timezone
 from tts_client import post_signed_with_shop
+import tts_json
 
 PATH = "/order/202309/orders/search"
 
 # Giờ Việt Nam (UTC+7)
 VN_TZ = timezone(timedelta(hours=7))
 
-def fetch_orders_by_created(create_time_ge: int, create_time_lt: int, page_size: int = 50):
+def fetch_orders_by_created(create_time_ge: int, create_time_lt: int, page_size: int = 50, client=None):
     """
     Lấy toàn bộ đơn trong [create_time_ge, create_time_lt) (server-side),
     sau đó lọc lại client-side để đảm bảo đúng tuyệt đối.
+    client: tts_client.TTSClient của shop cần lấy (mặc định: client đọc từ .env).
     """
+    post = client.post_signed_with_shop if client is not None else post_signed_with_shop
     page_token = None
     all_orders = []
 
@@ -32,7 +34,7 @@ def fetch_orders_by_created(create_time_ge: int, create_time_lt: int, page_size:
             }
         }
 
-        data = post_signed_with_shop(PATH, body=body, query_extra=query_params)
+        data = post(PATH, body=body, query_extra=query_params)
         batch = (data.get("data") or {}).get("orders") or []
         all_orders.extend(batch)
 
@@ -61,6 +63,6 @@ if __name__ == "__main__":
     orders = fetch_orders_by_created(ge, lt, page_size=50)
 
     # In trực tiếp ra terminal dưới dạng JSON đẹp
-    print(json.dumps(orders, ensure_ascii=False, indent=2))
+    print(tts_json.dumps_pretty(orders))
 
     print(f"\n✅ Tổng cộng {len(orders)} đơn tạo hôm nay (giờ VN).")
@@ -0,0 +1,157 @@
+# orders_sync.py — đồng bộ tăng dần theo update_time, lưu cursor (high-water mark) theo từng shop + nơi nhận
+import os, json, time, tempfile, threading
+from datetime import datetime, timedelta, timezone
+from orders_search import fetch_orders_by_updated
+from tts_client import default_client
+from tts_token import file_lock
+import tts_json
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+CURSOR_FILE = "sync_cursor.json"
+# Lùi lại mỗi lần sync để không sót đơn cập nhật trễ phía server (giây)
+DEFAULT_OVERLAP = 600
+# Nhiều shop trong cùng process (orders_daemon.py) dùng chung 1 file cursor → khoá đoạn đọc-sửa-ghi
+_cursor_lock = threading.Lock()
+# Lock liên process của cả đoạn đọc dataset → gộp → ghi → dời cursor (<cursor_file>.lock)
+LOCK_SUFFIX = ".lock"
+
+def shop_key(client=None):
+    """Khóa cursor của shop: shop_cipher hoặc shop_id."""
+    c = client or default_client()
+    key = c.shop_cipher or c.shop_id
+    if not key:
+        raise RuntimeError("Thiếu TTS_SHOP_CIPHER hoặc TTS_SHOP_ID để lưu cursor")
+    return key
+
+def _write_json_atomic(path: str, data):
+    """
+    Ghi ra file tạm tên riêng cùng thư mục rồi os.replace: 2 lần sync cùng ghi 1 file (daemon + chạy tay)
+    không đè file tạm của nhau, file đích luôn là bản đầy đủ của 1 trong 2.
+    """
+    d = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=d, prefix=f".{os.path.basename(path)}.",
+                                     suffix=".tmp", delete=False) as f:
+        try:
+            f.write(tts_json.dumps_pretty(data))
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+
+def load_cursors(path: str = CURSOR_FILE) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def sink_id(dataset_file: str | None = None, store=None) -> str:
+    """Nơi nhận đơn của 1 lượt sync (file dataset và/hoặc kho SQLite), dùng làm phần sau của khoá cursor."""
+    parts = []
+    if dataset_file is not None:
+        parts.append("dataset=" + os.path.abspath(dataset_file))
+    if store is not None:
+        parts.append("store=" + (store.path if store.path == ":memory:" else os.path.abspath(store.path)))
+    return "+".join(parts)
+
+def _cursor_key(key: str, sink: str) -> str:
+    return f"{key}|{sink}" if sink else key
+
+def load_cursor(key: str, path: str = CURSOR_FILE, sink: str = "", legacy: bool = False) -> int | None:
+    """
+    Mốc update_time của shop `key` cho nơi nhận `sink` (sink_id): mỗi nơi nhận có mốc riêng, nên lượt ghi kho
+    chạy trước không làm lượt ghi dataset bỏ lỡ các thay đổi đó (và ngược lại).
+    legacy: chưa có mốc riêng thì dùng mốc cũ chỉ khoá theo shop (file cursor của bản chỉ ghi dataset).
+    """
+    cursors = load_cursors(path)
+    c = cursors.get(_cursor_key(key, sink))
+    if c is None and legacy:
+        c = cursors.get(key)
+    c = c or {}
+    return int(c["update_time"]) if c.get("update_time") else None
+
+def save_cursor(key: str, update_time: int, path: str = CURSOR_FILE, sink: str = ""):
+    with _cursor_lock:
+        cursors = load_cursors(path)
+        cursors[_cursor_key(key, sink)] = {"update_time": int(update_time), "synced_at": int(time.time())}
+        _write_json_atomic(path, cursors)
+
+def load_dataset(path: str) -> dict:
+    """Đọc file JSON (list đơn) thành dict id -> order."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {o["id"]: o for o in json.load(f)}
+    except FileNotFoundError:
+        return {}
+
+def save_dataset(path: str, orders_by_id: dict):
+    orders = sorted(orders_by_id.values(), key=lambda o: int(o.get("create_time", 0)), reverse=True)
+    _write_json_atomic(path, orders)
+
+def upsert(orders_by_id: dict, orders: list):
+    """Upsert theo id (giữ bản có update_time mới hơn). Trả về (số tạo mới, số cập nhật)."""
+    created = updated = 0
+    for o in orders:
+        old = orders_by_id.get(o["id"])
+        if old is None:
+            created += 1
+        elif int(o.get("update_time", 0)) >= int(old.get("update_time", 0)):
+            if o != old:
+                updated += 1
+        else:
+            continue
+        orders_by_id[o["id"]] = o
+    return created, updated
+
+def _start_of_day_vn(days_ago: int, now: int):
+    d = datetime.fromtimestamp(now, VN_TZ)
+    return int((datetime(d.year, d.month, d.day, tzinfo=VN_TZ) - timedelta(days=days_ago)).timestamp())
+
+def sync_incremental(dataset_file: str | None, cursor_file: str = CURSOR_FILE, overlap: int = DEFAULT_OVERLAP,
+                     window_days: int = 7, page_size: int = 50, client=None, now: int | None = None,
+                     store=None):
+    """
+    Lấy các đơn có update_time >= (cursor - overlap), upsert vào dataset_file theo id, rồi dời cursor.
+    Lần đầu (chưa có cursor) lấy theo update_time từ 00:00 (giờ VN) window_days ngày trước.
+    Dataset chỉ giữ đơn tạo trong window_days ngày gần nhất (giống orders_search_7days.py).
+    store: order_store.OrderStore (tuỳ chọn) — các đơn thay đổi cũng được upsert vào kho SQLite.
+    dataset_file=None: không ghi file JSON, chỉ upsert vào store (tránh ghi lại cả file mỗi lần).
+    Cursor khoá theo shop + nơi nhận (sink_id): dataset và kho dùng chung cursor_file vẫn có mốc riêng.
+    """
+    now = int(now or time.time())
+    key = shop_key(client)
+    sink = sink_id(dataset_file, store)
+    mark = load_cursor(key, cursor_file, sink, legacy=store is None)
+    window_start = _start_of_day_vn(window_days, now)
+    ge = mark - int(overlap) if mark else window_start
+    lt = now + 1
+
+    changed = fetch_orders_by_updated(ge, lt, page_size=page_size, client=client)
+
+    # 2 lượt chạy chồng nhau (daemon + chạy tay, cron gối đầu): đọc lại dataset / cursor SAU khi có lock,
+    # nên lượt sau gộp thêm vào kết quả của lượt trước thay vì ghi đè mất, cursor không lùi
+    with file_lock(cursor_file + LOCK_SUFFIX):
+        if dataset_file is not None:
+            data = load_dataset(dataset_file)
+            created, updated = upsert(data, changed)
+            expired = [oid for oid, o in data.items() if int(o.get("create_time", 0)) < window_start]
+            for oid in expired:
+                del data[oid]
+            save_dataset(dataset_file, data)
+        else:
+            data, created, updated, expired = None, 0, 0, []
+        if store is not None:
+            c, u = store.upsert_orders(changed, shop=key)
+            if dataset_file is None:
+                created, updated = c, u
+
+        # Chỉ dời cursor SAU khi dataset đã ghi xong → chết giữa chừng thì lần sau lấy lại
+        current = load_cursor(key, cursor_file, sink, legacy=store is None)
+        new_mark = max([mark or 0, current or 0] + [int(o.get("update_time", 0)) for o in changed])
+        if new_mark and new_mark != current:
+            save_cursor(key, new_mark, cursor_file, sink)
+    return {"fetched": len(changed), "created": created, "updated": updated,
+            "expired": len(expired), "total": None if data is None else len(data), "cursor": new_mark or None}
@@ -1,42 +1,65 @@
 # refresh_env_token.py  -- refresh bằng GET
-import os, sys, requests
-from dotenv import load_dotenv, set_key
+# Đi qua tts_token (lock file + token_state.json) nên không refresh trùng với script khác đang chạy song song.
+# Refresh token lấy từ đâu:
+#   - mặc định: token_state.json (TTS_TOKEN_STATE) — luôn là bản mới nhất do chính các script ghi sau mỗi lần refresh;
+#   - .env thắng nếu TTS_REFRESH_TOKEN trong .env khác state VÀ .env được sửa sau lần ghi state cuối
+#     (ví dụ vừa dán refresh token mới sau khi ủy quyền lại shop); nếu token của .env bị từ chối
+#     thì thử lại bằng token trong state (.env có thể chỉ được sửa ở dòng khác).
+# Sau khi refresh: ghi cả token_state.json lẫn .env (TTS_ACCESS_TOKEN, TTS_REFRESH_TOKEN nếu đổi).
+import os, sys
+from dotenv import set_key
+import tts_client
 
-load_dotenv()
-APP_KEY    = os.getenv("TTS_APP_KEY")
-APP_SECRET = os.getenv("TTS_APP_SECRET")
-REFRESH    = os.getenv("TTS_REFRESH_TOKEN")
-ENV_FILE   = os.getenv("DOTENV_PATH", ".env")
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
 
-if not (APP_KEY and APP_SECRET and REFRESH):
-    print("❌ Thiếu TTS_APP_KEY/TTS_APP_SECRET/TTS_REFRESH_TOKEN trong .env", file=sys.stderr)
-    sys.exit(2)
-
-params = {
-    "app_key": APP_KEY,
-    "app_secret": APP_SECRET,
-    "grant_type": "refresh_token",
-    "refresh_token": REFRESH,
-}
+client   = tts_client.default_client()
+ENV_FILE = os.getenv("DOTENV_PATH", ".env")
+ENV_REFRESH = os.getenv("TTS_REFRESH_TOKEN")  # giá trị trong .env trước khi refresh (client mặc định sẽ ghi đè os.environ)
 
-url = "https://auth.tiktok-shops.com/api/v2/token/refresh"
+store = client.tokens.store
+fallback = None  # state trước khi .env ghi đè, dùng lại nếu refresh token của .env bị từ chối
+if ENV_REFRESH and ENV_REFRESH != client.state.get("refresh_token") and _mtime(ENV_FILE) > _mtime(store.path):
+    # .env sửa tay sau lần ghi state cuối → bỏ token cũ trong state, refresh bằng refresh token của .env
+    with client.lock, store.locked():
+        store.reload(force=True)
+        if _mtime(ENV_FILE) > _mtime(store.path):
+            fallback = dict(client.state)
+            client.state.update(access_token=None, refresh_token=ENV_REFRESH, expires_at=0)
+            store.save()
+    print(f"ℹ️ Dùng TTS_REFRESH_TOKEN trong {ENV_FILE} (mới hơn {store.path}).")
+REFRESH  = client.state.get("refresh_token")
 
-resp = requests.get(url, params=params, timeout=60)
-if not resp.ok:
-    print(f"❌ Refresh lỗi HTTP {resp.status_code}: {resp.text}", file=sys.stderr)
-    sys.exit(1)
+if not (client.app_key and client.app_secret and REFRESH):
+    print("❌ Thiếu TTS_APP_KEY/TTS_APP_SECRET/TTS_REFRESH_TOKEN trong .env", file=sys.stderr)
+    sys.exit(2)
 
-j = resp.json()
-payload = j.get("data") or j
-access_token = payload.get("access_token")
-new_refresh  = payload.get("refresh_token") or REFRESH
-if not access_token:
-    print(f"❌ Không có access_token trong response: {resp.text}", file=sys.stderr)
-    sys.exit(1)
+try:
+    # stale = token hiện tại → luôn lấy token mới, trừ khi process khác vừa refresh xong
+    access_token = client.tokens.refresh(client.state.get("access_token"))
+except Exception as e:
+    if not (fallback and fallback.get("refresh_token")):
+        print(f"❌ Refresh lỗi: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"⚠️ Refresh token trong {ENV_FILE} bị từ chối ({e}); thử lại bằng token trong {store.path}.")
+    with client.lock, store.locked():
+        store.reload(force=True)
+        if client.state.get("refresh_token") == ENV_REFRESH:
+            client.state.clear(); client.state.update(fallback)
+            store.save()
+    try:
+        access_token = client.tokens.refresh(client.state.get("access_token"))
+    except Exception as e2:
+        print(f"❌ Refresh lỗi: {e2}", file=sys.stderr)
+        sys.exit(1)
+new_refresh = client.state.get("refresh_token")
 
 # Cập nhật .env
 set_key(ENV_FILE, "TTS_ACCESS_TOKEN", access_token)
-if new_refresh and new_refresh != REFRESH:
+if new_refresh and new_refresh != ENV_REFRESH:
     set_key(ENV_FILE, "TTS_REFRESH_TOKEN", new_refresh)
 
 print("✔ .env đã cập nhật TTS_ACCESS_TOKEN (và TTS_REFRESH_TOKEN nếu có).")
@@ -2,23 +2,30 @@
 #!/usr/bin/env python3
 # run_orders_cli.py
 # Usage examples at bottom of file (search for 'EXAMPLES').
-import os, json, argparse
+import os, sys, json, time, argparse, threading
 from datetime import datetime, timedelta, timezone
 from importlib import import_module
+from orders_output import open_text, write_json, write_jsonl, write_pages_jsonl
+import tts_metrics
 
 VN_TZ = timezone(timedelta(hours=7))
 
+# Subcommands: `run_orders_cli.py <name> ...` hands the remaining arguments to <module>.main(argv)
+SUBCOMMANDS = {"serve": "orders_daemon", "daemon": "orders_daemon", "report": "orders_report",
+               "backfill": "orders_backfill", "api": "orders_api"}
+
 def parse_args():
     p = argparse.ArgumentParser(description="Run TikTok Shop order search for any shop via CLI params (no .env needed).")
     # --- Auth & shop params ---
     p.add_argument("--app-key", required=True, help="TTS_APP_KEY")
     p.add_argument("--app-secret", required=True, help="TTS_APP_SECRET")
-    g = p.add_mutually_exclusive_group(required=True)
+    g = p.add_mutually_exclusive_group()
     g.add_argument("--shop-id", help="TTS_SHOP_ID")
     g.add_argument("--shop-cipher", help="TTS_SHOP_CIPHER")
     p.add_argument("--access-token", help="TTS_ACCESS_TOKEN")
     p.add_argument("--refresh-token", help="TTS_REFRESH_TOKEN (recommended so tool can refresh)")
     p.add_argument("--base", default="https://open-api.tiktokglobalshop.com", help="TTS_BASE")
+    p.add_argument("--refresh-url", help="TTS_REFRESH_URL (token refresh endpoint; default TikTok auth host)")
     p.add_argument("--token-state", default="token_state.json", help="TTS_TOKEN_STATE path (created/used if given)")
 
     # --- What to run ---
@@ -30,8 +37,65 @@ def parse_args():
     p.add_argument("--out", help="Output file (default prints JSON to stdout for --mode=today; otherwise writes orders_YYYYMMDD_HHMMSS.json)")
     p.add_argument("--module", default="orders_search", choices=["orders_search", "orders_search_final"],
                    help="Which module to use for fetch logic (both have fetch_orders_by_created(create_time_ge, create_time_lt, page_size))")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Fetch time sub-windows concurrently with N workers (>1 uses fetch_orders_by_created_parallel; same output as serial)")
+    p.add_argument("--prefetch", type=int,
+                   help="Pages to request ahead on a background thread while the current page is filtered/written "
+                        "(default TTS_PREFETCH or 0 = strictly sequential; 2 hides most network latency)")
+    p.add_argument("--status", help="Only orders in these statuses, comma-separated (e.g. CANCELLED); a single status "
+                                    "is filtered server-side, several are filtered client-side")
+    p.add_argument("--updated-ge", type=int, help="Also require update_time >= this (epoch seconds; server-side filter)")
+    p.add_argument("--updated-lt", type=int, help="Also require update_time < this (epoch seconds; server-side filter)")
+    p.add_argument("--fields", help="Keep only these top-level order fields, comma-separated (e.g. id,status,update_time)")
+    p.add_argument("--drop-fields", help="Drop these fields from orders and their line_items/packages as soon as each "
+                                         "page arrives, comma-separated (e.g. sku_image,recipient_address,packages)")
+
+    p.add_argument("--format", choices=["json", "jsonl"], default="json",
+                   help="json: one indented array (default); jsonl: one compact order per line, written as each page arrives")
+    p.add_argument("--gzip", action="store_true", help="gzip-compress the output file (adds .gz to default file names)")
+    p.add_argument("--store", help="Also upsert fetched orders into this local SQLite store (order_store.py), e.g. orders.db")
+    p.add_argument("--hydrate", help="Also fetch order detail + packages + tracking (orders_hydrate.py) and write them "
+                                     "as JSON Lines to this file (.gz = gzip)")
+    p.add_argument("--hydrate-cache", default="hydrate_cache.db",
+                   help="SQLite cache for --hydrate keyed by (id, update_time); '' = in-memory only")
+    p.add_argument("--events", help="Write change events (created / updated with field delta / disappeared; orders_diff.py) "
+                                    "as JSON Lines to this file, compared with --store (before upsert) or --prev")
+    p.add_argument("--prev", nargs="+", help="Previous snapshot file(s) for --events when no --store is used")
+    p.add_argument("--hydrate-workers", type=int, default=8, help="Concurrent detail/package/tracking calls for --hydrate")
+    p.add_argument("--profile", action="store_true",
+                   help="Print a per-stage time breakdown (token, sign, http, json_parse, filter_sort, write_output, ...) "
+                        "plus page/order/retry/status counters to stderr at the end")
+    p.add_argument("--metrics", help="Export metrics (tts_metrics.py): comma-separated json:PATH|-, prom:PATH, http:PORT "
+                                     "(default: $TTS_METRICS)")
+
+    # --- Batch mode (many shops, one process) ---
+    p.add_argument("--manifest", help="JSON manifest of shops to fetch concurrently (see EXAMPLES); replaces --shop-id/--shop-cipher")
+    p.add_argument("--max-shops", type=int, default=8, help="Batch mode: shops fetched at the same time")
+    p.add_argument("--max-inflight", type=int, default=16, help="Batch mode: global cap on in-flight HTTP requests across all shops")
+    p.add_argument("--out-dir", default=".", help="Batch mode: directory for per-shop result files")
+
+    args = p.parse_args()
+    if not args.manifest and not (args.shop_id or args.shop_cipher):
+        p.error("one of the arguments --shop-id --shop-cipher (or --manifest) is required")
+    if args.manifest and (args.hydrate or args.events):
+        p.error("--hydrate/--events are only supported for a single shop (not with --manifest)")
+    if args.events and not (args.store or args.prev):
+        p.error("--events needs --store or --prev to compare against")
+    if search_kwargs(args) and args.module != "orders_search":
+        p.error("--status/--updated-ge/--updated-lt/--fields/--drop-fields need --module orders_search")
+    if (args.fields or args.drop_fields) and (args.store or args.hydrate or args.events):
+        p.error("--fields/--drop-fields cannot be combined with --store/--hydrate/--events (they need whole orders)")
+    return args
 
-    return p.parse_args()
+def _csv(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+def search_kwargs(args):
+    """Server-side filters and field projection for orders_search fetch calls (empty when none are set)."""
+    filters = {"order_status": _csv(args.status), "update_time_ge": args.updated_ge, "update_time_lt": args.updated_lt}
+    kw = {"filters": {k: v for k, v in filters.items() if v is not None}, "fields": _csv(args.fields),
+          "drop": _csv(args.drop_fields)}
+    return {k: v for k, v in kw.items() if v}
 
 def compute_range(args):
     now_vn = datetime.now(VN_TZ)
@@ -47,45 +111,264 @@ def compute_range(args):
         return int(args.ge), int(args.lt), now_vn
     return int(start.timestamp()), int(end.timestamp()), now_vn
 
+def fetch_orders(mod, args, ge, lt, client=None):
+    if args.workers > 1:
+        if not hasattr(mod, "fetch_orders_by_created_parallel"):
+            raise SystemExit(f"--workers > 1 is not supported by --module {args.module} (use orders_search).")
+        return mod.fetch_orders_by_created_parallel(ge, lt, page_size=args.page_size, max_workers=args.workers,
+                                                    client=client, **search_kwargs(args))
+    return mod.fetch_orders_by_created(ge, lt, page_size=args.page_size, client=client, **search_kwargs(args))
+
+def iter_pages(mod, args, ge, lt, client=None):
+    """Pages of orders as they arrive when the module can stream; otherwise the whole result as one page."""
+    if args.workers <= 1 and hasattr(mod, "iter_order_pages"):
+        return mod.iter_order_pages(ge, lt, page_size=args.page_size, client=client, **search_kwargs(args))
+    return [fetch_orders(mod, args, ge, lt, client=client)]
+
+def build_client(args):
+    """
+    Explicit TTSClient for the single shop given on the command line. It is also installed as the
+    tts_client default so module-level helpers use it; .env only fills in what the flags leave unset.
+    """
+    import tts_client
+    tts_client.load_env()
+    client = tts_client.TTSClient(
+        app_key=args.app_key,
+        app_secret=args.app_secret,
+        shop_cipher=None if args.shop_id else args.shop_cipher,
+        shop_id=args.shop_id,
+        base=args.base,
+        state_file=args.token_state,
+        access_token=args.access_token or os.getenv("TTS_ACCESS_TOKEN"),
+        refresh_token=args.refresh_token or os.getenv("TTS_REFRESH_TOKEN"),
+        refresh_url=args.refresh_url or os.getenv("TTS_REFRESH_URL"),
+    )
+    tts_client.set_default_client(client)
+    return client
+
+def default_filename(args, prefix):
+    return f"{prefix}.{args.format}" + (".gz" if args.gzip else "")
+
+def load_manifest(path):
+    """
+    Manifest: a JSON list (or {"shops": [...]}) of objects with shop_cipher or shop_id and optionally
+    name, token_state, access_token, refresh_token, app_key, app_secret, base, refresh_url, out.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    shops = data.get("shops") if isinstance(data, dict) else data
+    if not isinstance(shops, list) or not shops:
+        raise SystemExit(f"Manifest {path} has no shops.")
+    for i, shop in enumerate(shops):
+        if not (shop.get("shop_cipher") or shop.get("shop_id")):
+            raise SystemExit(f"Manifest entry #{i} needs shop_cipher or shop_id.")
+        shop.setdefault("name", shop.get("shop_cipher") or shop.get("shop_id"))
+    names = [s["name"] for s in shops]
+    if len(set(names)) != len(names):
+        raise SystemExit("Manifest shop names must be unique (they name token-state and result files).")
+    return shops
+
+def open_store(args):
+    if not args.store:
+        return None
+    from order_store import OrderStore
+    return OrderStore(args.store)
+
+class StoreSink:
+    """--store: upserts each batch of orders into the local SQLite store."""
+    stage = "store"
+
+    def __init__(self, store, path, shop):
+        self.store, self.path, self.shop = store, path, shop
+        self.created = self.updated = 0
+
+    def __call__(self, orders):
+        created, updated = self.store.upsert_orders(orders, shop=self.shop)
+        self.created += created
+        self.updated += updated
+
+    def close(self, ok=True):
+        print(f"✔ Store {self.path}: {self.created} new, {self.updated} updated", file=sys.stderr)
+
+class HydrateSink:
+    """--hydrate: hydrates each batch of orders (orders_hydrate.Hydrator) and appends the records as JSON Lines."""
+    stage = "hydrate"
+
+    def __init__(self, args, client=None):
+        from orders_hydrate import Hydrator, DetailCache
+        self.cache = DetailCache(args.hydrate_cache or None)
+        self.hydrator = Hydrator(client, self.cache, max_workers=args.hydrate_workers)
+        self.path = args.hydrate
+        self.f = open_text(args.hydrate, args.hydrate.endswith(".gz"))
+        self.count = 0
+
+    def __call__(self, orders):
+        self.count += write_jsonl(self.hydrator.hydrate(orders), self.f)
+        self.f.flush()
+
+    def close(self, ok=True):
+        self.f.close()
+        self.cache.close()
+        print(f"✔ Hydrated {self.count} orders to {self.path} "
+              f"(cache hits {self.cache.hits}, misses {self.cache.misses})", file=sys.stderr)
+
+class EventSink:
+    """--events: change events (orders_diff.Differ) for each batch, against the store or a previous snapshot."""
+    stage = "events"
+
+    def __init__(self, args, store, ge, lt, shop):
+        from orders_diff import Differ
+        if store is not None:
+            self.differ = Differ.from_store(store, (ge, lt), shop=shop)
+        else:
+            from orders_export import load_orders
+            self.differ = Differ.from_orders(load_orders(args.prev), (ge, lt))
+        self.path = args.events
+        self.f = open_text(args.events, args.events.endswith(".gz"))
+
+    def __call__(self, orders):
+        write_jsonl(self.differ.feed(orders), self.f)
+        self.f.flush()
+
+    def close(self, ok=True):
+        # "disappeared" only makes sense once the whole range was pulled
+        if ok:
+            write_jsonl(self.differ.finish(), self.f)
+        self.f.close()
+        s = self.differ.stats
+        print(f"✔ Events to {self.path}: {s['created']} created, {s['updated']} updated, "
+              f"{s['disappeared']} disappeared", file=sys.stderr)
+
+def run_batch(args, ge, lt, now_vn):
+    """Fetch every shop in the manifest concurrently, each with its own isolated TTSClient."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from tts_client import TTSClient, load_env
+    load_env()
+    shops = load_manifest(args.manifest)
+    store = open_store(args)
+    mod = import_module(args.module)
+    limiter = threading.BoundedSemaphore(args.max_inflight) if args.max_inflight > 0 else None
+    stamp = now_vn.strftime("%Y%m%d_%H%M%S")
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    def run_one(shop):
+        name = shop["name"]
+        client = TTSClient(
+            app_key=shop.get("app_key") or args.app_key,
+            app_secret=shop.get("app_secret") or args.app_secret,
+            shop_cipher=shop.get("shop_cipher"),
+            shop_id=None if shop.get("shop_cipher") else shop.get("shop_id"),
+            base=shop.get("base") or args.base,
+            state_file=shop.get("token_state") or f"token_state_{name}.json",
+            access_token=shop.get("access_token"),
+            refresh_token=shop.get("refresh_token"),
+            refresh_url=shop.get("refresh_url") or args.refresh_url,
+            limiter=limiter,
+        )
+        filename = os.path.join(args.out_dir, shop.get("out") or default_filename(args, f"orders_{name}_{stamp}"))
+        if args.format == "jsonl":
+            on_page = (lambda page: store.upsert_orders(page, shop=name)) if store is not None else None
+            return write_pages_jsonl(iter_pages(mod, args, ge, lt, client), filename, args.gzip, on_page), filename
+        orders = fetch_orders(mod, args, ge, lt, client=client)
+        if store is not None:
+            store.upsert_orders(orders, shop=name)
+        write_json(orders, filename, args.gzip)
+        return len(orders), filename
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.max_shops)) as pool:
+        futures = {pool.submit(run_one, shop): shop["name"] for shop in shops}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                n, filename = fut.result()
+                print(f"✔ [{name}] Saved {n} orders to {filename}")
+            except Exception as e:
+                failed += 1
+                print(f"✖ [{name}] {e}")
+    print(f"✅ Batch done: {len(shops) - failed}/{len(shops)} shops succeeded.")
+    if failed:
+        raise SystemExit(1)
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        return import_module(SUBCOMMANDS[sys.argv[1]]).main(sys.argv[2:])
     args = parse_args()
+    tts_metrics.configure(args.metrics)
+    if args.profile:
+        tts_metrics.enable()
+    t0 = time.perf_counter()
+    try:
+        run(args)
+    finally:
+        tts_metrics.flush()
+        if args.profile:
+            print("\n⏱ Profile (stage times are summed across threads):", file=sys.stderr)
+            print(tts_metrics.profile_report(time.perf_counter() - t0), file=sys.stderr)
 
-    # Set process env so existing code reads it without modifications
-    os.environ["TTS_APP_KEY"] = args.app_key
-    os.environ["TTS_APP_SECRET"] = args.app_secret
-    os.environ["TTS_BASE"] = args.base
-    os.environ["TTS_TOKEN_STATE"] = args.token_state
-    if args.shop_id:
-        os.environ["TTS_SHOP_ID"] = args.shop_id
-        os.environ.pop("TTS_SHOP_CIPHER", None)
-    else:
-        os.environ["TTS_SHOP_CIPHER"] = args.shop_cipher
-        os.environ.pop("TTS_SHOP_ID", None)
-    if args.access_token:
-        os.environ["TTS_ACCESS_TOKEN"] = args.access_token
-    if args.refresh_token:
-        os.environ["TTS_REFRESH_TOKEN"] = args.refresh_token
-
-    # Import after env is set
+def run(args):
+    if args.prefetch is not None:
+        import orders_search
+        orders_search.PREFETCH = max(0, args.prefetch)
+    if args.manifest:
+        ge, lt, now_vn = compute_range(args)
+        run_batch(args, ge, lt, now_vn)
+        return
+
+    client = build_client(args)
     mod = import_module(args.module)
     ge, lt, now_vn = compute_range(args)
-    orders = mod.fetch_orders_by_created(ge, lt, page_size=args.page_size)
+    stamp = now_vn.strftime("%Y%m%d_%H%M%S")
+    store = open_store(args)
+    shop = args.shop_cipher or args.shop_id
+    # Events are diffed before the store upsert; hydration runs after it
+    sinks = []
+    if args.events:
+        sinks.append(EventSink(args, store, ge, lt, shop))
+    if store is not None:
+        sinks.append(StoreSink(store, args.store, shop))
+    if args.hydrate:
+        sinks.append(HydrateSink(args, client))
+    ok = False
+    try:
+        run_single(mod, args, ge, lt, stamp, sinks, client)
+        ok = True
+    finally:
+        for sink in sinks:
+            sink.close(ok)
+
+def run_single(mod, args, ge, lt, stamp, sinks, client=None):
+    def on_batch(orders):
+        for sink in sinks:
+            with tts_metrics.span(sink.stage):
+                sink(orders)
+
+    if args.format == "jsonl":
+        # Streaming: each page is written (and diffed / stored / hydrated) as soon as it arrives
+        target = args.out or ("-" if args.mode == "today" else default_filename(args, f"orders_{stamp}"))
+        n = write_pages_jsonl(iter_pages(mod, args, ge, lt, client), target, args.gzip and target != "-",
+                              on_batch if sinks else None)
+        if target == "-":
+            print(f"✅ {n} orders streamed to stdout.", file=sys.stderr)
+        else:
+            print(f"✅ Streamed {n} orders to {target}")
+        return
+
+    orders = fetch_orders(mod, args, ge, lt, client=client)
+    on_batch(orders)
 
     # Output
     if args.out:
-        with open(args.out, "w", encoding="utf-8") as f:
-            json.dump(orders, f, ensure_ascii=False, indent=2)
+        write_json(orders, args.out, args.gzip)
         print(f"✔ Wrote {len(orders)} orders to {args.out}")
     else:
         # default: print pretty JSON for --mode=today if --out not provided
-        stamp = now_vn.strftime("%Y%m%d_%H%M%S")
         if args.mode == "today":
-            print(json.dumps(orders, ensure_ascii=False, indent=2))
+            write_json(orders, "-")
             print(f"\n✅ {len(orders)} orders created today (VN time).")
         else:
-            filename = f"orders_{stamp}.json"
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(orders, f, ensure_ascii=False, indent=2)
+            filename = default_filename(args, f"orders_{stamp}")
+            write_json(orders, filename, args.gzip)
             print(f"✅ Saved {len(orders)} orders to {filename}")
 
 if __name__ == "__main__":
@@ -103,4 +386,50 @@ if __name__ == "__main__":
 #   --access-token ROW_... --mode 7days --page-size 100
 #
 # 3) Custom range by epoch seconds:
-
+#
+# 4) Last 7 days, 8 concurrent time sub-windows:
+# python run_orders_cli.py --app-key AK --app-secret SECRET --shop-cipher ROW_xxx \
+#   --refresh-token ROW_... --mode 7days --workers 8
+#
+# 5) Batch: many shops in one process (per-shop token state + result file):
+# python run_orders_cli.py --app-key AK --app-secret SECRET --manifest shops.json --mode 7days \
+#   --max-shops 8 --max-inflight 16 --out-dir out/
+#   shops.json: [{"name": "shopA", "shop_cipher": "ROW_a", "refresh_token": "ROW_...", "token_state": "state/shopA.json"},
+#                {"name": "shopB", "shop_id": "7494...", "refresh_token": "ROW_..."}]
+#
+# 6) Large range streamed as gzip'd JSON Lines (flat memory; one order per line):
+# python run_orders_cli.py --app-key AK --app-secret SECRET --shop-cipher ROW_xxx \
+#   --refresh-token ROW_... --mode range --ge 1754000000 --lt 1757000000 --format jsonl --gzip
+#
+# 7) Last 7 days plus order detail / packages / tracking for reconciliation (cached by id + update_time):
+# python run_orders_cli.py --app-key AK --app-secret SECRET --shop-cipher ROW_xxx \
+#   --refresh-token ROW_... --mode 7days --out orders_7d.json --hydrate orders_7d_detail.jsonl.gz
+#
+# 8) Only what changed since the last run (e.g. orders that became CANCELLED), diffed against the store:
+# python run_orders_cli.py --app-key AK --app-secret SECRET --shop-cipher ROW_xxx \
+#   --refresh-token ROW_... --mode 7days --store orders.db --events changes.jsonl
+#
+# 9) Stay resident: incremental sync of every manifest shop every ~2 minutes (±10% jitter), Ctrl+C to stop:
+# python run_orders_cli.py serve --app-key AK --app-secret SECRET --manifest shops.json \
+#   --interval 120 --store orders.db --no-dataset
+#
+# 10) Sales KPIs from the local store (no API calls): revenue / discounts / cancel rate per SKU for September:
+# python run_orders_cli.py report --db orders.db --by sku --from 2025-09-01 --to 2025-09-30 --sort revenue
+#
+# 11) Where did the time go? Per-stage breakdown on stderr + Prometheus text file (node_exporter textfile collector):
+# python run_orders_cli.py --app-key AK --app-secret SECRET --shop-cipher ROW_... --refresh-token ROW_... \
+#   --mode 7days --profile --metrics prom:/var/lib/node_exporter/textfile/tts.prom
+#
+# 12) Months of history, one VN day per partition, resumable (re-run the same command after a crash / Ctrl+C):
+# python run_orders_cli.py backfill --app-key AK --app-secret SECRET --shop-cipher ROW_... --refresh-token ROW_... \
+#   --from 2025-01-01 --to 2025-06-30 --out-dir backfill/ --workers 4 --store orders.db
+#
+# 13) Cancellation monitor: only CANCELLED orders updated in the last hour, without images / address / packages:
+# python run_orders_cli.py --app-key AK --app-secret SECRET --shop-cipher ROW_... --refresh-token ROW_... \
+#   --mode 7days --status CANCELLED --updated-ge $(( $(date +%s) - 3600 )) \
+#   --drop-fields sku_image,recipient_address,packages --format jsonl --out cancelled.jsonl
+#
+# 14) Internal read API over the store (one upstream pull per minute, however many consumers), ETag + gzip:
+# python run_orders_cli.py api --app-key AK --app-secret SECRET --shop-cipher ROW_... --refresh-token ROW_... \
+#   --store orders.db --port 9200 --refresh 60
+# curl -s --compressed 'http://127.0.0.1:9200/orders?date=today&status=AWAITING_SHIPMENT&page_size=100'
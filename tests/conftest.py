@@ -0,0 +1,36 @@
+# conftest.py — fixture dùng chung: mock_tts_server chạy trong thread + TTSClient trỏ vào nó
+import os, sys, threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_tts_server
+from tts_client import TTSClient
+
+APP_KEY, APP_SECRET = "test_app", "test_secret"
+START = 1756000000  # 2025-08-24 08:46 giờ VN
+DAYS = 3
+
+
+@pytest.fixture(scope="session")
+def mock_orders():
+    return mock_tts_server.generate_orders(600, START, START + DAYS * 86400, seed=7)
+
+
+@pytest.fixture(scope="session")
+def mock_base(mock_orders):
+    """URL gốc của mock (kiểm chữ ký với APP_SECRET → mọi test đi qua mock cũng kiểm luôn bộ ký)."""
+    srv = mock_tts_server.serve("127.0.0.1", 0, orders=mock_orders, app_secret=APP_SECRET, seed=7)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client(mock_base, tmp_path):
+    return TTSClient(APP_KEY, APP_SECRET, shop_cipher="TEST_SHOP", base=mock_base,
+                     refresh_url=f"{mock_base}/api/v2/token/refresh",
+                     state_file=str(tmp_path / "token_state.json"), access_token="", refresh_token="R",
+                     app_rate=0, shop_rate=0)
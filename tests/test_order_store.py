@@ -0,0 +1,95 @@
+# OrderStore: upsert bỏ qua bản không mới hơn; dòng hàng trùng id giữa 2 đơn không đè nhau
+import sqlite3
+import pytest
+import order_store
+from order_store import OrderStore
+
+
+def _order(oid, update_time, status="AWAITING_SHIPMENT", item_ids=("LI-1",)):
+    return {"id": oid, "status": status, "create_time": 1756000000, "update_time": update_time,
+            "line_items": [{"id": i, "seller_sku": "SKU-1", "sale_price": "1000"} for i in item_ids],
+            "packages": [{"id": f"PKG-{oid}"}],
+            "payment": {"currency": "VND", "total_amount": "1000"}}
+
+
+def test_upsert_skips_older_and_equal_update_time(tmp_path):
+    with OrderStore(str(tmp_path / "o.db")) as store:
+        assert store.upsert_orders([_order("A", 200)]) == (1, 0)
+        assert store.upsert_orders([_order("A", 100, status="CANCELLED")]) == (0, 0)
+        assert store.upsert_orders([_order("A", 200, status="CANCELLED")]) == (0, 0)
+        assert store.get("A")["status"] == "AWAITING_SHIPMENT"
+        assert store.upsert_orders([_order("A", 300, status="CANCELLED")]) == (0, 1)
+        assert store.get("A")["status"] == "CANCELLED"
+
+
+def test_upsert_same_batch_keeps_newest(tmp_path):
+    with OrderStore(str(tmp_path / "o.db")) as store:
+        store.upsert_orders([_order("A", 300, "COMPLETED"), _order("A", 100, "UNPAID")])
+        assert store.get("A")["status"] == "COMPLETED"
+
+
+def _line_item_owners(store, item_id):
+    return sorted(r[0] for r in store.conn.execute("SELECT order_id FROM line_items WHERE id = ?", (item_id,)))
+
+
+def test_line_item_id_shared_by_two_orders(tmp_path):
+    with OrderStore(str(tmp_path / "o.db")) as store:
+        store.upsert_orders([_order("A", 1, item_ids=("LI-1", "LI-2")), _order("B", 1, item_ids=("LI-1",))])
+        assert _line_item_owners(store, "LI-1") == ["A", "B"]
+        # cập nhật B không được làm mất dòng của A
+        store.upsert_orders([_order("B", 2, item_ids=("LI-1",))])
+        assert _line_item_owners(store, "LI-1") == ["A", "B"]
+        assert _line_item_owners(store, "LI-2") == ["A"]
+
+
+def _old_store(path, rows, orders=("A",)):
+    """Kho tạo bằng schema cũ: line_items khoá chính chỉ theo id."""
+    old_schema = order_store._SCHEMA.replace("id                TEXT NOT NULL,", "id                TEXT PRIMARY KEY,") \
+        .replace(",\n    PRIMARY KEY (order_id, id)", "")
+    assert old_schema != order_store._SCHEMA
+    conn = sqlite3.connect(path)
+    conn.executescript(old_schema)
+    for oid in orders:
+        conn.execute("INSERT INTO orders (id, create_time, update_time, raw) VALUES (?, 1, 1, '{}')", (oid,))
+    conn.executemany("INSERT INTO line_items (id, order_id, seller_sku) VALUES (?, ?, 'SKU-1')", rows)
+    conn.commit()
+    return conn
+
+
+def _tables(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_migrates_line_items_keyed_by_id(tmp_path):
+    path = str(tmp_path / "old.db")
+    _old_store(path, [("LI-1", "A")]).close()
+    with OrderStore(path) as store:
+        assert _line_item_owners(store, "LI-1") == ["A"]
+        assert "line_items_old" not in _tables(store.conn)
+        store.upsert_orders([_order("B", 1, item_ids=("LI-1",))])
+        assert _line_item_owners(store, "LI-1") == ["A", "B"]
+
+
+def test_failed_migration_leaves_old_table_intact(tmp_path):
+    path = str(tmp_path / "old.db")
+    # dòng mồ côi (đơn không tồn tại) → INSERT vào bảng mới vi phạm khoá ngoại giữa lượt đổi
+    _old_store(path, [("LI-1", "A"), ("LI-2", "GONE")]).close()
+    with pytest.raises(sqlite3.IntegrityError):
+        OrderStore(path)
+    conn = sqlite3.connect(path)
+    assert "line_items_old" not in _tables(conn)
+    assert sorted(conn.execute("SELECT id FROM line_items")) == [("LI-1",), ("LI-2",)]
+    assert [r[1] for r in conn.execute("PRAGMA table_info(line_items)") if r[5]] == ["id"]
+    conn.close()
+
+
+def test_resumes_migration_left_half_done(tmp_path):
+    # crash của bản đổi cũ sau RENAME + tạo bảng mới: dữ liệu nằm trong line_items_old, line_items mới rỗng
+    path = str(tmp_path / "old.db")
+    conn = _old_store(path, [("LI-1", "A")])
+    conn.execute("ALTER TABLE line_items RENAME TO line_items_old")
+    conn.executescript(order_store._SCHEMA)
+    conn.close()
+    with OrderStore(path) as store:
+        assert _line_item_owners(store, "LI-1") == ["A"]
+        assert "line_items_old" not in _tables(store.conn)
@@ -0,0 +1,74 @@
+# API đọc nội bộ: phân trang page_token đi hết kho không sót / trùng, ETag → 304, kho đổi → ETag đổi
+import json, threading
+import urllib.request, urllib.error
+import pytest
+from order_store import OrderStore
+from orders_api import OrdersAPIServer, encode_page_token, decode_page_token
+
+
+@pytest.fixture
+def api(mock_orders, tmp_path):
+    store = OrderStore(str(tmp_path / "o.db"))
+    store.upsert_orders(mock_orders[:230])
+    srv = OrdersAPIServer(("127.0.0.1", 0), store, page_size=50)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv, f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+    store.close()
+
+
+def _get(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req) as r:
+            return r.status, dict(r.headers), r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def test_page_token_round_trip():
+    tok = encode_page_token(1756000000, "576461413")
+    assert "=" not in tok
+    assert decode_page_token(tok) == (1756000000, "576461413")
+    with pytest.raises(ValueError):
+        decode_page_token("not-a-token")
+
+
+def test_paginate_all_orders(api, mock_orders):
+    _, base = api
+    ids, token, pages = [], "", 0
+    while True:
+        status, _, body = _get(f"{base}/orders?page_size=40" + (f"&page_token={token}" if token else ""))
+        assert status == 200
+        data = json.loads(body)["data"]
+        assert data["total_count"] == 230
+        ids += [o["id"] for o in data["orders"]]
+        pages += 1
+        token = data["next_page_token"]
+        if not token:
+            break
+    assert pages == 6
+    assert len(ids) == len(set(ids)) == 230
+    assert set(ids) == {o["id"] for o in mock_orders[:230]}
+
+
+def test_etag_not_modified(api, mock_orders):
+    srv, base = api
+    status, headers, _ = _get(f"{base}/orders?page_size=10")
+    etag = headers["ETag"]
+    status, headers, body = _get(f"{base}/orders?page_size=10", {"If-None-Match": etag})
+    assert status == 304 and body == b"" and headers["ETag"] == etag
+    assert srv.snapshot()["not_modified"] == 1
+
+    # kho có đơn mới hơn → trang đầu đổi → ETag cũ không còn khớp
+    newest = dict(max(mock_orders[:230], key=lambda o: o["create_time"]), id="NEW", update_time=2000000000)
+    srv.store.upsert_orders([newest])
+    status, headers, _ = _get(f"{base}/orders?page_size=10", {"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+
+
+def test_bad_page_token_is_400(api):
+    _, base = api
+    status, _, body = _get(f"{base}/orders?page_token=%25%25")
+    assert status == 400 and "page_token" in json.loads(body)["message"]
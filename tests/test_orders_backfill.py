@@ -0,0 +1,62 @@
+# Backfill dừng giữa ngày rồi chạy lại: phần .partial ghi dở sau checkpoint bị cắt, không mất / trùng đơn
+import os, json, gzip
+import pytest
+from orders_backfill import Backfill, Checkpoint, Stopped, day_chunks
+
+DAY = "2025-08-25"
+
+
+def test_resume_after_truncated_partial(client, mock_orders, tmp_path):
+    day, ge, lt = day_chunks(DAY, DAY)[0]
+    out_dir, ckpt_path = str(tmp_path / "backfill"), str(tmp_path / "ckpt.json")
+
+    first = Backfill(client, out_dir, Checkpoint(ckpt_path, "TEST_SHOP"), page_size=20, gz=False)
+    first.stopping.set()  # dừng ngay sau trang đầu (đã checkpoint)
+    with pytest.raises(Stopped):
+        first._fetch_day(day, ge, lt)
+    st = Checkpoint(ckpt_path, "TEST_SHOP").get(day)
+    assert st["page_token"] and st["orders"] == 20 and not st.get("done")
+
+    # crash giữa lúc ghi trang kế: file dài hơn offset đã checkpoint, dòng cuối bị cụt
+    part = os.path.join(out_dir, f"create_date={day}", "orders.jsonl.partial")
+    with open(part, "ab") as f:
+        f.write(b'{"id": "torn')
+
+    second = Backfill(client, out_dir, Checkpoint(ckpt_path, "TEST_SHOP"), page_size=20, gz=False)
+    n = second.run_day(day, ge, lt)
+
+    with open(second.final_path(day), "r", encoding="utf-8") as f:
+        ids = [json.loads(line)["id"] for line in f]
+    expected = {o["id"] for o in mock_orders if ge <= o["create_time"] < lt}
+    assert n == len(ids) == len(expected)
+    assert set(ids) == expected
+    assert not os.path.exists(part)
+    assert Checkpoint(ckpt_path, "TEST_SHOP").get(day)["done"]
+
+
+def test_done_day_is_skipped(client, tmp_path):
+    day, ge, lt = day_chunks(DAY, DAY)[0]
+    ckpt = Checkpoint(str(tmp_path / "ckpt.json"), "TEST_SHOP")
+    ckpt.set(day, {"done": True, "orders": 7, "file": "x"})
+    assert Backfill(client, str(tmp_path / "out"), ckpt).run_day(day, ge, lt) == 7
+    assert not os.path.exists(str(tmp_path / "out"))
+
+
+def test_shared_checkpoint_keeps_other_process_progress(tmp_path):
+    path = str(tmp_path / "ckpt.json")
+    a, b = Checkpoint(path, "TEST_SHOP"), Checkpoint(path, "TEST_SHOP")  # 2 process cùng mở
+    a.set("2025-08-25", {"done": True, "orders": 1, "file": "x"})
+    b.set("2025-08-26", {"page_token": "t", "offset": 10, "orders": 2, "complete": False})
+    days = Checkpoint(path, "TEST_SHOP").data["days"]
+    assert set(days) == {"2025-08-25", "2025-08-26"}
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+
+def test_gzip_finish_without_leftover_temp(client, mock_orders, tmp_path):
+    day, ge, lt = day_chunks(DAY, DAY)[0]
+    bf = Backfill(client, str(tmp_path / "out"), Checkpoint(str(tmp_path / "ckpt.json"), "TEST_SHOP"),
+                  page_size=50, gz=True)
+    n = bf.run_day(day, ge, lt)
+    with gzip.open(bf.final_path(day), "rt", encoding="utf-8") as f:
+        assert len([json.loads(line) for line in f]) == n
+    assert os.listdir(os.path.dirname(bf.final_path(day))) == ["orders.jsonl.gz"]
@@ -0,0 +1,70 @@
+# orders_diff: sự kiện created / updated (delta theo field) / disappeared, so với snapshot hoặc kho SQLite
+import copy
+from orders_diff import Differ, diff, field_delta
+from order_store import OrderStore
+
+
+def _order(oid, ct, ut, status="AWAITING_SHIPMENT", total="1000"):
+    return {"id": oid, "status": status, "create_time": ct, "update_time": ut,
+            "line_items": [{"id": f"{oid}-1", "seller_sku": "SKU-1", "display_status": status}],
+            "payment": {"currency": "VND", "total_amount": total}}
+
+
+def _by_event(events):
+    return {(e["event"], e["id"]) for e in events}
+
+
+def test_field_delta_paths():
+    old = _order("A", 10, 20)
+    new = copy.deepcopy(old)
+    new["status"] = new["line_items"][0]["display_status"] = "CANCELLED"
+    new["payment"]["total_amount"] = "900"
+    new["cancel_reason"] = "buyer"
+    assert field_delta(old, new) == {
+        "status": ["AWAITING_SHIPMENT", "CANCELLED"],
+        "line_items[A-1].display_status": ["AWAITING_SHIPMENT", "CANCELLED"],
+        "payment.total_amount": ["1000", "900"],
+        "cancel_reason": [None, "buyer"],
+    }
+    assert field_delta(old, copy.deepcopy(old)) == {}
+
+
+def test_snapshot_diff_events():
+    prev = [_order("A", 10, 20), _order("B", 11, 20), _order("C", 12, 20), _order("OUT", 99, 20)]
+    new = [{**_order("A", 10, 30), "status": "CANCELLED"}, _order("B", 11, 20), _order("D", 13, 40)]
+    events = diff(prev, new, scope=(0, 50))
+    assert _by_event(events) == {("updated", "A"), ("created", "D"), ("disappeared", "C")}
+    upd = next(e for e in events if e["event"] == "updated")
+    assert upd["prev_update_time"] == 20 and upd["delta"]["status"] == ["AWAITING_SHIPMENT", "CANCELLED"]
+    assert next(e for e in events if e["event"] == "created")["order"]["id"] == "D"
+
+
+def test_same_content_or_older_copy_is_unchanged():
+    d = Differ.from_orders([_order("A", 10, 20)])
+    # key khác thứ tự vẫn cùng hash; bản cũ hơn bản đã có thì bỏ qua
+    reordered = dict(reversed(list(_order("A", 10, 20).items())))
+    assert d.feed([reordered]) == []
+    d2 = Differ.from_orders([_order("A", 10, 20)])
+    assert d2.feed([_order("A", 10, 5, status="UNPAID")]) == []
+    assert d.stats["unchanged"] == d2.stats["unchanged"] == 1
+
+
+def test_feed_by_pages_dedups_and_finish_once():
+    d = Differ.from_orders([_order("A", 10, 20), _order("B", 11, 20)], scope=(0, 50))
+    first = d.feed([_order("A", 10, 30, status="CANCELLED")])
+    again = d.feed([_order("A", 10, 30, status="CANCELLED"), _order("E", 14, 1)])
+    assert _by_event(first) == {("updated", "A")} and _by_event(again) == {("created", "E")}
+    assert _by_event(d.finish()) == {("disappeared", "B")}
+
+
+def test_store_diff_reads_only_changed_orders(tmp_path):
+    with OrderStore(str(tmp_path / "o.db")) as store:
+        store.upsert_orders([_order("A", 10, 20), _order("B", 11, 20), _order("C", 12, 20)])
+        loaded = []
+        d = Differ.from_store(store, scope=(0, 50))
+        get_many = d.load_old
+        d.load_old = lambda ids: loaded.extend(ids) or get_many(ids)
+        events = d.feed([_order("A", 10, 30, total="900"), _order("B", 11, 20)]) + d.finish()
+        assert loaded == ["A"]  # B cùng update_time: không đọc JSON cũ
+        assert _by_event(events) == {("updated", "A"), ("disappeared", "C")}
+        assert events[0]["delta"] == {"payment.total_amount": ["1000", "900"], "update_time": [20, 30]}
@@ -0,0 +1,53 @@
+# orders_model: to_models → to_json ra lại đúng JSON API (key, thứ tự, kiểu); tiền int theo đơn vị nhỏ nhất
+import copy
+import pytest
+import tts_json
+from conftest import START
+from orders_model import Order, to_models, to_json
+from orders_search import fetch_orders_by_created
+from tts_money import money_to_minor, money_text
+
+
+def test_mock_orders_round_trip(mock_orders):
+    original = copy.deepcopy(mock_orders)
+    models = to_models(mock_orders)
+    back = to_json(models)
+    assert back == original
+    assert [list(o) for o in back] == [list(o) for o in original]  # cùng thứ tự key
+    assert tts_json.dumps(back) == tts_json.dumps(original)
+
+
+def test_money_and_extra_fields():
+    raw = {"id": "1", "status": "COMPLETED", "buyer_email": "a@b.c", "unknown_field": {"x": [1, 2]},
+           "payment": {"currency": "USD", "total_amount": "12.34", "sub_total": "12.5", "tax": "abc"},
+           "line_items": [{"id": "L1", "currency": "USD", "sale_price": "0.99", "is_gift": False}]}
+    o = Order.from_json(raw)
+    assert o.payment.total_amount == 1234
+    assert o.payment.sub_total == "12.5" and o.payment.tax == "abc"  # không ở dạng chuẩn → giữ chuỗi gốc
+    assert o.line_items[0].sale_price == 99 and o.currency == "USD"
+    assert o.buyer_email == "a@b.c" and o.get("unknown_field") == {"x": [1, 2]}
+    assert o.get("paid_time", "-") == "-"  # key không có ở bản gốc
+    with pytest.raises(AttributeError):
+        o.no_such_field
+    assert o.to_json() == raw and "paid_time" not in o.to_json()
+
+
+@pytest.mark.parametrize("text,currency,minor", [("219000", "VND", 219000), ("12.34", "USD", 1234),
+                                                 ("-0.05", "THB", -5), ("7.00", None, 700)])
+def test_money_round_trip(text, currency, minor):
+    assert money_to_minor(text, currency) == minor
+    assert money_text(minor, currency) == text
+
+
+def test_money_rejects_sub_minor_units():
+    with pytest.raises(ValueError):
+        money_to_minor("1.5", "VND")
+    assert money_to_minor("", "VND") is None
+
+
+def test_fetch_as_model_matches_dicts(client):
+    ge, lt = START, START + 86400
+    dicts = fetch_orders_by_created(ge, lt, page_size=50, client=client)
+    models = fetch_orders_by_created(ge, lt, page_size=50, client=client, as_model=True)
+    assert all(isinstance(o, Order) for o in models)
+    assert to_json(models) == dicts
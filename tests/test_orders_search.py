@@ -0,0 +1,195 @@
+# orders_search: lấy song song ra đúng như tuần tự; các trang stream (JSONL) bỏ đơn trùng giống bản gom cả list;
+# prefetch giữ thứ tự trang, báo lỗi đúng trang để chạy tiếp; bộ lọc đẩy lên server, projection field theo trang
+import time, threading
+import pytest
+from conftest import START
+from orders_output import read_jsonl, write_pages_jsonl
+from orders_search import (PaginationInterrupted, fetch_orders_by_created, fetch_orders_by_created_parallel,
+                           iter_order_pages, iter_search_pages, search_body)
+
+
+@pytest.mark.parametrize("workers,dense_pages", [(4, 2), (2, 4), (8, 1)])
+def test_parallel_equals_serial(client, mock_orders, workers, dense_pages):
+    ge, lt = START + 3600, START + 2 * 86400
+    serial = fetch_orders_by_created(ge, lt, page_size=20, client=client)
+    parallel = fetch_orders_by_created_parallel(ge, lt, page_size=20, max_workers=workers,
+                                                dense_pages=dense_pages, min_window=60, client=client)
+    expected = {o["id"] for o in mock_orders if ge <= o["create_time"] < lt}
+    assert {o["id"] for o in serial} == expected
+    assert [o["id"] for o in parallel] == [o["id"] for o in serial]
+
+
+def test_parallel_empty_window(client):
+    assert fetch_orders_by_created_parallel(START, START, client=client) == []
+
+
+class PagedClient:
+    """Client giả trả các trang cố định theo page_token (mô phỏng đơn bị đẩy sang trang sau khi đổi)."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def post_signed_with_shop(self, path, body=None, query_extra=None):
+        i = int((query_extra or {}).get("page_token") or 0)
+        nxt = str(i + 1) if i + 1 < len(self.pages) else ""
+        return {"code": 0, "data": {"orders": self.pages[i], "next_page_token": nxt}}
+
+
+def _o(oid, t):
+    return {"id": oid, "create_time": t, "update_time": t}
+
+
+def test_streamed_pages_skip_ids_repeated_across_pages(tmp_path):
+    # B đổi trong lúc phân trang → API trả B ở cả trang 1 và trang 2
+    client = PagedClient([[_o("A", 500), _o("B", 400)], [_o("B", 400), _o("C", 300)], [_o("A", 500)]])
+    pages = list(iter_order_pages(0, 1000, page_size=2, client=client))
+    assert [[o["id"] for o in p] for p in pages] == [["A", "B"], ["C"], []]
+
+    path = str(tmp_path / "out.jsonl")
+    n = write_pages_jsonl(iter_order_pages(0, 1000, page_size=2, client=client), path)
+    streamed = [o["id"] for o in read_jsonl(path)]
+    assert n == 3 and streamed == [o["id"] for o in fetch_orders_by_created(0, 1000, page_size=2, client=client)]
+
+
+class SlowPagedClient(PagedClient):
+    """PagedClient ghi lại các page_token đã gọi; fail_at: token trả lỗi 1 lần (như client hết lượt retry)."""
+
+    def __init__(self, pages, fail_at=None, delay=0.0):
+        super().__init__(pages)
+        self.calls, self.fail_at, self.delay = [], fail_at, delay
+        self.called = {}
+
+    def post_signed_with_shop(self, path, body=None, query_extra=None):
+        token = (query_extra or {}).get("page_token")
+        self.calls.append(token)
+        self.called.setdefault(token, threading.Event()).set()
+        time.sleep(self.delay)
+        if token is not None and token == self.fail_at:
+            self.fail_at = None
+            raise RuntimeError("HTTP 503 - unavailable")
+        return super().post_signed_with_shop(path, body, query_extra)
+
+    def was_called(self, token, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while token not in self.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return token in self.called
+
+
+def _pages(n, per=2):
+    return [[_o(f"P{i}-{j}", 1000 - i * per - j) for j in range(per)] for i in range(n)]
+
+
+@pytest.mark.parametrize("prefetch", [1, 3])
+def test_prefetch_keeps_page_order(client, prefetch):
+    ge, lt = START, START + 86400
+    serial = list(iter_search_pages(ge, lt, page_size=20, client=client, prefetch=0))
+    ahead = list(iter_search_pages(ge, lt, page_size=20, client=client, prefetch=prefetch))
+    assert [[o["id"] for o in p] for p, _ in ahead] == [[o["id"] for o in p] for p, _ in serial]
+    assert [t for _, t in ahead] == [t for _, t in serial] and ahead[-1][1] in (None, "")
+
+
+def test_prefetch_requests_next_page_while_current_is_processed():
+    fake = SlowPagedClient(_pages(3))
+    pages = iter_search_pages(0, 2000, page_size=2, client=fake, prefetch=1)
+    next(pages)
+    assert fake.was_called("1")  # trang 2 đã được gọi trước khi caller đòi
+    pages.close()
+
+    fake = SlowPagedClient(_pages(3))
+    pages = iter_search_pages(0, 2000, page_size=2, client=fake, prefetch=0)
+    next(pages)
+    assert not fake.was_called("1", timeout=0.1)
+    pages.close()
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_error_surfaces_after_pages_before_it_and_resumes(prefetch):
+    fake = SlowPagedClient(_pages(4), fail_at="2")
+    got = []
+    with pytest.raises(PaginationInterrupted) as exc:
+        for page, _ in iter_search_pages(0, 2000, page_size=2, client=fake, prefetch=prefetch):
+            got.append([o["id"] for o in page])
+    assert got == [["P0-0", "P0-1"], ["P1-0", "P1-1"]]
+    assert exc.value.page_token == "2" and "503" in str(exc.value.cause)
+
+    fake = SlowPagedClient(_pages(4), fail_at="2")
+    with pytest.raises(PaginationInterrupted) as exc:
+        fetch_orders_by_created(0, 2000, page_size=2, client=fake)
+    assert len(exc.value.orders) == 4
+    orders = fetch_orders_by_created(0, 2000, page_size=2, client=fake, resume=exc.value)
+    assert [o["id"] for o in orders] == [o["id"] for p in _pages(4) for o in p]
+
+
+def test_prefetch_stops_when_reader_stops():
+    fake = SlowPagedClient(_pages(30), delay=0.01)
+    for _ in iter_search_pages(0, 2000, page_size=2, client=fake, prefetch=2):
+        break
+    time.sleep(0.3)
+    assert len(fake.calls) <= 5  # trang đầu + tối đa depth trang trong hàng đợi + 1 request đang bay
+
+
+def test_search_body_pushes_filters():
+    body = search_body("create_time", 10, 20, {"order_status": "CANCELLED", "update_time_ge": 15,
+                                              "create_time_ge": 0, "shipping_type": "TIKTOK", "warehouse_ids": None})
+    assert body == {"time_filter": {"create_time_ge": 10, "create_time_lt": 20, "update_time_ge": 15},
+                    "order_status": "CANCELLED", "shipping_type": "TIKTOK"}
+    # API chỉ nhận 1 order_status → nhiều trạng thái thì lọc ở client
+    assert "order_status" not in search_body("create_time", 10, 20, {"order_status": ["UNPAID", "CANCELLED"]})
+    with pytest.raises(RuntimeError, match="Bộ lọc không hỗ trợ"):
+        search_body("create_time", 10, 20, {"buyer_email": "x"})
+
+
+class RecordingClient:
+    """Bọc client thật (mock server), ghi lại body của từng request search."""
+
+    def __init__(self, client):
+        self.client, self.bodies = client, []
+
+    def post_signed_with_shop(self, path, body=None, query_extra=None):
+        self.bodies.append(body)
+        return self.client.post_signed_with_shop(path, body, query_extra)
+
+
+@pytest.mark.parametrize("statuses", ["CANCELLED", ["UNPAID", "CANCELLED"]])
+def test_status_filter_matches_client_side_filter(client, mock_orders, statuses):
+    ge, lt = START, START + 2 * 86400
+    wanted = {statuses} if isinstance(statuses, str) else set(statuses)
+    rec = RecordingClient(client)
+    got = fetch_orders_by_created(ge, lt, page_size=20, client=rec, filters={"order_status": statuses})
+    expected = [o["id"] for o in sorted(mock_orders, key=lambda o: -o["create_time"])
+                if ge <= o["create_time"] < lt and o["status"] in wanted]
+    assert [o["id"] for o in got] == expected
+    if isinstance(statuses, str):
+        assert all(b["order_status"] == "CANCELLED" for b in rec.bodies)
+        assert len(rec.bodies) == -(-len(expected) // 20)  # chỉ kéo các trang của đơn khớp
+    else:
+        assert all("order_status" not in b for b in rec.bodies)
+
+
+def test_update_time_filter(client, mock_orders):
+    ge, lt, ut = START, START + 3 * 86400, START + 86400
+    rec = RecordingClient(client)
+    got = fetch_orders_by_created(ge, lt, page_size=50, client=rec, filters={"update_time_ge": ut})
+    assert {o["id"] for o in got} == {o["id"] for o in mock_orders if o["update_time"] >= ut}
+    assert rec.bodies[0]["time_filter"]["update_time_ge"] == ut
+
+
+def test_fields_and_drop_projection(client):
+    ge, lt = START, START + 86400
+    slim = fetch_orders_by_created(ge, lt, page_size=50, client=client, fields=("id", "status", "create_time"))
+    assert slim and all(set(o) == {"id", "status", "create_time"} for o in slim)
+    dropped = fetch_orders_by_created(ge, lt, page_size=50, client=client,
+                                      drop=("sku_image", "recipient_address", "packages"))
+    assert all("recipient_address" not in o and "packages" not in o for o in dropped)
+    assert all("sku_image" not in li and "sku_id" in li for o in dropped for li in o["line_items"])
+    assert [o["id"] for o in dropped] == [o["id"] for o in slim]
+
+
+def test_parallel_applies_filters_and_projection(client):
+    ge, lt = START, START + 2 * 86400
+    kw = dict(filters={"order_status": "DELIVERED"}, fields=("id", "status", "create_time"))
+    serial = fetch_orders_by_created(ge, lt, page_size=20, client=client, **kw)
+    parallel = fetch_orders_by_created_parallel(ge, lt, page_size=20, max_workers=4, min_window=60,
+                                                client=client, **kw)
+    assert parallel == serial and all(o["status"] == "DELIVERED" for o in serial)
@@ -0,0 +1,82 @@
+# Đồng bộ tăng dần: cursor theo shop + nơi nhận, overlap, upsert theo update_time
+import json, threading
+from conftest import START
+from order_store import OrderStore
+from orders_sync import (LOCK_SUFFIX, load_cursor, load_cursors, save_cursor, shop_key, sink_id,
+                         sync_incremental, upsert)
+from tts_token import file_lock
+
+NOW = START + 5 * 86400
+
+
+def _expected(mock_orders, now=NOW):
+    return {o["id"] for o in mock_orders if o["update_time"] <= now}
+
+
+def test_store_and_dataset_keep_separate_cursors(client, mock_orders, tmp_path):
+    cursor, dataset = str(tmp_path / "cursor.json"), str(tmp_path / "orders.json")
+    with OrderStore(str(tmp_path / "o.db")) as store:
+        # orders_api.py / orders_daemon --no-dataset: chỉ ghi kho, chạy trước
+        res = sync_incremental(None, cursor, window_days=10, page_size=50, client=client, now=NOW, store=store)
+        assert res["cursor"] and store.count() == len(_expected(mock_orders))
+        # orders_search_7days.py --incremental chạy sau với cùng file cursor vẫn nhận đủ đơn
+        sync_incremental(dataset, cursor, window_days=10, page_size=50, client=client, now=NOW)
+    with open(dataset, encoding="utf-8") as f:
+        assert {o["id"] for o in json.load(f)} == _expected(mock_orders)
+    assert len(load_cursors(cursor)) == 2
+
+
+def test_dataset_sink_reads_legacy_shop_cursor(tmp_path):
+    path = str(tmp_path / "cursor.json")
+    save_cursor("SHOP", 1000, path)
+    sink = sink_id("orders_7days.json")
+    assert load_cursor("SHOP", path, sink, legacy=True) == 1000
+    assert load_cursor("SHOP", path, sink) is None
+    save_cursor("SHOP", 2000, path, sink)
+    assert load_cursor("SHOP", path, sink, legacy=True) == 2000
+    assert load_cursor("SHOP", path) == 1000
+
+
+def test_upsert_keeps_newest_version():
+    data = {"A": {"id": "A", "update_time": 10, "status": "UNPAID"}}
+    assert upsert(data, [{"id": "A", "update_time": 5, "status": "CANCELLED"},
+                         {"id": "B", "update_time": 1}]) == (1, 0)
+    assert data["A"]["status"] == "UNPAID"
+    assert upsert(data, [{"id": "A", "update_time": 10, "status": "UNPAID"}]) == (0, 0)
+    assert upsert(data, [{"id": "A", "update_time": 11, "status": "AWAITING_SHIPMENT"}]) == (0, 1)
+    assert data["A"]["status"] == "AWAITING_SHIPMENT"
+
+
+def test_second_run_fetches_from_cursor_minus_overlap(client, mock_orders, tmp_path):
+    cursor, dataset = str(tmp_path / "cursor.json"), str(tmp_path / "orders.json")
+    first_now = START + 2 * 86400
+    first = sync_incremental(dataset, cursor, window_days=10, client=client, now=first_now)
+    mark = max(o["update_time"] for o in mock_orders if o["update_time"] <= first_now)
+    assert first["cursor"] == mark
+
+    second = sync_incremental(dataset, cursor, overlap=600, window_days=10, client=client, now=NOW)
+    assert second["fetched"] == sum(1 for o in mock_orders if mark - 600 <= o["update_time"] <= NOW)
+    with open(dataset, encoding="utf-8") as f:
+        assert {o["id"] for o in json.load(f)} == _expected(mock_orders)
+    assert load_cursor(shop_key(client), cursor, sink_id(dataset)) == max(
+        o["update_time"] for o in mock_orders if o["update_time"] <= NOW)
+
+
+def test_overlapping_runs_do_not_drop_each_others_upserts(client, mock_orders, tmp_path):
+    cursor, dataset = str(tmp_path / "cursor.json"), str(tmp_path / "orders.json")
+    sink, key = sink_id(dataset), shop_key(client)
+    other = {"id": "OTHER", "create_time": NOW, "update_time": NOW + 100}
+    with file_lock(cursor + LOCK_SUFFIX):  # lượt chạy khác đang ghi dataset / cursor
+        t = threading.Thread(target=sync_incremental, args=(dataset, cursor),
+                             kwargs={"window_days": 10, "client": client, "now": NOW})
+        t.start()
+        t.join(2)
+        assert t.is_alive()  # đã lấy xong đơn, đang chờ lock
+        with open(dataset, "w", encoding="utf-8") as f:
+            json.dump([other], f)
+        save_cursor(key, NOW + 100, cursor, sink)
+    t.join(10)
+    with open(dataset, encoding="utf-8") as f:
+        ids = {o["id"] for o in json.load(f)}
+    assert ids == _expected(mock_orders) | {"OTHER"}
+    assert load_cursor(key, cursor, sink) == NOW + 100  # không lùi về mốc của lượt chạy sau
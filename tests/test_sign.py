@@ -0,0 +1,105 @@
+# Chữ ký 202309: Signer (HMAC dựng sẵn) phải ra đúng từng byte như cách ký gốc
+import hmac, json, time, hashlib
+from urllib.parse import parse_qsl, urlsplit
+import pytest
+import tts_client
+from conftest import APP_SECRET
+from tts_sign import Signer, build_signature, build_signature_with_text, signer_for
+
+SEARCH = "/order/202309/orders/search"
+
+
+def baseline_signature(path, query, body, app_secret):
+    """Cách ký gốc (trước khi tối ưu): HMAC-SHA256(app_secret, secret + path + params + body + secret)."""
+    q = dict(query)
+    q.pop("sign", None)
+    param_concat = "".join(f"{k}{q[k]}" for k in sorted(q.keys()))
+    body_part = "" if body is None else json.dumps(body, separators=(",", ":"), ensure_ascii=False)
+    sign_text = f"{app_secret}{path}{param_concat}{body_part}{app_secret}"
+    return hmac.new(app_secret.encode("utf-8"), sign_text.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+CASES = [
+    ("/order/202309/orders/search",
+     {"app_key": "AK", "timestamp": "1756000000", "shop_cipher": "ROW_x", "page_size": "50"},
+     {"create_time_ge": 1756000000, "create_time_lt": 1756086400}),
+    ("/order/202309/orders", {"app_key": "AK", "timestamp": "1", "ids": "1,2,3", "sign": "stale"}, None),
+    ("/order/202309/orders/search", {"app_key": "AK", "timestamp": "2", "page_token": "a/b+c="},
+     {"order_status": "CANCELLED", "note": "Không còn nhu cầu"}),
+    ("/authorization/202309/shops", {}, {}),
+]
+
+
+@pytest.mark.parametrize("path,query,body", CASES)
+@pytest.mark.parametrize("secret", ["s3cret", "bí mật"])
+def test_build_signature_matches_baseline(path, query, body, secret):
+    assert build_signature(path, query, body, secret) == baseline_signature(path, query, body, secret)
+
+
+@pytest.mark.parametrize("path,query,body", CASES)
+def test_sign_request_signs_the_bytes_it_sends(path, query, body):
+    sign, body_bytes = Signer("s3cret").sign_request(path, query, body)
+    assert sign == baseline_signature(path, query, body, "s3cret")
+    sent = None if body is None else json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    assert body_bytes == sent
+
+
+def test_cached_path_state_is_not_mutated():
+    s = signer_for("s3cret")
+    path, query, body = CASES[0]
+    first = s.sign_request(path, query, body)[0]
+    s.sign_request(path, dict(query, page_size="100"), body)
+    assert s.sign_request(path, query, body)[0] == first
+
+
+def test_build_signature_with_text_matches_baseline():
+    path, query, body = CASES[2]
+    sign, param_concat, text = build_signature_with_text(path, query, body, "s3cret")
+    assert sign == baseline_signature(path, query, body, "s3cret")
+    assert param_concat == "".join(f"{k}{query[k]}" for k in sorted(query))
+    assert text.startswith("s3cret" + path + param_concat) and text.endswith("s3cret")
+
+
+def test_sign_batch_serializes_once_and_matches_single():
+    path, query, body = CASES[0]
+    queries = [dict(query, page_token=str(i)) for i in range(5)]
+    signs, body_bytes = Signer("s3cret").sign_batch(path, queries, body)
+    assert signs == [baseline_signature(path, q, body, "s3cret") for q in queries]
+    assert body_bytes == Signer("s3cret").sign_request(path, queries[0], body)[1]
+
+
+def _query_of(url):
+    return dict(parse_qsl(urlsplit(url).query))
+
+
+def test_batch_build_resigns_single_query_on_retry(client, monkeypatch):
+    body = {"create_time_ge": 1}
+    builds = client._build_signed_urls(SEARCH, body, [{"page_size": "10"}, {"page_size": "20"}])
+    url, payload = builds[1]()
+    q = _query_of(url)
+    assert q["sign"] == baseline_signature(SEARCH, q, body, APP_SECRET)
+    # lần thử lại: chỉ query này được ký lại, timestamp mới, vẫn dùng body bytes đã serialize
+    now = time.time()
+    monkeypatch.setattr(tts_client.time, "time", lambda: now + 30)
+    url2, payload2 = builds[1]()
+    q2 = _query_of(url2)
+    assert int(q2["timestamp"]) == int(now + 30) and q2["page_size"] == "20"
+    assert q2["sign"] == baseline_signature(SEARCH, q2, body, APP_SECRET)
+    assert payload2 is payload
+
+
+def test_batch_build_resigns_stale_presigned_url(client, monkeypatch):
+    builds = client._build_signed_urls(SEARCH, None, [{"page_size": "10"}])
+    now = time.time()
+    monkeypatch.setattr(tts_client.time, "time", lambda: now + tts_client.BATCH_SIGN_MAX_AGE + 5)
+    q = _query_of(builds[0]()[0])
+    assert int(q["timestamp"]) == int(now + tts_client.BATCH_SIGN_MAX_AGE + 5)
+
+
+def test_signed_batch_against_mock(client, mock_orders):
+    """Mock kiểm chữ ký: mọi lô chi tiết đơn ký sẵn phải được nhận."""
+    ids = [o["id"] for o in mock_orders[:120]]
+    sends = client.signed_batch("GET", "/order/202309/orders",
+                                [{"ids": ",".join(ids[i:i + 50])} for i in range(0, len(ids), 50)])
+    got = [o["id"] for send in sends for o in send()["data"]["orders"]]
+    assert got == ids
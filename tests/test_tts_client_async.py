@@ -0,0 +1,73 @@
+# Client async: refresh single-flight, token cache không chạm file trên event loop, gọi API qua mock
+import time, asyncio, threading
+import pytest
+import tts_client_async
+from tts_client_async import AsyncTTSClient
+from conftest import START
+from orders_search import search_body
+
+pytest.importorskip("aiohttp")
+
+
+def _count_refreshes(client):
+    calls = []
+    fetch = client.tokens.fetch
+
+    def counting(refresh_token):
+        calls.append(refresh_token)
+        return fetch(refresh_token)
+    client.tokens.fetch = counting
+    return calls
+
+
+def test_concurrent_callers_share_one_refresh(client):
+    calls = _count_refreshes(client)
+    ac = AsyncTTSClient(client)
+
+    async def main():
+        return await asyncio.gather(*(ac.ensure_access_token() for _ in range(20)))
+    tokens = asyncio.run(main())
+    assert len(calls) == 1
+    assert len(set(tokens)) == 1 and tokens[0].startswith("MOCK_AT_")
+
+
+def test_cached_token_skips_peek_until_recheck(client, monkeypatch):
+    ac = AsyncTTSClient(client)
+    token = asyncio.run(ac.ensure_access_token())
+    peeks = []
+    real_peek = client.tokens.peek
+
+    def peek():
+        peeks.append(threading.current_thread() is threading.main_thread())
+        return real_peek()
+    monkeypatch.setattr(client.tokens, "peek", peek)
+
+    async def many():
+        return {await ac.ensure_access_token() for _ in range(100)}
+    assert asyncio.run(many()) == {token}
+    assert peeks == []  # chỉ so thời gian trong bộ nhớ
+
+    now = time.time()
+    monkeypatch.setattr(tts_client_async.time, "time", lambda: now + tts_client_async.TOKEN_RECHECK + 1)
+    assert asyncio.run(ac.ensure_access_token()) == token
+    assert peeks == [False]  # hết cache: peek chạy trong thread, không trên event loop
+
+
+def test_cache_expires_before_refresh_window(client):
+    ac = AsyncTTSClient(client)
+    asyncio.run(ac.ensure_access_token())
+    assert ac._token_until <= int(client.tokens.state["expires_at"]) - client.tokens.skew
+
+
+def test_post_signed_with_shop_against_mock(client, mock_orders):
+    ac = AsyncTTSClient(client)
+    body = search_body("create_time", START, START + 86400)
+
+    async def main():
+        try:
+            return await ac.post_signed_with_shop("/order/202309/orders/search", body, {"page_size": 20})
+        finally:
+            await tts_client_async.close()
+    data = asyncio.run(main())["data"]
+    assert data["total_count"] == sum(1 for o in mock_orders if START <= o["create_time"] < START + 86400)
+    assert len(data["orders"]) == 20
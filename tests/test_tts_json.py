@@ -0,0 +1,76 @@
+# tts_json: mọi backend (stdlib / orjson / msgspec) ra đúng từng byte như json chuẩn → chữ ký không đổi theo backend
+import json
+import pytest
+import tts_json
+from tts_sign import Signer
+
+
+@pytest.fixture(params=["stdlib", "orjson", "msgspec"])
+def backend(request):
+    if request.param != "stdlib":
+        pytest.importorskip(request.param)
+    prev = tts_json.BACKEND
+    yield tts_json.use(request.param)
+    tts_json.use(prev or "auto")
+
+
+def _std(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+BODIES = [
+    {"time_filter": {"create_time_ge": 1756000000, "create_time_lt": 1756086400}, "order_status": "UNPAID"},
+    {"tên": "Đơn hàng – giao nhanh ✓", "emoji": "🛒", "esc": "a\"b\\c\n\t\u0001", "none": None, "ok": True},
+    {"big": 2 ** 70, "neg": -(2 ** 63), "nested": [[], {}, [1, [2, {"x": ""}]]]},
+]
+
+
+@pytest.mark.parametrize("body", BODIES)
+def test_dumps_matches_stdlib(backend, body):
+    assert tts_json.dumps(body) == _std(body)
+    assert tts_json.dumps(body, exact=True) == _std(body)
+    assert tts_json.dumps_text(body) == _std(body).decode("utf-8")
+    assert tts_json.loads(tts_json.dumps(body)) == body
+
+
+def test_exact_floats_match_stdlib(backend):
+    body = {"w": 0.1, "big": 1e16, "small": 1e-7, "list": [1.5, 2.0, 3e20]}
+    assert tts_json.dumps(body, exact=True) == _std(body)
+
+
+def test_non_str_keys_fall_back(backend):
+    assert tts_json.dumps({1: "a", "b": 2}) == _std({1: "a", "b": 2})
+
+
+def test_pretty_matches_stdlib(backend, mock_orders):
+    orders = mock_orders[:20]
+    assert tts_json.dumps_pretty(orders) == json.dumps(orders, ensure_ascii=False, indent=2)
+    assert tts_json.dumps(orders) == _std(orders)
+
+
+def test_signature_same_across_backends(backend):
+    signer = Signer("test_secret")
+    q = {"app_key": "k", "timestamp": 1756000000, "shop_cipher": "S"}
+    expected = Signer("test_secret").sign("/order/202309/orders/search", q, _std(BODIES[1]))
+    sign, payload = signer.sign_request("/order/202309/orders/search", q, BODIES[1])
+    assert payload == _std(BODIES[1]) and sign == expected
+
+
+def test_loads_errors_are_value_errors(backend):
+    with pytest.raises(ValueError):
+        tts_json.loads(b"{broken")
+    for n in (2 ** 63 - 1, -(2 ** 63), 2 ** 64 - 1):
+        assert tts_json.loads(str(n)) == n
+
+
+def test_loads_ints_beyond_64_bits(backend):
+    n = 123456789012345678901234567890
+    if backend == "orjson":
+        assert tts_json.loads(str(n)) == float(n)  # giới hạn đã ghi ở tts_json.loads
+    else:
+        assert tts_json.loads(str(n)) == n
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(RuntimeError):
+        tts_json.use("ujson")
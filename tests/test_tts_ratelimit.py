@@ -0,0 +1,99 @@
+# tts_ratelimit + TTSClient._signed_request: token bucket AIMD, Retry-After, retry 429/5xx rồi mới báo lỗi
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+import pytest
+import tts_client, tts_json
+from tts_ratelimit import TokenBucket, RetryPolicy, parse_retry_after, is_rate_limited, is_retryable
+
+
+def test_bucket_spends_burst_then_asks_to_wait():
+    b = TokenBucket(rate=10, burst=3)
+    assert [b.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert 0 < b.reserve() <= 0.1 + 1e-6
+
+
+def test_bucket_throttled_halves_rate_and_pauses():
+    b = TokenBucket(rate=8, burst=8)
+    b.throttled(pause=5)
+    assert b.rate == 4
+    assert b.reserve() > 4  # cả bucket dừng tới hết pause dù tốc độ còn cao
+    for _ in range(3):
+        b.throttled()
+    assert b.rate == b.min_rate == 0.5
+    for _ in range(200):
+        b.succeeded()
+    assert b.rate == b.max_rate == 8
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None and parse_retry_after("soon") is None
+    assert 50 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_retry_after_wins_over_small_backoff():
+    p = RetryPolicy(base=0.01, cap=1)
+    assert p.delay(0, retry_after=2.5) == 2.5
+    assert p.delay(0, retry_after=100) == 4  # trần cap * 4
+    assert all(0 <= p.delay(10) <= 1 for _ in range(50))
+
+
+def test_rate_limit_detection():
+    assert is_rate_limited(429, {})
+    assert is_rate_limited(200, {"code": 36009004, "message": "Rate limit exceeded"})
+    assert not is_rate_limited(200, {"code": 0, "message": "Success"})
+    assert is_retryable(503, {}) and not is_retryable(400, {"code": 1, "message": "bad"})
+
+
+def _resp(status, obj, headers=None):
+    data = tts_json.dumps(obj)
+    return SimpleNamespace(status_code=status, ok=status < 400, content=data, text=data.decode(),
+                           headers=headers or {})
+
+
+@pytest.fixture
+def scripted(client, monkeypatch):
+    """client gửi lần lượt các response cho trước; ghi lại các lần ngủ giữa các lượt thử."""
+    client.ensure_access_token = lambda: "AT"
+    client.retry = RetryPolicy(max_retries=3, base=0.01, cap=0.02)
+    sent, sleeps, replies = [], [], []
+
+    def send(method, url, **kw):
+        sent.append(url)
+        return replies.pop(0)
+    monkeypatch.setattr(client, "_send", send)
+    # chỉ thay time của tts_client (bucket vẫn chờ thật bằng time.sleep của tts_ratelimit)
+    monkeypatch.setattr(tts_client, "time", SimpleNamespace(time=time.time, perf_counter=time.perf_counter,
+                                                           sleep=sleeps.append))
+    return client, replies, sent, sleeps
+
+
+def test_client_retries_429_and_503_honouring_retry_after(scripted):
+    client, replies, sent, sleeps = scripted
+    bucket = TokenBucket(rate=100)
+    client.buckets = [bucket]
+    replies += [_resp(429, {"code": 429, "message": "Too many requests"}, {"Retry-After": "0.07"}),
+                _resp(503, {"code": 503, "message": "unavailable"}),
+                _resp(200, {"code": 0, "data": {"ok": 1}})]
+    assert client.post_signed_with_shop("/order/202309/orders/search", {"a": 1})["data"] == {"ok": 1}
+    assert len(sent) == 3 and len(sleeps) == 2
+    assert sleeps[0] == 0.07 and sleeps[1] <= 0.02
+    assert bucket.rate > 50  # bị throttle 1 lần (100 → 50) rồi tăng lại sau khi thành công
+
+
+def test_client_gives_up_after_max_retries(scripted):
+    client, replies, sent, sleeps = scripted
+    replies += [_resp(503, {"code": 503, "message": "unavailable"})] * 4
+    with pytest.raises(RuntimeError, match="HTTP 503"):
+        client.post_signed_with_shop("/order/202309/orders/search", {"a": 1})
+    assert len(sent) == 4 and len(sleeps) == 3
+
+
+def test_client_does_not_retry_client_errors(scripted):
+    client, replies, sent, sleeps = scripted
+    replies.append(_resp(400, {"code": 40006, "message": "invalid param"}))
+    with pytest.raises(RuntimeError, match="HTTP 400"):
+        client.post_signed_with_shop("/order/202309/orders/search", {"a": 1})
+    assert len(sent) == 1 and sleeps == []
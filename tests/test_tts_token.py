@@ -0,0 +1,110 @@
+# tts_token: đọc lại state khi process khác ghi, refresh chỉ 1 lần dù nhiều manager/process dùng chung file
+import os, time, threading, multiprocessing
+import pytest
+from tts_token import TokenStore, TokenManager, file_lock
+
+
+def _slow_fetch(counter_path):
+    def fetch(refresh_token):
+        with open(counter_path, "a") as f:
+            f.write(refresh_token + "\n")
+        time.sleep(0.2)  # đủ lâu để các bên khác đến lượt chờ lock
+        return {"data": {"access_token": f"AT-{refresh_token}-{os.getpid()}",
+                         "refresh_token": refresh_token + "+", "access_token_expire_in": 3600}}
+    return fetch
+
+
+def _manager(path, counter_path):
+    return TokenManager(TokenStore(path, refresh_token="R", check_interval=0), _slow_fetch(counter_path))
+
+
+def _calls(counter_path):
+    with open(counter_path) as f:
+        return f.read().split()
+
+
+def test_store_reloads_when_other_writer_saves(tmp_path):
+    path = str(tmp_path / "token_state.json")
+    a = TokenStore(path, access_token="A1", refresh_token="R")
+    a.save()
+    b = TokenStore(path, check_interval=3600)
+    assert b.state["access_token"] == "A1"
+    a.state.update(access_token="A2", expires_at=123)
+    a.save()
+    assert b.reload()["access_token"] == "A1"  # chưa hết check_interval: không stat lại
+    assert b.reload(force=True)["access_token"] == "A2" and b.state["expires_at"] == 123
+
+
+def test_store_keeps_state_when_file_is_corrupt(tmp_path):
+    path = tmp_path / "token_state.json"
+    store = TokenStore(str(path), access_token="A1", refresh_token="R")
+    store.save()
+    path.write_text("{not json")
+    assert store.reload(force=True)["access_token"] == "A1"
+
+
+def test_managers_sharing_file_refresh_once(tmp_path):
+    path, counter = str(tmp_path / "token_state.json"), str(tmp_path / "calls")
+    managers = [_manager(path, counter) for _ in range(4)]  # lock luồng riêng → chỉ còn lock file
+    results = []
+    threads = [threading.Thread(target=lambda m=m: results.append(m.get())) for m in managers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _calls(counter) == ["R"]
+    assert len(set(results)) == 1
+    assert TokenStore(path).state["refresh_token"] == "R+"
+
+
+def _refresh_in_child(path, counter, out):
+    token = _manager(path, counter).get()
+    with open(out, "a") as f:
+        f.write(token + "\n")
+
+
+def test_processes_sharing_file_refresh_once(tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("cần fork")
+    ctx = multiprocessing.get_context("fork")
+    path, counter, out = str(tmp_path / "token_state.json"), str(tmp_path / "calls"), str(tmp_path / "out")
+    procs = [ctx.Process(target=_refresh_in_child, args=(path, counter, out)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(10)
+        assert p.exitcode == 0
+    assert _calls(counter) == ["R"]
+    assert len(set(_calls(out))) == 1
+
+
+def test_stale_token_rejected_by_server_forces_refresh(tmp_path):
+    path, counter = str(tmp_path / "token_state.json"), str(tmp_path / "calls")
+    m = _manager(path, counter)
+    first = m.get()
+    assert m.get() == first and _calls(counter) == ["R"]
+    second = m.refresh(first)  # 401 với token hiện tại → phải refresh thật
+    assert second != first and _calls(counter) == ["R", "R+"]
+    assert m.refresh(first) == second  # caller khác còn cầm token cũ: dùng token mới, không gọi lại
+
+
+def test_peek_near_expiry_refreshes_in_background(tmp_path):
+    path, counter = str(tmp_path / "token_state.json"), str(tmp_path / "calls")
+    m = _manager(path, counter)
+    m.state.update(access_token="OLD", expires_at=int(time.time()) + m.skew - 5)
+    m.store.save()
+    assert m.peek() == "OLD"  # không chờ refresh
+    m._bg.join(5)
+    assert m.state["access_token"].startswith("AT-") and _calls(counter) == ["R"]
+
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    lock = str(tmp_path / "x.lock")
+    order = []
+    with file_lock(lock):
+        t = threading.Thread(target=lambda: (file_lock(lock).__enter__(), order.append("other")))
+        t.start()
+        time.sleep(0.1)
+        order.append("holder")
+    t.join(5)
+    assert order == ["holder", "other"]
@@ -0,0 +1,65 @@
+# Webhook: payload hỏng → 400 (không làm chết handler), timestamp cũ → 400, gửi lại cùng chữ ký → 200 không xếp hàng
+import json, time, threading
+import urllib.request, urllib.error
+from types import SimpleNamespace
+import pytest
+from tts_sign import webhook_signature
+from webhook_server import OrderIngestor, make_server
+
+APP_KEY, APP_SECRET = "hook_app", "hook_secret"
+
+
+@pytest.fixture
+def hook():
+    client = SimpleNamespace(app_key=APP_KEY, app_secret=APP_SECRET, shop_cipher="S", shop_id=None)
+    ing = OrderIngestor(client, store=None, workers=1)  # không start worker: chỉ kiểm hàng đợi
+    srv = make_server("127.0.0.1", 0, client, ing)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield ing, f"http://127.0.0.1:{srv.server_address[1]}/webhook"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _post(url, payload):
+    body = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=body, method="POST",
+                                 headers={"Authorization": webhook_signature(APP_KEY, APP_SECRET, body)})
+    try:
+        with urllib.request.urlopen(req) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _event(**data):
+    return {"type": 1, "shop_id": "1", "timestamp": int(time.time()), "data": dict({"order_id": "O1"}, **data)}
+
+
+def test_non_numeric_update_time_is_400(hook):
+    ing, url = hook
+    assert _post(url, _event(update_time="abc")) == 400
+    assert ing.snapshot()["ignored"] == 1 and ing.queue.qsize() == 0
+    assert _post(url, _event(update_time=1756000000)) == 200  # server vẫn sống
+    assert ing.queue.qsize() == 1
+
+
+def test_stale_timestamp_is_400(hook):
+    ing, url = hook
+    assert _post(url, dict(_event(update_time=1), timestamp=int(time.time()) - 3600)) == 400
+    assert ing.snapshot()["stale"] == 1 and ing.queue.qsize() == 0
+
+
+def test_replay_is_acknowledged_but_not_queued(hook):
+    ing, url = hook
+    ev = _event(update_time=1756000000)
+    assert _post(url, ev) == 200
+    assert _post(url, ev) == 200
+    assert ing.snapshot()["replayed"] == 1 and ing.queue.qsize() == 1
+
+
+def test_bad_signature_is_401(hook):
+    ing, url = hook
+    req = urllib.request.Request(url, data=b'{"data":{}}', method="POST", headers={"Authorization": "x"})
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(req)
+    assert e.value.code == 401 and ing.snapshot()["bad_sign"] == 1
@@ -1,176 +1,370 @@
 # tts_client.py  — robust token lifecycle with preemptive refresh
-import os, time, json, requests, threading
+# Import không đọc file nào: .env chỉ được nạp khi cần cấu hình từ env (load_env / from_env / default_client),
+# client mặc định tạo ở lần dùng đầu tiên; requests được import ở request đầu tiên (tts_http).
+import os, time, threading
 from urllib.parse import urlencode
-from dotenv import load_dotenv
-from tts_sign import build_signature_with_text  # 202309 sign scheme
+from tts_sign import signer_for  # 202309 sign scheme
+import tts_http  # pool kết nối keep-alive dùng chung
+import tts_ratelimit
+import tts_json
+import tts_metrics  # span / counter / histogram (tắt mặc định)
+import tts_token  # token_state.json dùng chung giữa các process
 
+_env_loaded = False
 
+def load_env():
+    """Nạp .env vào os.environ (1 lần; biến đã có trong môi trường được giữ nguyên)."""
+    global _env_loaded
+    if not _env_loaded:
+        _env_loaded = True
+        from dotenv import load_dotenv
+        load_dotenv()
 
-load_dotenv()
+DEFAULT_BASE = "https://open-api.tiktokglobalshop.com"
+REFRESH_URL = "https://auth.tiktok-shops.com/api/v2/token/refresh"
+# Chữ ký ký sẵn theo lô chỉ được dùng nguyên nếu timestamp chưa cũ quá số giây này (không thì ký lại)
+BATCH_SIGN_MAX_AGE = 60
 
-APP_KEY     = os.getenv("TTS_APP_KEY")
-APP_SECRET  = os.getenv("TTS_APP_SECRET")
-SHOP_CIPHER = os.getenv("TTS_SHOP_CIPHER")  # ưu tiên nếu có
-SHOP_ID     = os.getenv("TTS_SHOP_ID")
-BASE        = os.getenv("TTS_BASE", "https://open-api.tiktokglobalshop.com")
+def _is_expired_get(status: int, text: str):
+    return status in (400, 401) and "expired" in text.lower()
 
-# State file cho token (không commit git)
-STATE_FILE  = os.getenv("TTS_TOKEN_STATE", "token_state.json")
+def _is_expired_post(status: int, j: dict):
+    return status == 401 and (j.get("code") == 105002 or "expired" in (j.get("message") or "").lower())
 
-# Lock để an toàn đa luồng/đa request
-_state_lock = threading.Lock()
 
-def _load_state():
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            s = json.load(f)
-            # đảm bảo key cần thiết
-            s.setdefault("access_token", None)
-            s.setdefault("refresh_token", os.getenv("TTS_REFRESH_TOKEN") or None)
-            s.setdefault("expires_at", 0)
-            return s
-    except Exception:
-        # bootstrap từ .env nếu có
+class TTSClient:
+    """
+    Client cho 1 shop: giữ app/shop/base và token state RIÊNG, nên nhiều shop có thể
+    chạy song song trong cùng 1 process. Kết nối HTTP vẫn dùng chung pool của tts_http.
+
+    limiter: semaphore dùng chung (tuỳ chọn) để giới hạn tổng số request đang bay giữa các client.
+    app_rate / shop_rate: số request/giây cho token bucket dùng chung theo app_key và theo shop (0 = không giới hạn).
+    retry: tts_ratelimit.RetryPolicy cho 429/5xx/lỗi mạng.
+    tokens: tts_token.TokenManager — refresh nền trước hạn, lock file để nhiều process không refresh trùng.
+    sync_env: ghi token mới vào os.environ (chỉ nên bật cho client mặc định đọc từ .env).
+    """
+
+    def __init__(self, app_key: str | None, app_secret: str | None,
+                 shop_cipher: str | None = None, shop_id: str | None = None,
+                 base: str | None = None, state_file: str = "token_state.json",
+                 access_token: str | None = None, refresh_token: str | None = None,
+                 refresh_url: str | None = None,
+                 limiter: threading.Semaphore | None = None, sync_env: bool = False,
+                 app_rate: float | None = None, shop_rate: float | None = None,
+                 retry: tts_ratelimit.RetryPolicy | None = None):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.shop_cipher = shop_cipher  # ưu tiên nếu có
+        self.shop_id = shop_id
+        self.base = base or DEFAULT_BASE
+        self.refresh_url = refresh_url or REFRESH_URL
+        # State file cho token (không commit git)
+        self.state_file = state_file
+        self.limiter = limiter
+        self.sync_env = sync_env
+        self.tokens = tts_token.TokenManager(
+            tts_token.TokenStore(state_file, access_token, refresh_token),
+            fetch=self._fetch_refresh, on_update=self._on_tokens_updated)
+        # state: dict dùng chung với TokenStore (cập nhật tại chỗ); lock: lock refresh trong process
+        self.state = self.tokens.state
+        self.lock = self.tokens.lock
+        self.retry = retry or tts_ratelimit.RetryPolicy.from_env()
+        app_rate = float(os.getenv("TTS_APP_RATE", "50") if app_rate is None else app_rate)
+        shop_rate = float(os.getenv("TTS_SHOP_RATE", "10") if shop_rate is None else shop_rate)
+        self.buckets = []
+        if app_rate > 0 and app_key:
+            self.buckets.append(tts_ratelimit.get_bucket(f"app:{app_key}", app_rate))
+        if shop_rate > 0 and (shop_cipher or shop_id):
+            self.buckets.append(tts_ratelimit.get_bucket(f"shop:{shop_cipher or shop_id}", shop_rate))
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Client đọc cấu hình từ biến môi trường / .env (như các script cũ)."""
+        load_env()
+        return cls(
+            app_key=os.getenv("TTS_APP_KEY"),
+            app_secret=os.getenv("TTS_APP_SECRET"),
+            shop_cipher=os.getenv("TTS_SHOP_CIPHER"),
+            shop_id=os.getenv("TTS_SHOP_ID"),
+            base=os.getenv("TTS_BASE", DEFAULT_BASE),
+            state_file=os.getenv("TTS_TOKEN_STATE", "token_state.json"),
+            access_token=os.getenv("TTS_ACCESS_TOKEN"),
+            refresh_token=os.getenv("TTS_REFRESH_TOKEN"),
+            refresh_url=os.getenv("TTS_REFRESH_URL"),
+            **kwargs,
+        )
+
+    def _require_app(self):
+        if not self.app_key or not self.app_secret:
+            raise RuntimeError("Thiếu TTS_APP_KEY/TTS_APP_SECRET trong .env")
+
+    @property
+    def signer(self):
+        """tts_sign.Signer của app (HMAC đã nạp key sẵn, dùng chung giữa các client cùng app)."""
+        return signer_for(self.app_secret)
+
+    def _require_shop(self):
+        if not (self.shop_cipher or self.shop_id):
+            raise RuntimeError("Thiếu TTS_SHOP_CIPHER hoặc TTS_SHOP_ID trong .env")
+
+    def _common_query(self):
+        self._require_app()
         return {
-            "access_token": os.getenv("TTS_ACCESS_TOKEN") or None,
-            "refresh_token": os.getenv("TTS_REFRESH_TOKEN") or None,
-            "expires_at": 0
+            "app_key": self.app_key,
+            "sign_method": "HMAC-SHA256",
+            "timestamp": int(time.time()),
+            "version": "202309",
         }
 
-def _save_state(s):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(s, f, ensure_ascii=False, indent=2)
-
-_state = _load_state()
-
-def _require_app():
-    if not APP_KEY or not APP_SECRET:
-        raise RuntimeError("Thiếu TTS_APP_KEY/TTS_APP_SECRET trong .env")
-
-def _require_shop():
-    if not (SHOP_CIPHER or SHOP_ID):
-        raise RuntimeError("Thiếu TTS_SHOP_CIPHER hoặc TTS_SHOP_ID trong .env")
-
-def _common_query():
-    _require_app()
-    return {
-        "app_key": APP_KEY,
-        "sign_method": "HMAC-SHA256",
-        "timestamp": int(time.time()),
-        "version": "202309",
-    }
-
-def _update_tokens(access_token: str, refresh_token: str | None, expire_in: int | None):
-    now = int(time.time())
-    expires_at = now + int(expire_in or 3600)  # fallback 1h nếu không trả expire
-    _state["access_token"] = access_token
-    if refresh_token:
-        _state["refresh_token"] = refresh_token
-    _state["expires_at"] = expires_at
-    _save_state(_state)
-    # Đồng bộ vào process env để các chỗ khác (nếu có) còn đọc
-    os.environ["TTS_ACCESS_TOKEN"]  = _state["access_token"]
-    if _state.get("refresh_token"):
-        os.environ["TTS_REFRESH_TOKEN"] = _state["refresh_token"]
-
-def _refresh_access_token_or_fail():
-    _require_app()
-    if not _state.get("refresh_token"):
-        raise RuntimeError(
-            "Không có refresh_token để làm mới access_token. "
-            "Hãy lấy lại ủy quyền (authorized_code → token/get) hoặc bổ sung TTS_REFRESH_TOKEN."
-        )
-    params = {
-        "app_key": APP_KEY,
-        "app_secret": APP_SECRET,
-        "grant_type": "refresh_token",
-        "refresh_token": _state["refresh_token"],
-    }
-    url = "https://auth.tiktok-shops.com/api/v2/token/refresh"
-    r = requests.get(url, params=params, timeout=60)
-    r.raise_for_status()
-    data = r.json() or {}
-    payload = data.get("data") or data
-    access = payload.get("access_token")
-    refresh = payload.get("refresh_token") or _state.get("refresh_token")
-    # TikTok có thể trả 'access_token_expire_in' hoặc 'expire_in' (tùy tài liệu/cụm)
-    expire_in = payload.get("access_token_expire_in", payload.get("expire_in"))
-    if not access:
-        raise RuntimeError(f"Refresh không trả access_token: {data}")
-    _update_tokens(access, refresh, expire_in)
-    return _state["access_token"]
+    # ---------- token state ----------
+    def _on_tokens_updated(self, state: dict):
+        if self.sync_env:
+            # Đồng bộ vào process env để các chỗ khác (nếu có) còn đọc
+            os.environ["TTS_ACCESS_TOKEN"]  = state["access_token"]
+            if state.get("refresh_token"):
+                os.environ["TTS_REFRESH_TOKEN"] = state["refresh_token"]
+
+    def _refresh_params(self, refresh_token: str | None = None):
+        self._require_app()
+        return {
+            "app_key": self.app_key,
+            "app_secret": self.app_secret,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token or self.state.get("refresh_token"),
+        }
+
+    def _fetch_refresh(self, refresh_token: str):
+        tts_metrics.inc("token_refresh_total")
+        with tts_metrics.span("token_refresh"):
+            r = self._send("GET", self.refresh_url, params=self._refresh_params(refresh_token))
+        r.raise_for_status()
+        return tts_json.loads(r.content) or {}
+
+    def _refresh_access_token_or_fail(self, stale: str | None = None):
+        return self.tokens.refresh(stale if stale is not None else self.state.get("access_token"))
+
+    def _fresh_token_or_none(self):
+        """Trả về access_token nếu còn dùng được, None nếu cần refresh (raise nếu không thể refresh)."""
+        return self.tokens.peek()
+
+    def ensure_access_token(self):
+        """Trả về access_token hợp lệ; trong 10 phút cuối trước hạn thì refresh ở luồng nền."""
+        return self.tokens.get()
+
+    # ---------- signed requests ----------
+    def _send(self, method: str, url: str, **kwargs):
+        if self.limiter is None:
+            return tts_http.request(method, url, **kwargs)
+        with self.limiter:
+            return tts_http.request(method, url, **kwargs)
+
+    def _shop_query(self, query_extra: dict | None):
+        q = self._common_query()
+        if self.shop_cipher:
+            q["shop_cipher"] = self.shop_cipher
+        elif self.shop_id:
+            q["shop_id"] = self.shop_id
+        if query_extra:
+            q.update(query_extra)
+        return q
+
+    def _build_signed_url(self, path: str, body: dict | None, query_extra: dict | None):
+        """Trả về (url, payload bytes): body serialize 1 lần, gửi đúng bytes đã ký."""
+        q = self._shop_query(query_extra)
+        sign_hex, payload = self.signer.sign_request(path, q, body)
+        return f"{self.base}{path}?{urlencode({**q, 'sign': sign_hex})}", payload
+
+    def _build_signed_urls(self, path: str, body: dict | None, query_extras: list):
+        """
+        Bản batch của _build_signed_url: N request cùng path/body, body serialize 1 lần, N query ký 1 lượt.
+        Trả về list build() cho _signed_request: lần gửi đầu dùng URL đã ký sẵn (nếu timestamp còn mới),
+        các lần thử lại chỉ ký lại đúng query đó với timestamp mới (dùng lại body bytes).
+        """
+        qs = [self._shop_query(extra) for extra in query_extras]
+        signs, payload = self.signer.sign_batch(path, qs, body)
+        return [self._presigned_build(path, q, sign_hex, payload) for q, sign_hex in zip(qs, signs)]
+
+    def _presigned_build(self, path: str, q: dict, sign_hex: str, payload: bytes | None):
+        presigned = [sign_hex]
+
+        def build():
+            now = int(time.time())
+            if presigned and now - q["timestamp"] <= BATCH_SIGN_MAX_AGE:
+                query, sign = q, presigned.pop()
+            else:
+                presigned.clear()
+                query = dict(q, timestamp=now)
+                sign = self.signer.sign(path, query, payload)
+            return f"{self.base}{path}?{urlencode({**query, 'sign': sign})}", payload
+        return build
+
+    def _build_signed_url_no_shop(self, path: str, query_extra: dict | None):
+        q = self._common_query()
+        if query_extra:
+            q.update(query_extra)
+        sign_hex = self.signer.sign(path, q)
+        return f"{self.base}{path}?{urlencode({**q, 'sign': sign_hex})}"
+
+    def _throttle(self):
+        for b in self.buckets:
+            b.acquire()
+
+    def _signed_request(self, method: str, build, is_expired, path: str = ""):
+        """
+        Gửi request đã ký với:
+          - token bucket theo app_key/shop (chờ trước khi gửi),
+          - refresh-on-401 một lần khi token hết hạn bất ngờ,
+          - retry có jitter cho 429 / 5xx / lỗi mạng tạm thời (tôn trọng Retry-After).
+        build() trả về (url, payload) và được gọi lại mỗi lần thử để chữ ký có timestamp mới.
+        path: chỉ dùng làm nhãn metrics (tts_metrics).
+        """
+        refreshed = False
+        attempt = 0
+        ep = tts_metrics.endpoint(path) if tts_metrics.enabled() else path
+        while True:
+            with tts_metrics.span("token"):
+                token = self.ensure_access_token()
+            with tts_metrics.span("sign"):
+                url, payload = build()
+            headers = {"x-tts-access-token": token}
+            if payload is not None:
+                headers["Content-Type"] = "application/json"
+            with tts_metrics.span("rate_limit_wait"):
+                self._throttle()
+            t0 = time.perf_counter()
+            try:
+                with tts_metrics.span("http"):
+                    r = self._send(method, url, headers=headers, data=payload)
+            except tts_http.TRANSIENT_ERRORS:
+                tts_metrics.inc("http_responses_total", path=ep, status="error")
+                if attempt >= self.retry.max_retries:
+                    raise
+                tts_metrics.inc("retries_total", path=ep, reason="network")
+                with tts_metrics.span("retry_sleep"):
+                    time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            tts_metrics.observe("http_request_seconds", time.perf_counter() - t0, path=ep, method=method)
+            tts_metrics.inc("http_responses_total", path=ep, status=r.status_code)
+
+            try:
+                with tts_metrics.span("json_parse"):
+                    j = tts_json.loads(r.content)  # parse thẳng từ bytes, 1 lần
+                parsed = True
+            except Exception:
+                j, parsed = {}, False
+            if r.ok and not tts_ratelimit.is_rate_limited(r.status_code, j):
+                for b in self.buckets:
+                    b.succeeded()
+                return j if parsed else tts_json.loads(r.content)  # body hỏng: báo lỗi như r.json() cũ
+
+            # fallback khi token hết hạn bất ngờ
+            if is_expired(r, j):
+                if refreshed:
+                    raise RuntimeError(f"Retry after refresh failed: HTTP {r.status_code} - {r.text}")
+                tts_metrics.inc("refresh_on_401_total")
+                self._refresh_access_token_or_fail(token)
+                refreshed = True
+                continue
+
+            if tts_ratelimit.is_retryable(r.status_code, j) and attempt < self.retry.max_retries:
+                wait = self.retry.delay(attempt, tts_ratelimit.parse_retry_after(r.headers.get("Retry-After")))
+                limited = tts_ratelimit.is_rate_limited(r.status_code, j)
+                if limited:
+                    for b in self.buckets:
+                        b.throttled(wait)
+                tts_metrics.inc("retries_total", path=ep, reason="rate_limit" if limited else "server")
+                with tts_metrics.span("retry_sleep"):
+                    time.sleep(wait)
+                attempt += 1
+                continue
+
+            if method == "GET":
+                r.raise_for_status()
+            raise RuntimeError(f"HTTP {r.status_code} - {r.text}")
+
+    def get_signed_no_shop(self, path: str, query_extra: dict | None = None):
+        """GET ký (không cần param shop), ví dụ /authorization/202309/shops"""
+        self._require_app()
+        return self._signed_request(
+            "GET", lambda: (self._build_signed_url_no_shop(path, query_extra), None),
+            lambda r, j: _is_expired_get(r.status_code, r.text), path)
+
+    def get_signed_with_shop(self, path: str, query_extra: dict | None = None):
+        """GET đã ký kèm shop_cipher/shop_id, ví dụ /order/202309/orders?ids=... (chi tiết đơn)"""
+        self._require_app(); self._require_shop()
+        return self._signed_request(
+            "GET", lambda: self._build_signed_url(path, None, query_extra),
+            lambda r, j: _is_expired_get(r.status_code, r.text), path)
+
+    def post_signed_with_shop(self, path: str, body: dict | None, query_extra: dict | None = None):
+        """
+        POST đã ký. Tự ensure token còn hạn (preemptive) + fallback refresh-on-401 một lần,
+        chờ theo rate limit và retry 429/5xx có backoff.
+        """
+        self._require_app(); self._require_shop()
+        return self._signed_request(
+            "POST", lambda: self._build_signed_url(path, body, query_extra),
+            lambda r, j: _is_expired_post(r.status_code, j), path)
+
+    def signed_batch(self, method: str, path: str, query_extras: list, body: dict | None = None):
+        """
+        Chuẩn bị N request đã ký cùng path/body (ví dụ nhiều lô ids của Get Order Detail) bằng 1 lượt ký.
+        Trả về list hàm send() → JSON theo thứ tự query_extras; mỗi hàm chạy qua _signed_request
+        (token, rate limit, retry) nên gọi tuần tự hay đưa vào thread pool đều được.
+        """
+        self._require_app(); self._require_shop()
+        if method == "POST":
+            is_expired = lambda r, j: _is_expired_post(r.status_code, j)
+        else:
+            is_expired = lambda r, j: _is_expired_get(r.status_code, r.text)
+        return [lambda build=build: self._signed_request(method, build, is_expired, path)
+                for build in self._build_signed_urls(path, body, query_extras)]
+
+
+# ---------- client mặc định (đọc .env) + API dạng hàm như trước ----------
+_default = None
+_default_lock = threading.Lock()
+
+# Tên cũ ở cấp module (APP_KEY, BASE, ...) → thuộc tính của client mặc định, chỉ tạo client khi được đọc
+_LEGACY_ATTRS = {"APP_KEY": "app_key", "APP_SECRET": "app_secret", "SHOP_CIPHER": "shop_cipher",
+                 "SHOP_ID": "shop_id", "BASE": "base", "STATE_FILE": "state_file",
+                 "_state": "state", "_state_lock": "lock"}
+
+def __getattr__(name):
+    if name in _LEGACY_ATTRS:
+        return getattr(default_client(), _LEGACY_ATTRS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def default_client() -> TTSClient:
+    """Client đọc .env, tạo ở lần gọi đầu tiên (hoặc client đã đặt bằng set_default_client)."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = TTSClient.from_env(sync_env=True)
+    return _default
+
+def set_default_client(client: TTSClient):
+    """Dùng client đã cấu hình sẵn trong process cho các hàm dạng module bên dưới (thay vì đọc .env)."""
+    global _default
+    with _default_lock:
+        _default = client
 
 def ensure_access_token():
     """Trả về access_token hợp lệ, refresh sớm 10 phút trước hạn."""
-    with _state_lock:
-        now = int(time.time())
-        token = _state.get("access_token")
-        expires_at = int(_state.get("expires_at") or 0)
-        # Chưa có hạn → nếu có token thì dùng tạm, nếu không thì buộc refresh (nếu có refresh_token)
-        if not token:
-            if _state.get("refresh_token"):
-                return _refresh_access_token_or_fail()
-            raise RuntimeError("Thiếu access_token. Bổ sung TTS_REFRESH_TOKEN hoặc re-authorize shop.")
-        # Refresh sớm 10 phút
-        if expires_at and now >= (expires_at - 600):
-            return _refresh_access_token_or_fail()
-        return token
-
-def _build_signed_url(path: str, body: dict | None, query_extra: dict | None):
-    q = _common_query()
-    if SHOP_CIPHER:
-        q["shop_cipher"] = SHOP_CIPHER
-    elif SHOP_ID:
-        q["shop_id"] = SHOP_ID
-    if query_extra:
-        q.update(query_extra)
-    sign_hex, _, _ = build_signature_with_text(path, q, body, APP_SECRET)
-    url = f"{BASE}{path}?{urlencode({**q, 'sign': sign_hex})}"
-    payload = None if body is None else json.dumps(body, separators=(",", ":"))
-    return url, payload
+    return default_client().ensure_access_token()
 
 def get_signed_no_shop(path: str, query_extra: dict | None = None):
     """GET ký (không cần param shop), ví dụ /authorization/202309/shops"""
-    _require_app()
-    token = ensure_access_token()
-    q = _common_query()
-    if query_extra:
-        q.update(query_extra)
-    sign_hex, _, _ = build_signature_with_text(path, q, None, APP_SECRET)
-    url = f"{BASE}{path}?{urlencode({**q, 'sign': sign_hex})}"
-    headers = {"x-tts-access-token": token}
-    r = requests.get(url, headers=headers, timeout=60)
-    if r.status_code in (400, 401) and "expired" in r.text.lower():
-        # refresh-on-401 dự phòng
-        token = _refresh_access_token_or_fail()
-        headers["x-tts-access-token"] = token
-        r = requests.get(url, headers=headers, timeout=60)
-    r.raise_for_status()
-    return r.json()
+    return default_client().get_signed_no_shop(path, query_extra)
+
+def get_signed_with_shop(path: str, query_extra: dict | None = None):
+    """GET đã ký kèm shop_cipher/shop_id, ví dụ /order/202309/orders?ids=... (chi tiết đơn)"""
+    return default_client().get_signed_with_shop(path, query_extra)
 
 def post_signed_with_shop(path: str, body: dict | None, query_extra: dict | None = None):
     """
     POST đã ký. Tự ensure token còn hạn (preemptive) + fallback refresh-on-401 một lần.
     """
-    _require_app(); _require_shop()
-    token = ensure_access_token()
-    url, payload = _build_signed_url(path, body, query_extra)
-    headers = {"x-tts-access-token": token, "Content-Type": "application/json"}
-    r = requests.post(url, headers=headers, data=payload, timeout=60)
-    if r.ok:
-        return r.json()
-
-    # fallback khi token hết hạn bất ngờ
-    try:
-        j = r.json()
-    except Exception:
-        j = {}
-    if r.status_code == 401 and (j.get("code") == 105002 or "expired" in (j.get("message") or "").lower()):
-        token = _refresh_access_token_or_fail()
-        headers["x-tts-access-token"] = token
-        r2 = requests.post(url, headers=headers, data=payload, timeout=60)
-        if r2.ok:
-            return r2.json()
-        raise RuntimeError(f"Retry after refresh failed: HTTP {r2.status_code} - {r2.text}")
-
-    raise RuntimeError(f"HTTP {r.status_code} - {r.text}")
+    return default_client().post_signed_with_shop(path, body, query_extra)
@@ -0,0 +1,224 @@
+# tts_client_async.py — bản asyncio của tts_client: cùng cách ký (tts_sign), cùng token_state,
+# cùng token bucket (tts_ratelimit) và chính sách retry với client sync
+import os, time, asyncio
+import tts_client, tts_json, tts_metrics, tts_ratelimit
+from tts_client import TTSClient, _is_expired_get, _is_expired_post
+
+# Token cache trên client async được dùng thẳng tối đa chừng này giây rồi mới đọc lại token_state
+# (process khác có thể đã refresh); gần hạn thì đọc lại sớm hơn
+TOKEN_RECHECK = 300
+
+# Mỗi event loop một session (aiohttp.ClientSession gắn với loop tạo ra nó), dùng chung cho mọi shop
+_session = None
+_session_loop = None
+
+def _transient_errors():
+    """Lỗi mạng tạm thời của aiohttp (đáng thử lại), như tts_http.TRANSIENT_ERRORS bên sync."""
+    import aiohttp
+    return (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+def _get_session():
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        import aiohttp  # import khi mở session đầu tiên, không phải lúc import module
+        connector = aiohttp.TCPConnector(
+            limit=int(os.getenv("TTS_ASYNC_LIMIT", "100")),
+            limit_per_host=int(os.getenv("TTS_ASYNC_LIMIT_PER_HOST", "0")),  # 0 = không giới hạn riêng / host
+        )
+        timeout = aiohttp.ClientTimeout(
+            connect=float(os.getenv("TTS_HTTP_CONNECT_TIMEOUT", "10")),
+            sock_read=float(os.getenv("TTS_HTTP_TIMEOUT", "60")),
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _session_loop = loop
+    return _session
+
+async def close():
+    """Đóng session (gọi trước khi event loop kết thúc)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class AsyncTTSClient:
+    """
+    Bọc 1 TTSClient (sync) để gọi bằng asyncio: dùng chung config, cách ký, token state, token bucket
+    và RetryPolicy của client đó (nên luồng sync + coroutine cùng shop chia chung 1 hạn mức).
+    Refresh là single-flight: N coroutine gặp token hết hạn chỉ sinh 1 request refresh.
+    Token + hạn dùng được cache ngay trên client async: hot path chỉ so thời gian trong bộ nhớ, không
+    os.stat token_state / mở luồng refresh nền trên event loop.
+    """
+
+    def __init__(self, client: TTSClient):
+        self.client = client
+        self._refresh_task = None
+        self._token = None
+        self._token_until = 0.0  # epoch: sau thời điểm này phải hỏi lại TokenManager
+
+    def _remember(self, token: str | None):
+        """Cache token tới TOKEN_RECHECK giây, hoặc sớm hơn: lúc token vào vùng refresh trước hạn (skew)."""
+        tm = self.client.tokens
+        until = time.time() + TOKEN_RECHECK
+        exp = int(tm.state.get("expires_at") or 0)
+        if exp:
+            until = min(until, exp - tm.skew)
+        self._token, self._token_until = token, until
+        return token
+
+    async def _do_refresh(self, stale_token: str | None):
+        # TokenManager giữ lock luồng + lock file (chặn) → chạy trong thread, không chặn event loop;
+        # luồng sync / process khác vừa refresh xong thì dùng luôn token của họ
+        return await asyncio.to_thread(self.client.tokens.refresh, stale_token)
+
+    async def _refresh_access_token(self, stale_token: str | None = None):
+        """
+        stale_token: token mà caller thấy bị hết hạn; nếu state đã có token khác thì dùng luôn.
+        """
+        current = self.client.state.get("access_token")
+        if stale_token is not None and current and current != stale_token:
+            return self._remember(current)
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._do_refresh(stale_token or current))
+        # shield: 1 caller bị cancel không làm hỏng refresh của các caller khác
+        return self._remember(await asyncio.shield(self._refresh_task))
+
+    async def ensure_access_token(self):
+        """
+        Trả về access_token hợp lệ, refresh sớm 10 phút trước hạn (single-flight).
+        Token còn trong cache thì không chạm file; hết cache (gần hạn / quá TOKEN_RECHECK) mới gọi
+        TokenManager.peek (stat file, có thể kích hoạt refresh nền) qua asyncio.to_thread.
+        """
+        if self._token and time.time() < self._token_until:
+            return self._token
+        token = await asyncio.to_thread(self.client._fresh_token_or_none)
+        return self._remember(token) if token else await self._refresh_access_token()
+
+    async def _throttle(self):
+        for b in self.client.buckets:
+            while (wait := b.reserve()) > 0:
+                await asyncio.sleep(wait)
+
+    async def _signed_request(self, method: str, build, is_expired, path: str = ""):
+        """
+        Như TTSClient._signed_request nhưng không chặn event loop: chờ token bucket, refresh-on-401 một lần,
+        retry có jitter cho 429 / 5xx / lỗi mạng tạm thời (tôn trọng Retry-After).
+        build() được gọi lại mỗi lần thử → timestamp / chữ ký mới, kể cả sau khi refresh token.
+        is_expired(status, text, j): token hết hạn bất ngờ.
+        """
+        c = self.client
+        refreshed = False
+        attempt = 0
+        transient = _transient_errors()
+        ep = tts_metrics.endpoint(path) if tts_metrics.enabled() else path
+        while True:
+            token = await self.ensure_access_token()
+            url, payload = build()
+            headers = {"x-tts-access-token": token}
+            if payload is not None:
+                headers["Content-Type"] = "application/json"
+            await self._throttle()
+            t0 = time.perf_counter()
+            try:
+                async with _get_session().request(method, url, headers=headers, data=payload) as r:
+                    status, raw, retry_after = r.status, await r.read(), r.headers.get("Retry-After")
+            except transient:
+                tts_metrics.inc("http_responses_total", path=ep, status="error")
+                if attempt >= c.retry.max_retries:
+                    raise
+                tts_metrics.inc("retries_total", path=ep, reason="network")
+                await asyncio.sleep(c.retry.delay(attempt))
+                attempt += 1
+                continue
+            tts_metrics.observe("http_request_seconds", time.perf_counter() - t0, path=ep, method=method)
+            tts_metrics.inc("http_responses_total", path=ep, status=status)
+
+            try:
+                j, parsed = tts_json.loads(raw), True  # parse thẳng từ bytes, 1 lần
+            except Exception:
+                j, parsed = {}, False
+            if status < 400 and not tts_ratelimit.is_rate_limited(status, j):
+                for b in c.buckets:
+                    b.succeeded()
+                return j if parsed else tts_json.loads(raw)
+
+            text = raw.decode("utf-8", "replace")
+            # fallback khi token hết hạn bất ngờ
+            if is_expired(status, text, j):
+                if refreshed:
+                    raise RuntimeError(f"Retry after refresh failed: HTTP {status} - {text}")
+                tts_metrics.inc("refresh_on_401_total")
+                await self._refresh_access_token(token)
+                refreshed = True
+                continue
+
+            if tts_ratelimit.is_retryable(status, j) and attempt < c.retry.max_retries:
+                wait = c.retry.delay(attempt, tts_ratelimit.parse_retry_after(retry_after))
+                limited = tts_ratelimit.is_rate_limited(status, j)
+                if limited:
+                    for b in c.buckets:
+                        b.throttled(wait)
+                tts_metrics.inc("retries_total", path=ep, reason="rate_limit" if limited else "server")
+                await asyncio.sleep(wait)
+                attempt += 1
+                continue
+
+            raise RuntimeError(f"HTTP {status} - {text}")
+
+    async def get_signed_no_shop(self, path: str, query_extra: dict | None = None):
+        """GET ký (không cần param shop), ví dụ /authorization/202309/shops"""
+        c = self.client
+        c._require_app()
+        return await self._signed_request(
+            "GET", lambda: (c._build_signed_url_no_shop(path, query_extra), None),
+            lambda status, text, j: _is_expired_get(status, text), path)
+
+    async def get_signed_with_shop(self, path: str, query_extra: dict | None = None):
+        """GET đã ký kèm shop_cipher/shop_id, ví dụ /order/202309/orders?ids=... (chi tiết đơn)"""
+        c = self.client
+        c._require_app(); c._require_shop()
+        return await self._signed_request(
+            "GET", lambda: c._build_signed_url(path, None, query_extra),
+            lambda status, text, j: _is_expired_get(status, text), path)
+
+    async def post_signed_with_shop(self, path: str, body: dict | None, query_extra: dict | None = None):
+        """
+        POST đã ký (async). Tự ensure token còn hạn (preemptive) + fallback refresh-on-401 một lần,
+        chờ theo rate limit và retry 429/5xx có backoff.
+        """
+        c = self.client
+        c._require_app(); c._require_shop()
+        return await self._signed_request(
+            "POST", lambda: c._build_signed_url(path, body, query_extra),
+            lambda status, text, j: _is_expired_post(status, j), path)
+
+
+# ---------- API dạng hàm trên client mặc định (đọc .env) ----------
+_default = None
+
+def default_client() -> AsyncTTSClient:
+    """AsyncTTSClient bọc tts_client.default_client(), tạo ở lần gọi đầu tiên."""
+    global _default
+    if _default is None or _default.client is not tts_client.default_client():
+        _default = AsyncTTSClient(tts_client.default_client())
+    return _default
+
+async def ensure_access_token():
+    """Trả về access_token hợp lệ, refresh sớm 10 phút trước hạn (single-flight)."""
+    return await default_client().ensure_access_token()
+
+async def get_signed_no_shop(path: str, query_extra: dict | None = None):
+    """GET ký (không cần param shop), ví dụ /authorization/202309/shops"""
+    return await default_client().get_signed_no_shop(path, query_extra)
+
+async def get_signed_with_shop(path: str, query_extra: dict | None = None):
+    """GET đã ký kèm shop_cipher/shop_id, ví dụ /order/202309/orders?ids=... (chi tiết đơn)"""
+    return await default_client().get_signed_with_shop(path, query_extra)
+
+async def post_signed_with_shop(path: str, body: dict | None, query_extra: dict | None = None):
+    """
+    POST đã ký (async). Tự ensure token còn hạn (preemptive) + fallback refresh-on-401 một lần,
+    chờ theo rate limit và retry 429/5xx có backoff.
+    """
+    return await default_client().post_signed_with_shop(path, body, query_extra)
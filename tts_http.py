@@ -0,0 +1,89 @@
+# tts_http.py — transport HTTP dùng chung: pool kết nối theo host, keep-alive, timeout, gzip
+# requests (~80 ms import) chỉ được import ở request đầu tiên, import module này gần như không tốn gì.
+import os, threading
+from urllib.parse import urlsplit
+
+def __getattr__(name):
+    # TRANSIENT_ERRORS: lỗi mạng tạm thời (mất kết nối, timeout) — caller có thể thử lại
+    if name == "TRANSIENT_ERRORS":
+        import requests
+        return requests.ConnectionError, requests.Timeout
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Cấu hình đọc từ env ở lần dùng đầu tiên (sau tts_client.load_env), có thể ghi đè bằng configure()
+_cfg = None
+_sessions = {}  # "scheme://host" -> requests.Session
+_lock = threading.Lock()
+
+def _env_config():
+    return {
+        "pool_size": int(os.getenv("TTS_HTTP_POOL_SIZE", "10")),
+        "connect_timeout": float(os.getenv("TTS_HTTP_CONNECT_TIMEOUT", "10")),
+        "read_timeout": float(os.getenv("TTS_HTTP_TIMEOUT", "60")),
+        "gzip": os.getenv("TTS_HTTP_GZIP", "1") != "0",
+    }
+
+def _config():
+    global _cfg
+    if _cfg is None:
+        _cfg = _env_config()
+    return _cfg
+
+def configure(pool_size: int | None = None, connect_timeout: float | None = None,
+              read_timeout: float | None = None, gzip: bool | None = None):
+    """Đổi cấu hình transport. Các session đang mở sẽ được đóng để áp dụng cấu hình mới."""
+    global _cfg
+    with _lock:
+        cfg = dict(_config())
+        for k, v in (("pool_size", pool_size), ("connect_timeout", connect_timeout),
+                     ("read_timeout", read_timeout), ("gzip", gzip)):
+            if v is not None:
+                cfg[k] = v
+        _cfg = cfg
+        _close_locked()
+
+def _new_session(cfg):
+    import requests
+    from requests.adapters import HTTPAdapter
+    s = requests.Session()
+    # 1 pool / host, tối đa pool_size kết nối keep-alive; block=True để không mở vượt pool khi chạy song song
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(cfg["pool_size"]), pool_block=True)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["Connection"] = "keep-alive"
+    s.headers["Accept-Encoding"] = "gzip, deflate" if cfg["gzip"] else "identity"
+    return s
+
+def session_for(url: str) -> "requests.Session":
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    s = _sessions.get(key)
+    if s is None:
+        with _lock:
+            s = _sessions.get(key)
+            if s is None:
+                s = _sessions[key] = _new_session(_config())
+    return s
+
+def request(method: str, url: str, timeout=None, **kwargs) -> "requests.Response":
+    """Gửi request qua session keep-alive của host tương ứng."""
+    if timeout is None:
+        cfg = _config()
+        timeout = (cfg["connect_timeout"], cfg["read_timeout"])
+    return session_for(url).request(method, url, timeout=timeout, **kwargs)
+
+def get(url: str, **kwargs) -> "requests.Response":
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> "requests.Response":
+    return request("POST", url, **kwargs)
+
+def _close_locked():
+    for s in _sessions.values():
+        s.close()
+    _sessions.clear()
+
+def close():
+    """Đóng toàn bộ kết nối đang giữ (gọi khi thoát process dài hạn)."""
+    with _lock:
+        _close_locked()
@@ -0,0 +1,109 @@
+# tts_json.py — lớp serialize JSON dùng chung: orjson / msgspec nếu đã cài, không thì json chuẩn
+#   dumps(obj)        -> bytes UTF-8 gọn, giống hệt json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+#   dumps_text(obj)   -> như dumps nhưng trả về str (ghi file text / JSONL)
+#   dumps_pretty(obj) -> str, giống json.dumps(obj, ensure_ascii=False, indent=2)
+#   loads(data)       -> parse thẳng từ bytes (response.content) hoặc str, không tạo bản str trung gian
+# Chọn backend bằng biến môi trường TTS_JSON=auto|orjson|msgspec|stdlib (mặc định auto: orjson > msgspec > stdlib),
+# ở lần dumps/loads đầu tiên (import module không import orjson/msgspec), hoặc gọi use() trực tiếp.
+import os, json
+
+_STDLIB_SEP = (",", ":")
+# Khác biệt duy nhất giữa các backend khi ghi: float (1e+16 / 1e16, NaN) → body cần ký (exact=True)
+# có float thì ghi bằng json chuẩn để bytes không đổi.
+_BACKENDS = ("orjson", "msgspec", "stdlib")
+
+BACKEND = None  # chưa chọn
+_dumps = _pretty = _loads = None
+_fast_errors = ()
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=_STDLIB_SEP).encode("utf-8")
+
+def _stdlib_pretty(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+def use(name: str = "auto") -> str:
+    """Chọn backend (auto / orjson / msgspec / stdlib). Trả về tên backend đang dùng."""
+    global BACKEND, _dumps, _pretty, _loads, _fast_errors
+    names = _BACKENDS if name in ("", "auto") else (name,)
+    for n in names:
+        if n == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                continue
+            _dumps, _loads = orjson.dumps, orjson.loads
+            _pretty = lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+            _fast_errors = (TypeError, orjson.JSONEncodeError, orjson.JSONDecodeError)
+        elif n == "msgspec":
+            try:
+                import msgspec
+            except ImportError:
+                continue
+            enc, dec = msgspec.json.Encoder(), msgspec.json.Decoder()
+            _dumps, _loads, _pretty = enc.encode, dec.decode, _stdlib_pretty
+            _fast_errors = (TypeError, OverflowError, msgspec.EncodeError, msgspec.DecodeError)
+        elif n == "stdlib":
+            _dumps, _loads, _pretty, _fast_errors = _stdlib_dumps, json.loads, _stdlib_pretty, ()
+        else:
+            raise RuntimeError(f"TTS_JSON không hợp lệ: {n!r} (chọn auto, orjson, msgspec hoặc stdlib)")
+        BACKEND = n
+        return n
+    raise RuntimeError(f"Chưa cài {name}: pip install {name}")
+
+def _ensure():
+    if _dumps is None:
+        use(os.getenv("TTS_JSON", "auto"))
+
+def _has_float(obj) -> bool:
+    if type(obj) is float:
+        return True
+    if type(obj) is dict:
+        return any(_has_float(v) for v in obj.values())
+    if type(obj) in (list, tuple):
+        return any(_has_float(v) for v in obj)
+    return False
+
+def dumps(obj, exact: bool = False) -> bytes:
+    """
+    JSON gọn dạng bytes UTF-8. exact=True (body cần ký): bảo đảm giống json chuẩn từng byte kể cả khi có float.
+    Kiểu backend không hỗ trợ (int > 64 bit, key không phải str...) tự rơi về json chuẩn.
+    """
+    if _dumps is None:
+        _ensure()
+    if _fast_errors:
+        if not (exact and _has_float(obj)):
+            try:
+                return _dumps(obj)
+            except _fast_errors:
+                pass
+    return _stdlib_dumps(obj)
+
+def dumps_text(obj) -> str:
+    return dumps(obj).decode("utf-8")
+
+def dumps_pretty(obj) -> str:
+    """Bản indent=2 cho file kết quả (đơn từ API không có float nên giống json chuẩn từng byte)."""
+    if _dumps is None:
+        _ensure()
+    if _fast_errors:
+        try:
+            return _pretty(obj)
+        except _fast_errors:
+            pass
+    return _stdlib_pretty(obj)
+
+def loads(data):
+    """
+    Parse JSON từ bytes hoặc str. Lỗi cú pháp → json.JSONDecodeError (ValueError).
+    orjson đọc số nguyên vượt 64 bit thành float (không báo lỗi); response API không có số như vậy
+    (id là chuỗi), cần chính xác tuyệt đối thì dùng TTS_JSON=msgspec/stdlib.
+    """
+    if _dumps is None:
+        _ensure()
+    if _fast_errors:
+        try:
+            return _loads(data)
+        except _fast_errors:
+            pass  # số quá lớn, NaN... hoặc JSON hỏng: để json chuẩn xử lý / báo lỗi như cũ
+    return json.loads(data)
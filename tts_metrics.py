@@ -0,0 +1,253 @@
+# tts_metrics.py — đo hot path của pipeline lấy đơn: span theo giai đoạn, counter, histogram độ trễ theo path
+#   span("sign") / span("http") / span("json_parse") / span("token_refresh") / span("filter_sort") ...
+#   inc("pages_total"), inc("http_responses_total", path=..., status=...), observe("http_request_seconds", s, path=...)
+# Mặc định TẮT (span/inc/observe gần như không tốn gì); bật bằng enable() / configure(spec) / --profile, --metrics.
+# Sink (configure, cách nhau dấu phẩy, hoặc biến môi trường TTS_METRICS):
+#   json:-  | json:metrics.jsonl   : 1 dòng JSON (counter + histogram) mỗi lần flush()
+#   prom:metrics.prom             : file Prometheus text format (ghi atomic, dùng với node_exporter textfile)
+#   http:9464                     : endpoint GET /metrics cho Prometheus scrape
+import os, re, sys, json, time, threading
+from contextlib import nullcontext
+
+PREFIX = "tts_"
+# Biên histogram (giây)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_RE = re.compile(r"/\d{10,}(?=/|$)")
+
+def endpoint(path: str) -> str:
+    """Path API → nhãn histogram: bỏ query, thay id (package/order) bằng {id} để không nổ số series."""
+    return _ID_RE.sub("/{id}", path.split("?", 1)[0])
+
+
+class Registry:
+    """Counter + histogram theo (tên, nhãn), dùng được từ nhiều luồng."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, ((k, v), ...)) -> số
+        self.hists = {}     # (name, labels) -> [đếm theo bucket..., +Inf] , sum, count
+
+    def inc(self, name: str, value=1, labels: tuple = ()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        key = (name, labels)
+        i = 0
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                break
+        else:
+            i = len(self.buckets)
+        with self._lock:
+            h = self.hists.get(key)
+            if h is None:
+                h = self.hists[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.hists.clear()
+
+    def snapshot(self) -> dict:
+        """{"counters": {"name{k=v}": n}, "histograms": {"name{k=v}": {"count", "sum", "buckets": {le: n}}}}"""
+        with self._lock:
+            counters = dict(self.counters)
+            hists = {k: ([*v[0]], v[1], v[2]) for k, v in self.hists.items()}
+        out = {"counters": {}, "histograms": {}}
+        for (name, labels), v in sorted(counters.items()):
+            out["counters"][_series(name, labels)] = v
+        for (name, labels), (counts, total, n) in sorted(hists.items()):
+            cum, buckets = 0, {}
+            for b, c in zip((*self.buckets, "+Inf"), counts):
+                cum += c
+                buckets[str(b)] = cum
+            out["histograms"][_series(name, labels)] = {"count": n, "sum": round(total, 6), "buckets": buckets}
+        return out
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            counters = dict(self.counters)
+            hists = {k: ([*v[0]], v[1], v[2]) for k, v in self.hists.items()}
+        lines, typed = [], set()
+        for (name, labels), v in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.append(f"{PREFIX}{name}{_prom_labels(labels)} {v}")
+        for (name, labels), (counts, total, n) in sorted(hists.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+            cum = 0
+            for b, c in zip((*self.buckets, "+Inf"), counts):
+                cum += c
+                lines.append(f"{PREFIX}{name}_bucket{_prom_labels(labels + (('le', str(b)),))} {cum}")
+            lines.append(f"{PREFIX}{name}_sum{_prom_labels(labels)} {total:.6f}")
+            lines.append(f"{PREFIX}{name}_count{_prom_labels(labels)} {n}")
+        return "\n".join(lines) + "\n"
+
+def _series(name, labels):
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+# ---------- API module (registry toàn cục) ----------
+REGISTRY = Registry()
+_enabled = False
+_sinks = []
+_NULL = nullcontext()
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name: str, value=1, **labels):
+    if _enabled:
+        REGISTRY.inc(name, value, _labels(labels))
+
+def observe(name: str, value: float, **labels):
+    if _enabled:
+        REGISTRY.observe(name, value, _labels(labels))
+
+
+class _Span:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.observe("stage_seconds", time.perf_counter() - self.t0, (("stage", self.stage),))
+        return False
+
+def span(stage: str):
+    """with span("sign"): ... — cộng thời gian vào histogram stage_seconds{stage=...} (tắt: không làm gì)."""
+    return _Span(stage) if _enabled else _NULL
+
+
+class JsonLogSink:
+    """Mỗi lần flush ghi 1 dòng JSON {"ts", "counters", "histograms"} (path "-" = stderr)."""
+
+    def __init__(self, path: str = "-"):
+        self.path = path
+
+    def emit(self, registry: Registry):
+        line = json.dumps({"ts": int(time.time()), **registry.snapshot()}, ensure_ascii=False,
+                          separators=(",", ":"))
+        if self.path == "-":
+            print(line, file=sys.stderr, flush=True)
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+class PrometheusFileSink:
+    """Ghi đè file Prometheus text format (tmp + os.replace để collector không đọc file dở)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def emit(self, registry: Registry):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(registry.prometheus_text())
+        os.replace(tmp, self.path)
+
+class PrometheusHTTPSink:
+    """GET /metrics trên luồng nền (scrape lúc nào cũng thấy số mới nhất, emit() không cần làm gì)."""
+
+    def __init__(self, port: int, host: str = "0.0.0.0"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = REGISTRY
+
+        class H(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_response(404); self.end_headers()
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, int(port)), H)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def emit(self, registry: Registry):
+        pass
+
+def add_sink(sink):
+    _sinks.append(sink)
+    enable()
+
+def configure(spec: str | None = None):
+    """Bật metrics + thêm sink theo spec (mặc định đọc TTS_METRICS), ví dụ "json:-,prom:metrics.prom"."""
+    spec = spec if spec is not None else os.getenv("TTS_METRICS", "")
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        kind, _, target = part.partition(":")
+        if kind == "json":
+            add_sink(JsonLogSink(target or "-"))
+        elif kind == "prom":
+            add_sink(PrometheusFileSink(target or "metrics.prom"))
+        elif kind == "http":
+            add_sink(PrometheusHTTPSink(int(target or 9464)))
+        else:
+            raise RuntimeError(f"Sink metrics không hợp lệ: {part!r} (json:PATH, prom:PATH, http:PORT)")
+
+def flush():
+    """Đẩy số liệu hiện tại ra các sink (gọi cuối lần chạy / sau mỗi lượt của daemon)."""
+    for sink in _sinks:
+        try:
+            sink.emit(REGISTRY)
+        except Exception as e:
+            print(f"⚠️ Không ghi được metrics ({type(sink).__name__}): {e}", file=sys.stderr)
+
+def profile_report(wall: float | None = None) -> str:
+    """Bảng thời gian theo giai đoạn + counter chính (cho --profile). Thời gian cộng dồn trên mọi luồng."""
+    snap = REGISTRY.snapshot()
+    rows = []
+    for series, h in snap["histograms"].items():
+        if series.startswith("stage_seconds{"):
+            rows.append((series[len("stage_seconds{stage="):-1], h["sum"], h["count"]))
+    rows.sort(key=lambda r: r[1], reverse=True)
+    out = [f"{'stage':<16} {'total_s':>9} {'calls':>7} {'avg_ms':>9}" + (f" {'%wall':>6}" if wall else "")]
+    for stage, total, n in rows:
+        line = f"{stage:<16} {total:>9.3f} {n:>7} {total / n * 1000 if n else 0:>9.2f}"
+        if wall:
+            line += f" {total / wall * 100:>5.1f}%"
+        out.append(line)
+    if wall:
+        out.append(f"{'wall':<16} {wall:>9.3f}")
+    for series, h in snap["histograms"].items():
+        if series.startswith("http_request_seconds"):
+            out.append(f"{series}: {h['count']} calls, avg {h['sum'] / h['count'] * 1000:.1f} ms")
+    for series, v in snap["counters"].items():
+        out.append(f"{series} = {v}")
+    return "\n".join(out)
@@ -0,0 +1,25 @@
+# tts_money.py — đổi tiền giữa chuỗi API ('219000', '12.34') và int đơn vị nhỏ nhất theo tiền tệ
+# Dùng chung cho orders_model (Order gọn trong bộ nhớ), orders_export (Parquet/Arrow), orders_report (KPI).
+from decimal import Decimal
+
+# Số chữ số thập phân của đơn vị nhỏ nhất theo ISO 4217 (mặc định 2 nếu không có trong bảng)
+CURRENCY_EXPONENT = {"VND": 0, "IDR": 0, "JPY": 0, "KRW": 0, "USD": 2, "THB": 2, "MYR": 2, "PHP": 2,
+                     "SGD": 2, "GBP": 2, "EUR": 2}
+
+def money_to_minor(value, currency: str | None):
+    """'219000' (VND) → 219000; '12.34' (USD) → 1234. None/'' → None. Sai định dạng → ValueError."""
+    if value is None or value == "":
+        return None
+    exp = CURRENCY_EXPONENT.get((currency or "").upper(), 2)
+    d = Decimal(str(value)).scaleb(exp)
+    if d != d.to_integral_value():
+        raise ValueError(f"Giá trị tiền {value!r} ({currency}) không đổi được sang đơn vị nhỏ nhất")
+    return int(d)
+
+def money_text(minor: int, currency: str | None) -> str:
+    """219000 (VND) → '219000'; 1234 (USD) → '12.34' — dạng chuẩn API trả về."""
+    exp = CURRENCY_EXPONENT.get((currency or "").upper(), 2)
+    if exp == 0:
+        return str(minor)
+    q, r = divmod(abs(minor), 10 ** exp)
+    return f"{'-' if minor < 0 else ''}{q}.{r:0{exp}d}"
@@ -0,0 +1,116 @@
+# tts_ratelimit.py — token bucket (theo app_key / shop) + lịch retry có jitter cho request đã ký
+import os, time, random, threading
+
+# HTTP status đáng thử lại (throttle + lỗi tạm thời phía server)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Mã lỗi API báo vượt rate limit (có thể trả kèm HTTP 200); cấu hình thêm qua TTS_RATE_LIMIT_CODES="a,b"
+RATE_LIMIT_CODES = {int(c) for c in os.getenv("TTS_RATE_LIMIT_CODES", "").split(",") if c.strip()}
+_RATE_LIMIT_WORDS = ("rate limit", "too many request", "frequency")
+
+
+class TokenBucket:
+    """
+    Token bucket an toàn đa luồng, tự điều chỉnh (AIMD): bị throttle thì giảm nửa tốc độ
+    và dừng đến hết thời gian chờ; mỗi lần thành công thì tăng dần lại tới max_rate.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None, min_rate: float = 0.5):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, n: float = 1.0) -> float:
+        """Không chờ: đủ token thì trừ n và trả 0, không thì trả số giây nên chờ rồi thử lại (client async)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and self.tokens >= n:
+                self.tokens -= n
+                return 0.0
+            return max(self.paused_until - now, (n - self.tokens) / self.rate)
+
+    def acquire(self, n: float = 1.0):
+        """Chờ tới khi đủ token rồi trừ đi n."""
+        while (wait := self.reserve(n)) > 0:
+            time.sleep(wait)
+
+    def throttled(self, pause: float = 0.0):
+        """Server báo throttle: giảm tốc độ một nửa và tạm dừng cả bucket `pause` giây."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(key: str, rate: float, burst: float | None = None) -> TokenBucket:
+    """Bucket dùng chung trong process theo key (ví dụ "app:<app_key>", "shop:<cipher>")."""
+    with _buckets_lock:
+        b = _buckets.get(key)
+        if b is None:
+            b = _buckets[key] = TokenBucket(rate, burst)
+        return b
+
+
+class RetryPolicy:
+    """Backoff luỹ thừa có full jitter; Retry-After của server được ưu tiên nếu lớn hơn."""
+
+    def __init__(self, max_retries: int = 5, base: float = 0.5, cap: float = 30.0):
+        self.max_retries = int(max_retries)
+        self.base = float(base)
+        self.cap = float(cap)
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_retries=int(os.getenv("TTS_MAX_RETRIES", "5")),
+                   base=float(os.getenv("TTS_RETRY_BASE", "0.5")),
+                   cap=float(os.getenv("TTS_RETRY_CAP", "30")))
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        d = random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+        if retry_after is not None:
+            d = max(d, min(retry_after, self.cap * 4))
+        return d
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After dạng số giây hoặc HTTP-date → số giây (None nếu không có/không đọc được)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime  # hiếm khi cần, không import lúc khởi động
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limited(status: int, j: dict) -> bool:
+    if status == 429:
+        return True
+    code = j.get("code") if isinstance(j, dict) else None
+    if code in RATE_LIMIT_CODES:
+        return True
+    msg = (j.get("message") or "").lower() if isinstance(j, dict) else ""
+    return bool(code) and any(w in msg for w in _RATE_LIMIT_WORDS)
+
+def is_retryable(status: int, j: dict) -> bool:
+    return status in RETRYABLE_STATUS or is_rate_limited(status, j)
@@ -1,5 +1,6 @@
 # tts_sign.py
 import hmac, hashlib, json
+import tts_json
 
 
 def _minify(body):
@@ -7,39 +8,97 @@ def _minify(body):
         return ""
     return json.dumps(body, separators=(",", ":"), ensure_ascii=False)
 
+def dumps_body(body) -> bytes | None:
+    """Body minified dạng bytes UTF-8 — dùng CHUNG cho cả chữ ký lẫn payload gửi đi."""
+    if body is None:
+        return None
+    return tts_json.dumps(body, exact=True)
+
+def _param_concat(query: dict) -> str:
+    return "".join(f"{k}{query[k]}" for k in sorted(query) if k != "sign")
+
+
+class Signer:
+    """
+    Bộ ký 202309 cho 1 app_secret. Giữ sẵn trạng thái HMAC đã nạp key + tiền tố app_secret
+    (và theo từng path), mỗi request chỉ hmac.copy() rồi update phần thay đổi.
+    """
+
+    def __init__(self, app_secret: str):
+        self._secret = app_secret.encode("utf-8")
+        self._base = hmac.new(self._secret, self._secret, hashlib.sha256)
+        self._by_path = {}
+
+    def _for_path(self, path: str):
+        h = self._by_path.get(path)
+        if h is None:
+            h = self._base.copy()
+            h.update(path.encode("utf-8"))
+            if len(self._by_path) < 256:
+                self._by_path[path] = h
+        return h.copy()
+
+    def sign(self, path: str, query: dict, body_bytes: bytes | None = None) -> str:
+        """body_bytes: kết quả dumps_body(body) (None nếu không có body)."""
+        h = self._for_path(path)
+        h.update(_param_concat(query).encode("utf-8"))
+        if body_bytes:
+            h.update(body_bytes)
+        h.update(self._secret)
+        return h.hexdigest()
+
+    def sign_request(self, path: str, query: dict, body: dict | None = None):
+        """Trả về (sign_hex, body_bytes): body chỉ serialize 1 lần, gửi đúng bytes đã ký."""
+        body_bytes = dumps_body(body)
+        return self.sign(path, query, body_bytes), body_bytes
+
+    def sign_batch(self, path: str, queries: list, body: dict | None = None):
+        """
+        Ký nhiều request cùng path/body (ví dụ nhiều lô ids / nhiều trang): body serialize 1 lần.
+        Trả về (list sign_hex theo thứ tự queries, body_bytes).
+        """
+        body_bytes = dumps_body(body)
+        return [self.sign(path, q, body_bytes) for q in queries], body_bytes
+
+    def sign_text(self, path: str, query: dict, body: dict | None = None) -> str:
+        """Chuỗi được ký (chỉ để debug, không dùng ở hot path)."""
+        secret = self._secret.decode("utf-8")
+        return f"{secret}{path}{_param_concat(query)}{_minify(body)}{secret}"
+
+
+_signers = {}
+
+def signer_for(app_secret: str) -> Signer:
+    s = _signers.get(app_secret)
+    if s is None:
+        s = _signers[app_secret] = Signer(app_secret)
+    return s
+
 def build_signature(path: str, query: dict, body: dict | None, app_secret: str) -> str:
     """
     TikTok Shop 202309: sign_text = app_secret + path + (concat params sorted key+value, bỏ 'sign') + (body minified hoặc "")
                          + app_secret
     Sau đó HMAC-SHA256 (hex lowercase) với key = app_secret.
     """
-    # 1) Bỏ 'sign' khỏi query
-    q = dict(query)
-    q.pop("sign", None)
-
-    # 2) Nối key+value theo thứ tự ASCII của key
-    param_concat = "".join(f"{k}{q[k]}" for k in sorted(q.keys()))
-
-    # 3) Body minified ("" nếu None)
-    body_part = _minify(body)
+    return signer_for(app_secret).sign(path, query, dumps_body(body))
 
-    # 4) Quấn secret 2 đầu
-    sign_text = f"{app_secret}{path}{param_concat}{body_part}{app_secret}"
+def webhook_signature(app_key: str, app_secret: str, body: bytes) -> str:
+    """
+    Chữ ký webhook (header Authorization của push notification): HMAC-SHA256 hex với key = app_secret
+    trên app_key + body thô (đúng bytes nhận được, không parse lại JSON).
+    """
+    return hmac.new(app_secret.encode("utf-8"), app_key.encode("utf-8") + body, hashlib.sha256).hexdigest()
 
-    # 5) HMAC-SHA256
-    return hmac.new(app_secret.encode("utf-8"),
-                    sign_text.encode("utf-8"),
-                    hashlib.sha256).hexdigest()
+def verify_webhook(app_key: str, app_secret: str, body: bytes, signature: str | None) -> bool:
+    """So chữ ký webhook theo thời gian hằng (compare_digest)."""
+    if not signature:
+        return False
+    return hmac.compare_digest(webhook_signature(app_key, app_secret, body), signature.strip().lower())
 
 def build_signature_with_text(path: str, query: dict, body: dict | None, app_secret: str):
     """
-    Trả về (sign_hex, param_concat, sign_text) để debug.
+    Trả về (sign_hex, param_concat, sign_text) để debug. Ký bằng signer_for(app_secret) như hot path;
+    chuỗi debug chỉ được dựng khi gọi hàm này.
     """
-    q = dict(query); q.pop("sign", None)
-    param_concat = "".join(f"{k}{q[k]}" for k in sorted(q.keys()))
-    body_part = _minify(body)
-    sign_text = f"{app_secret}{path}{param_concat}{body_part}{app_secret}"
-    sign_hex = hmac.new(app_secret.encode("utf-8"),
-                        sign_text.encode("utf-8"),
-                        hashlib.sha256).hexdigest()
-    return sign_hex, param_concat, sign_text
+    s = signer_for(app_secret)
+    return s.sign(path, query, dumps_body(body)), _param_concat(query), s.sign_text(path, query, body)
@@ -0,0 +1,258 @@
+# tts_token.py — quản lý token dùng chung giữa các luồng VÀ các process (cron chạy song song)
+#   TokenStore  : token_state.json đọc lại khi mtime đổi, ghi atomic (tmp + os.replace), lock liên process
+#   TokenManager: trả token không chặn; refresh nền trước hạn; mỗi lượt chỉ 1 process gọi refresh
+import os, json, time, threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import tts_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # tự thử lại ~10 giây rồi mới lỗi
+            return
+        except OSError:
+            continue
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(path: str):
+    """Lock loại trừ liên process (và giữa các luồng) qua file `path`: fcntl.flock / msvcrt.locking."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        _lock_fd(fd)
+        try:
+            yield
+        finally:
+            _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+def log(msg: str):
+    print(f"[{datetime.now(VN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+class TokenStore:
+    """
+    State token trên đĩa. `state` là 1 dict cố định (cập nhật tại chỗ) nên ai giữ tham chiếu
+    vẫn thấy giá trị mới. reload() chỉ tốn 1 os.stat khi file không đổi.
+    """
+
+    def __init__(self, path: str, access_token: str | None = None, refresh_token: str | None = None,
+                 check_interval: float = 1.0):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.check_interval = check_interval
+        # bootstrap từ tham số / .env nếu chưa có file
+        self.state = {"access_token": access_token or None, "refresh_token": refresh_token or None, "expires_at": 0}
+        self._stamp = None
+        self._checked = 0.0
+        self.reload(force=True)
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def reload(self, force: bool = False) -> dict:
+        """Đọc lại file nếu mtime/size đổi (process khác vừa refresh). force=True: bỏ qua check_interval."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return self.state
+        self._checked = now
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return self.state
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                s = json.load(f)
+        except (OSError, ValueError):
+            return self.state  # file hỏng/đang bị sửa tay → giữ state hiện tại
+        self._stamp = stamp
+        # đảm bảo key cần thiết
+        s.setdefault("access_token", None)
+        s.setdefault("refresh_token", self.state.get("refresh_token"))
+        s.setdefault("expires_at", 0)
+        self.state.clear()
+        self.state.update(s)
+        return self.state
+
+    def save(self):
+        d = os.path.dirname(os.path.abspath(self.path))
+        tmp = os.path.join(d, f".{os.path.basename(self.path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._stamp = self._file_stamp()
+
+    def locked(self):
+        """Lock liên process qua file <state>.lock (fcntl.flock / msvcrt.locking)."""
+        return file_lock(self.lock_path)
+
+
+def parse_refresh_response(data: dict, old_refresh: str | None):
+    """Response token/refresh → (access_token, refresh_token, expire_in)."""
+    payload = data.get("data") or data
+    access = payload.get("access_token")
+    if not access:
+        raise RuntimeError(f"Refresh không trả access_token: {data}")
+    # TikTok có thể trả 'access_token_expire_in' hoặc 'expire_in' (tùy tài liệu/cụm)
+    expire_in = payload.get("access_token_expire_in", payload.get("expire_in"))
+    return access, payload.get("refresh_token") or old_refresh, expire_in
+
+
+class TokenManager:
+    """
+    get() không chặn khi token còn hạn:
+      - còn > skew giây          → trả token;
+      - còn hạn nhưng < skew giây → trả token, refresh ở luồng nền;
+      - hết hạn (hoặc < min_ttl)  → refresh đồng bộ.
+    refresh() giữ lock luồng + lock file; đọc lại file sau khi có lock, nếu process khác
+    đã refresh thì dùng luôn token đó (không gọi API lần 2 với cùng refresh_token).
+
+    fetch(refresh_token) -> dict: gọi API refresh, trả JSON response.
+    on_update(state): gọi sau mỗi lần chính process này refresh xong (ví dụ đồng bộ os.environ).
+    """
+
+    def __init__(self, store: TokenStore, fetch, skew: int = 600, min_ttl: int = 60, on_update=None):
+        self.store = store
+        self.fetch = fetch
+        self.skew = skew
+        self.min_ttl = min_ttl
+        self.on_update = on_update
+        self.lock = threading.Lock()
+        self.last_error = None
+        self._bg = None
+        self._bg_lock = threading.Lock()  # riêng, để hot path không chờ lock của refresh đang chạy
+        self._stop = threading.Event()
+        self._scheduler = None
+
+    @property
+    def state(self) -> dict:
+        return self.store.state
+
+    def _ttl(self, now: float | None = None):
+        """Số giây còn lại của access_token; None nếu không có hạn."""
+        exp = int(self.state.get("expires_at") or 0)
+        return exp - (now or time.time()) if exp else None
+
+    def peek(self):
+        """Token dùng được ngay (có thể kích hoạt refresh nền), None nếu phải refresh đồng bộ."""
+        self.store.reload()
+        token = self.state.get("access_token")
+        # Chưa có token → buộc refresh (nếu có refresh_token)
+        if not token:
+            if self.state.get("refresh_token"):
+                return None
+            raise RuntimeError("Thiếu access_token. Bổ sung TTS_REFRESH_TOKEN hoặc re-authorize shop.")
+        ttl = self._ttl()
+        # Chưa có hạn → dùng tạm
+        if ttl is None or ttl > self.skew:
+            return token
+        if ttl > self.min_ttl and self.state.get("refresh_token"):
+            self._refresh_in_background(token)
+            return token
+        return None
+
+    def get(self):
+        """Trả về access_token hợp lệ."""
+        token = self.peek()
+        return token if token is not None else self.refresh(self.state.get("access_token"))
+
+    def _usable(self, token):
+        ttl = self._ttl()
+        return bool(token) and (ttl is None or ttl > self.min_ttl)
+
+    def refresh(self, stale: str | None = None):
+        """
+        Refresh access_token. stale: token mà caller thấy đã cũ/bị từ chối; nếu sau khi có lock
+        state đã có token khác (luồng/process khác vừa refresh) thì trả token đó.
+        """
+        with self.lock, self.store.locked():
+            self.store.reload(force=True)
+            token = self.state.get("access_token")
+            if token and token != stale and self._usable(token):
+                return token
+            refresh_token = self.state.get("refresh_token")
+            if not refresh_token:
+                raise RuntimeError(
+                    "Không có refresh_token để làm mới access_token. "
+                    "Hãy lấy lại ủy quyền (authorized_code → token/get) hoặc bổ sung TTS_REFRESH_TOKEN."
+                )
+            access, new_refresh, expire_in = parse_refresh_response(self.fetch(refresh_token) or {}, refresh_token)
+            self.state["access_token"] = access
+            self.state["refresh_token"] = new_refresh
+            self.state["expires_at"] = int(time.time()) + int(expire_in or 3600)  # fallback 1h nếu không trả expire
+            self.store.save()
+            self.last_error = None
+        if self.on_update is not None:
+            self.on_update(self.state)
+        return access
+
+    # ---------- refresh nền ----------
+    def _refresh_quietly(self, stale):
+        try:
+            self.refresh(stale)
+        except Exception as e:
+            # hot path sẽ tự refresh đồng bộ nếu token thực sự hết hạn
+            self.last_error = e
+            tts_metrics.inc("token_refresh_errors_total")
+            log(f"⚠️ Refresh token nền lỗi ({self.store.path}): {e}")
+
+    def _refresh_in_background(self, stale):
+        with self._bg_lock:
+            if self._bg is not None and self._bg.is_alive():
+                return
+            self._bg = threading.Thread(target=self._refresh_quietly, args=(stale,), daemon=True,
+                                        name="tts-token-refresh")
+            self._bg.start()
+
+    def start(self, poll: float = 300.0, retry_after: float = 30.0):
+        """
+        Luồng nền tự refresh trước hạn `skew` giây, dành cho process chạy lâu (daemon, webhook).
+        Cứ tối đa `poll` giây lại đọc lại state (process khác có thể đã refresh).
+        """
+        if self._scheduler is not None and self._scheduler.is_alive():
+            return
+        self._stop.clear()
+        self._scheduler = threading.Thread(target=self._run, args=(poll, retry_after), daemon=True,
+                                           name="tts-token-scheduler")
+        self._scheduler.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, poll, retry_after):
+        while not self._stop.is_set():
+            self.store.reload(force=True)
+            ttl = self._ttl()
+            token = self.state.get("access_token")
+            if token and (ttl is None or ttl > self.skew):
+                self._stop.wait(poll if ttl is None else min(poll, ttl - self.skew))
+                continue
+            self._refresh_quietly(token)
+            if self.last_error is not None:
+                self._stop.wait(retry_after)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# webhook_server.py — nhận webhook đẩy thay đổi đơn từ TikTok Shop, không phải poll orders/search liên tục
+#   POST /webhook : kiểm chữ ký (header Authorization) + timestamp (lệch tối đa --max-skew giây, chặn gửi lại),
+#                   đưa order_id vào hàng đợi có giới hạn, trả 200 ngay
+#   GET  /healthz : thống kê dạng JSON
+# Các worker gom order_id đang chờ (tối đa 50 / lần, bỏ trùng), gọi Get Order Detail rồi upsert vào kho SQLite.
+# Ví dụ:
+#   python webhook_server.py --port 9100 --store orders.db
+#   python orders_daemon.py --interval 1800 --store orders.db --no-dataset   # poll thưa để bù sự kiện bị lỡ
+import json, time, queue, signal, argparse, threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta, timezone
+from tts_sign import verify_webhook
+import tts_json
+
+# Giờ Việt Nam (UTC+7)
+VN_TZ = timezone(timedelta(hours=7))
+
+MAX_BODY = 1 << 20  # webhook đơn chỉ vài trăm byte; chặn body quá lớn
+MAX_SKEW = 300      # timestamp trong payload lệch quá số giây này so với đồng hồ máy → từ chối
+
+def log(msg: str):
+    print(f"[{datetime.now(VN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+def order_event(payload: dict):
+    """
+    (order_id, update_time) từ payload webhook đơn; None nếu không phải sự kiện đơn.
+    update_time / timestamp không phải số → ValueError / TypeError (handler trả 400).
+    """
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if not isinstance(data, dict) or not data.get("order_id"):
+        return None
+    return str(data["order_id"]), int(data.get("update_time") or payload.get("timestamp") or 0)
+
+
+class ReplayGuard:
+    """
+    Chặn gửi lại body đã ký: timestamp phải nằm trong ±max_skew giây so với bây giờ, và mỗi chữ ký
+    chỉ được nhận 1 lần trong cửa sổ đó (chữ ký cũ hơn cửa sổ thì đã bị chặn bởi timestamp).
+    max_skew <= 0: tắt cả hai kiểm tra.
+    """
+
+    def __init__(self, max_skew: float = MAX_SKEW):
+        self.max_skew = float(max_skew)
+        self._seen = OrderedDict()  # chữ ký -> thời điểm hết hạn (monotonic)
+        self._lock = threading.Lock()
+
+    def check(self, payload, signature: str, now: float | None = None):
+        """"ok" | "stale" (thiếu / sai / lệch timestamp) | "replay" (chữ ký đã nhận trong cửa sổ)."""
+        if self.max_skew <= 0:
+            return "ok"
+        try:
+            ts = int(payload.get("timestamp"))
+        except (AttributeError, TypeError, ValueError):
+            return "stale"
+        if abs((time.time() if now is None else now) - ts) > self.max_skew:
+            return "stale"
+        key = signature.strip().lower()
+        mono = time.monotonic()
+        with self._lock:
+            while self._seen and next(iter(self._seen.values())) <= mono:
+                self._seen.popitem(last=False)
+            if key in self._seen:
+                return "replay"
+            self._seen[key] = mono + 2 * self.max_skew
+        return "ok"
+
+
+class OrderIngestor:
+    """
+    Hàng đợi có giới hạn + pool worker.
+    submit() không chặn: hàng đợi đầy thì trả False (handler trả 503 để TikTok gửi lại sau).
+    Worker lấy 1 id rồi gom thêm id đang chờ (tối đa batch, chờ tối đa linger giây), bỏ trùng, bỏ các id
+    kho đã có bản mới bằng/hơn, gọi Get Order Detail 1 lần cho cả lô rồi upsert_orders.
+    Lô lỗi chỉ được ghi log: lượt poll kế tiếp (orders_daemon.py / orders_sync.py) sẽ lấy bù.
+    """
+
+    def __init__(self, client, store, workers: int = 4, max_queue: int = 10000, batch: int | None = None,
+                 linger: float = 0.2):
+        from orders_hydrate import MAX_IDS
+        self.client = client
+        self.store = store
+        self.shop = client.shop_cipher or client.shop_id
+        self.batch = max(1, min(batch or MAX_IDS, MAX_IDS))
+        self.linger = linger
+        self.queue = queue.Queue(maxsize=max(1, max_queue))
+        self.stats = {"received": 0, "queued": 0, "dropped": 0, "bad_sign": 0, "stale": 0, "replayed": 0,
+                      "ignored": 0, "skipped": 0, "fetched": 0, "created": 0, "updated": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+
+    def count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def snapshot(self):
+        with self._stats_lock:
+            return dict(self.stats, pending=self.queue.qsize())
+
+    def submit(self, order_id: str, update_time: int) -> bool:
+        try:
+            self.queue.put_nowait((order_id, update_time))
+        except queue.Full:
+            self.count("dropped")
+            return False
+        self.count("queued")
+        return True
+
+    def _take_batch(self):
+        """Lô {order_id: update_time lớn nhất}; None khi nhận tín hiệu dừng."""
+        first = self.queue.get()
+        if first is None:
+            return None
+        pending = {first[0]: first[1]}
+        deadline = time.monotonic() + self.linger
+        while len(pending) < self.batch:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # trả lại tín hiệu dừng, xử lý nốt lô này trước
+                break
+            pending[item[0]] = max(item[1], pending.get(item[0], 0))
+        return pending
+
+    def _fetch(self, ids: list):
+        from orders_hydrate import DETAIL_PATH
+        data = self.client.get_signed_with_shop(DETAIL_PATH, {"ids": ",".join(ids)})
+        return (data.get("data") or {}).get("orders") or []
+
+    def process(self, pending: dict):
+        """Lấy chi tiết + upsert 1 lô {order_id: update_time từ webhook}."""
+        have = self.store.update_times(pending)
+        ids = [oid for oid, ut in pending.items() if not ut or int(have.get(oid) or 0) < ut]
+        self.count("skipped", len(pending) - len(ids))
+        if not ids:
+            return
+        orders = self._fetch(ids)
+        created, updated = self.store.upsert_orders(orders, shop=self.shop)
+        self.count("fetched", len(orders))
+        self.count("created", created)
+        self.count("updated", updated)
+
+    def _worker(self):
+        while True:
+            pending = self._take_batch()
+            if pending is None:
+                return
+            try:
+                self.process(pending)
+            except Exception as e:
+                self.count("errors")
+                log(f"✖ Lỗi lấy {len(pending)} đơn: {e}")
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        """Xử lý nốt các id đã nhận rồi dừng worker."""
+        for _ in self._threads:
+            self.queue.put(None)
+        for t in self._threads:
+            t.join()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "tts-webhook"
+
+    def _reply(self, status: int, obj):
+        body = tts_json.dumps(obj)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/healthz":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, self.server.ingestor.snapshot())
+
+    def do_POST(self):
+        srv, ing = self.server, self.server.ingestor
+        if self.path.split("?", 1)[0] != srv.webhook_path:
+            return self._reply(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY:
+            self.close_connection = True
+            return self._reply(413 if length > MAX_BODY else 400, {"error": "bad body"})
+        body = self.rfile.read(length)
+        ing.count("received")
+        if not verify_webhook(srv.app_key, srv.app_secret, body, self.headers.get("Authorization")):
+            ing.count("bad_sign")
+            return self._reply(401, {"error": "bad signature"})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400, {"error": "bad json"})
+        verdict = srv.replay_guard.check(payload, self.headers.get("Authorization"))
+        if verdict != "ok":
+            ing.count("stale" if verdict == "stale" else "replayed")
+            if verdict == "replay":
+                return self._reply(200, {"code": 0})  # đã nhận rồi: trả 200 để không bị gửi lại nữa
+            return self._reply(400, {"error": "stale timestamp"})
+        try:
+            ev = order_event(payload)
+        except (TypeError, ValueError):
+            ing.count("ignored")
+            return self._reply(400, {"error": "bad payload"})
+        shop_id = str(payload.get("shop_id") or "") if isinstance(payload, dict) else ""
+        if ev is None or (srv.shop_id and shop_id and shop_id != srv.shop_id):
+            ing.count("ignored")
+            return self._reply(200, {"code": 0})
+        if not ing.submit(*ev):
+            return self._reply(503, {"error": "queue full"})
+        self._reply(200, {"code": 0})
+
+    def log_message(self, fmt, *args):
+        pass  # không log từng request; xem /healthz
+
+
+def make_server(host: str, port: int, client, ingestor: OrderIngestor, path: str = "/webhook",
+                max_skew: float = MAX_SKEW):
+    if not client.app_key or not client.app_secret:
+        raise RuntimeError("Thiếu TTS_APP_KEY hoặc TTS_APP_SECRET để kiểm chữ ký webhook")
+    srv = ThreadingHTTPServer((host, port), WebhookHandler)
+    srv.daemon_threads = True
+    srv.ingestor = ingestor
+    srv.webhook_path = path
+    srv.replay_guard = ReplayGuard(max_skew)
+    srv.app_key, srv.app_secret = client.app_key, client.app_secret
+    srv.shop_id = str(client.shop_id) if client.shop_id else None
+    return srv
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Nhận webhook thay đổi đơn TikTok Shop, lấy chi tiết và upsert vào kho SQLite.")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--path", default="/webhook", help="Đường dẫn nhận webhook")
+    p.add_argument("--store", default="orders.db", help="Kho SQLite (order_store.py)")
+    p.add_argument("--workers", type=int, default=4, help="Số worker lấy chi tiết đơn")
+    p.add_argument("--max-queue", type=int, default=10000, help="Số sự kiện chờ tối đa (đầy thì trả 503)")
+    p.add_argument("--linger", type=float, default=0.2, help="Thời gian gom thêm id vào 1 lô (giây)")
+    p.add_argument("--max-skew", type=float, default=MAX_SKEW,
+                   help="Lệch tối đa giữa timestamp trong payload và đồng hồ máy (giây); 0 = không kiểm")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    import tts_client, tts_http
+    from order_store import OrderStore
+
+    args = parse_args(argv)
+    client = tts_client.default_client()
+    store = OrderStore(args.store)
+    ingestor = OrderIngestor(client, store, workers=args.workers, max_queue=args.max_queue, linger=args.linger)
+    srv = make_server(args.host, args.port, client, ingestor, args.path, args.max_skew)
+
+    def stop(*_):
+        log("⏹ Đang dừng: xử lý nốt các sự kiện đã nhận...")
+        threading.Thread(target=srv.shutdown, daemon=True).start()
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, stop)
+
+    client.tokens.start()
+    ingestor.start()
+    log(f"▶ Webhook: http://{args.host}:{args.port}{args.path} → {args.store} (Ctrl+C để dừng)")
+    try:
+        srv.serve_forever()
+    finally:
+        srv.server_close()
+        ingestor.stop()
+        client.tokens.stop()
+        store.close()
+        tts_http.close()
+        s = ingestor.snapshot()
+        log(f"✅ Đã dừng: nhận {s['received']}, lấy {s['fetched']} đơn ({s['created']} mới, {s['updated']} cập nhật), "
+            f"bỏ {s['dropped']}, sai chữ ký {s['bad_sign']}, quá hạn {s['stale']}, lỗi {s['errors']}")
+
+if __name__ == "__main__":
+    main()